@@ -0,0 +1,87 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2011 ~ 2012 Deepin, Inc.
+#               2011 ~ 2012 Wang Yong
+#
+# Author:     Wang Yong <lazycat.manatee@gmail.com>
+# Maintainer: Wang Yong <lazycat.manatee@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Compare dominant color engine with old k-means engine that use PIL and SciPy.
+#
+# Usage: python dominant_color_benchmark.py [image ...]
+#
+# Skin images of demos are used if no image given, k-means engine is skipped if PIL or SciPy is not installed.
+
+from dtk.ui.dominant_color import compute_dominant_color, get_dominant_color
+import glob
+import os
+import sys
+import time
+
+try:
+    from PIL import Image
+    import scipy
+    import scipy.cluster
+    import scipy.misc
+    enable_kmeans = True
+except ImportError:
+    enable_kmeans = False
+
+def kmeans_dominant_color(image_path):
+    '''
+    Old dominant color engine, resize image to 150x150 and find most frequent cluster of k-means.
+    '''
+    im = Image.open(image_path)
+    im = im.resize((150, 150))
+    ar = scipy.misc.fromimage(im)
+    shape = ar.shape
+    ar = ar.reshape(scipy.product(shape[:2]), shape[2])
+
+    codes, dist = scipy.cluster.vq.kmeans(ar.astype(scipy.float32), 5)
+    vecs, dist = scipy.cluster.vq.vq(ar, codes)
+    counts, bins = scipy.histogram(vecs, len(codes))
+    peak = codes[scipy.argmax(counts)]
+
+    return "#%s" % (''.join(chr(int(c)) for c in peak).encode('hex')[0:6])
+
+def benchmark(color_func, image_path, loops):
+    '''
+    Return (color, average milliseconds of every loop).
+    '''
+    start_time = time.time()
+    for loop in xrange(loops):
+        color = color_func(image_path)
+
+    return (color, (time.time() - start_time) * 1000 / loops)
+
+if __name__ == "__main__":
+    image_paths = sys.argv[1:]
+    if len(image_paths) == 0:
+        image_paths = sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), "skin", "*", "*.jpg")))
+
+    if not enable_kmeans:
+        print "PIL or SciPy is not installed, skip k-means engine."
+
+    for image_path in image_paths:
+        print os.path.basename(image_path)
+
+        if enable_kmeans:
+            print "    k-means   : %s %8.3f ms" % benchmark(kmeans_dominant_color, image_path, 5)
+        print "    histogram : %s %8.3f ms" % benchmark(compute_dominant_color, image_path, 5)
+
+        get_dominant_color(image_path)
+        print "    cached    : %s %8.3f ms" % benchmark(get_dominant_color, image_path, 100)
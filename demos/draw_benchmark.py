@@ -0,0 +1,76 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2011 ~ 2012 Deepin, Inc.
+#               2011 ~ 2012 Wang Yong
+#
+# Author:     Wang Yong <lazycat.manatee@gmail.com>
+# Maintainer: Wang Yong <lazycat.manatee@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Measure time of gradient draw functions with pattern cache on and off.
+#
+# Usage: python draw_benchmark.py [loops]
+
+from dtk.ui.draw import draw_vlinear, draw_hlinear, draw_shadow, draw_radial_ring, pattern_cache
+from dtk.ui.theme import DynamicShadowColor
+import cairo
+import gtk
+import sys
+import time
+
+SELECT_COLOR_INFOS = [(0, ("#A0D4F4", 0.8)), (1, ("#7FC6F0", 0.8))]
+SHADOW_COLOR = DynamicShadowColor([(0, ("#000000", 0.3)), (1, ("#000000", 0.0))])
+
+def draw_rows(cr):
+    # Select background of list rows, every cell draw its own background.
+    for row in xrange(20):
+        for column in xrange(4):
+            draw_vlinear(cr, column * 100, row * 24, 100, 24, SELECT_COLOR_INFOS)
+
+def draw_frame(cr):
+    draw_shadow(cr, 0, 0, 400, 300, 10, SHADOW_COLOR)
+    draw_hlinear(cr, 0, 0, 400, 30, SELECT_COLOR_INFOS)
+    draw_radial_ring(cr, 200, 150, 50, 40, SHADOW_COLOR.get_color_info())
+
+def benchmark(draw_callback, enable_cache, loops):
+    '''
+    Return average milliseconds of every loop.
+    '''
+    pattern_cache.set_enable(enable_cache)
+    surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, 400, 480)
+    cr = gtk.gdk.CairoContext(cairo.Context(surface))
+
+    start_time = time.time()
+    for loop in xrange(loops):
+        draw_callback(cr)
+
+    return (time.time() - start_time) * 1000 / loops
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        loops = int(sys.argv[1])
+    else:
+        loops = 500
+
+    for (name, draw_callback) in [("List rows", draw_rows),
+                                  ("Window frame", draw_frame)]:
+        without_cache = benchmark(draw_callback, False, loops)
+        with_cache = benchmark(draw_callback, True, loops)
+
+        print "%-12s: %6.3f ms/loop without pattern cache, %6.3f ms/loop with pattern cache" % (
+            name, without_cache, with_cache)
+
+    print "Pattern cache: %s" % pattern_cache.get_stats()
@@ -59,7 +59,7 @@ if __name__ == "__main__":
         )
     
     # Add FileManager.
-    filemanager = FileManager()
+    filemanager = FileManager(enable_cache=True)
     filemanager_align = gtk.Alignment()
     filemanager_align.set(0.5, 0.5, 1, 1)
     filemanager_align.set_padding(0, 2, 2, 2)
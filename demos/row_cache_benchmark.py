@@ -0,0 +1,119 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2011 ~ 2012 Deepin, Inc.
+#               2011 ~ 2012 Wang Yong
+#
+# Author:     Wang Yong <lazycat.manatee@gmail.com>
+# Maintainer: Wang Yong <lazycat.manatee@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Measure frame time of ListView and TreeView with row surface cache on and off.
+#
+# Usage: python row_cache_benchmark.py [frames]
+
+from dtk.ui.init_skin import init_skin
+from deepin_utils.file import get_parent_dir
+import os
+
+app_theme = init_skin(
+    "deepin-ui-demo",
+    "1.0",
+    "01",
+    os.path.join(get_parent_dir(__file__), "skin"),
+    os.path.join(get_parent_dir(__file__), "app_theme"),
+    )
+
+from dtk.ui.listview import ListView, ListItem
+from dtk.ui.scrolled_window import ScrolledWindow
+from dtk.ui.treeview import TreeView, TextItem
+import gtk
+import sys
+import time
+
+VIEW_WIDTH = 600
+VIEW_HEIGHT = 400
+
+def process_frames(widget, adjust, frames):
+    '''
+    Scroll view page by page and return average milliseconds of every frame.
+    '''
+    while gtk.events_pending():
+        gtk.main_iteration(False)
+
+    start_time = time.time()
+    for frame in xrange(frames):
+        # Scroll forward and back, then same rows expose again and again.
+        if frame % 2 == 0:
+            adjust.set_value(min(adjust.get_page_size() / 2, adjust.get_upper() - adjust.get_page_size()))
+        else:
+            adjust.set_value(0)
+
+        widget.queue_draw()
+        widget.window.process_updates(True)
+
+    return (time.time() - start_time) * 1000 / frames
+
+def benchmark_listview(row_number, enable_cache, frames):
+    listview = ListView()
+    listview.add_titles(["Title", "Artist", "Length"])
+    listview.add_items(map(lambda index: ListItem("Title %s" % index, "Artist %s" % index, "%s:00" % (index % 60)),
+                           xrange(row_number)))
+    listview.set_row_cache(enable_cache)
+
+    scrolled_window = ScrolledWindow()
+    scrolled_window.add_child(listview)
+
+    window = gtk.OffscreenWindow()
+    window.set_size_request(VIEW_WIDTH, VIEW_HEIGHT)
+    window.add(scrolled_window)
+    window.show_all()
+
+    frame_time = process_frames(listview, scrolled_window.get_vadjustment(), frames)
+
+    window.destroy()
+
+    return frame_time
+
+def benchmark_treeview(row_number, enable_cache, frames):
+    treeview = TreeView()
+    treeview.add_items(map(lambda index: TextItem("Node %s" % index), xrange(row_number)))
+    treeview.set_row_cache(enable_cache)
+
+    window = gtk.OffscreenWindow()
+    window.set_size_request(VIEW_WIDTH, VIEW_HEIGHT)
+    window.add(treeview)
+    window.show_all()
+
+    frame_time = process_frames(treeview.draw_area, treeview.scrolled_window.get_vadjustment(), frames)
+
+    window.destroy()
+
+    return frame_time
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        frames = int(sys.argv[1])
+    else:
+        frames = 200
+
+    for (name, benchmark) in [("ListView", benchmark_listview),
+                              ("TreeView", benchmark_treeview)]:
+        for row_number in [10000, 100000]:
+            without_cache = benchmark(row_number, False, frames)
+            with_cache = benchmark(row_number, True, frames)
+
+            print "%s %7d rows: %6.2f ms/frame without row cache, %6.2f ms/frame with row cache" % (
+                name, row_number, without_cache, with_cache)
@@ -20,8 +20,10 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+from frame_clock import animation_clock
 import copy
 import gobject
+import time
 
 def LinerInterpolator(factor, lower, upper):
     '''
@@ -51,9 +53,14 @@ class Animation:
     '''
     The animation class used to convenient production special effects.
 
+    Animation is driven by shared L{ I{animation_clock} <frame_clock.animation_clock>},
+    composited animations are computed in same tick with one start time.
+
     @undocumented: init
     @undocumented: init_all
     @undocumented: compute
+    @undocumented: tick
+    @undocumented: finish
     '''
     def __init__(self,
                  widgets,
@@ -94,8 +101,7 @@ class Animation:
 
         self.duration = duration
         self.interpolator = interpolator
-        self.time = 0
-        self.animation_id = None
+        self.start_time = None
         self.start_id = None
         self.other_concurent = []
         self.other_after = []
@@ -133,7 +139,6 @@ class Animation:
             self.set_method(*values)
         else:
             self.set_method(values)
-        self.time = 0
 
     def init_all(self, values):
         if isinstance(values, list):
@@ -155,27 +160,24 @@ class Animation:
         if self.start_id:
             gobject.source_remove(self.start_id)
         self.start_id = gobject.timeout_add(time, self.start)
-        for o in self.other_concurent:
-            o.start_after(time)
 
     def start(self):
         '''
         Start the animation object.
         '''
-        self.time = 0
-        self.animation_id = gobject.timeout_add(self.delay, self.compute)
-        for o in self.other_concurent:
-            o.start()
+        self.start_id = None
+        self.start_time = time.time() + self.delay / 1000.0
+        animation_clock.add_animation(self, self.tick)
         return False
 
     def stop(self):
         '''
         Stop immediately the animation object.
         '''
-        if self.animation_id:
-            gobject.source_remove(self.animation_id)
+        animation_clock.remove_animation(self)
         if self.start_id:
             gobject.source_remove(self.start_id)
+            self.start_id = None
 
         for o in self.other_concurent:
             o.stop()
@@ -184,27 +186,48 @@ class Animation:
         if self.stop_callback:
             self.stop_callback()
 
-    def compute(self):
-        if self.time >= self.duration+self.delay:
-            # Stop callback.
-            if self.stop_callback:
-                self.stop_callback()
+    def tick(self, now):
+        if self.compute((now - self.start_time) * 1000):
+            return True
+        else:
+            self.finish()
             return False
 
-        values = []
-        for r in self.ranges:
-            factor = float(self.time) / self.duration
-            value = self.interpolator(factor, r[0], r[1])
-            values.append(r[0]+value)
+    def finish(self):
+        for o in self.other_concurent:
+            o.finish()
+
+        # Stop callback.
+        if self.stop_callback:
+            self.stop_callback()
+
+    def compute(self, elapsed):
+        '''
+        Set values of animation and composited animations.
+
+        @param elapsed: Elapsed milliseconds since animation start.
+        @return: Return True if any animation is not finish.
+        '''
+        running = True
+        if elapsed >= 0:
+            if self.duration > 0:
+                factor = min(float(elapsed) / self.duration, 1.0)
+            else:
+                factor = 1.0
+
+            values = []
+            for r in self.ranges:
+                value = self.interpolator(factor, r[0], r[1])
+                values.append(r[0]+value)
 
-        self.set_method(*values)
+            self.set_method(*values)
+            running = factor < 1.0
 
         for o in self.other_concurent:
-            o.compute()
-
-        self.time += self.delay
+            # Compute all composited animations, don't short circuit.
+            running = o.compute(elapsed) or running
 
-        return True
+        return running
 
     def __mul__(self, other):
         '''
@@ -213,8 +236,11 @@ class Animation:
         @param other: the right hand side animation class.
         @return: the new animation class with the two operator animation's effect.
         '''
-        r = copy.deepcopy(self)
-        r.other_concurent.append(other)
+        # Shallow copy share widgets and setter with self, just composited list is new.
+        r = copy.copy(self)
+        r.start_time = None
+        r.start_id = None
+        r.other_concurent = self.other_concurent + [other]
         return r
 
     def __add__(self, other):
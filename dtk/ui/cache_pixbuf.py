@@ -20,15 +20,110 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import collections
 import gtk
 
+class ScaledPixbufCache(object):
+    '''
+    Process-wide cache of scaled pixbufs, evict least recently used pixbuf when memory over budget.
+
+    Cache key is identity of source pixbuf, scale size, interpolation type and mirror flags,
+    so widgets that switch pixbufs (such as hover and press) don't need scale pixbuf again.
+    '''
+
+    def __init__(self, max_bytes=32 * 1024 * 1024):
+        '''
+        Initialize ScaledPixbufCache class.
+
+        @param max_bytes: Memory budget of scaled pixbufs, in bytes, default is 32MB.
+        '''
+        self.max_bytes = max_bytes
+        self.cache_dict = collections.OrderedDict()
+        self.cache_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def scale(self, pixbuf, scale_width, scale_height,
+              interp_type=gtk.gdk.INTERP_BILINEAR,
+              vertical_mirror=False,
+              horizontal_mirror=False):
+        '''
+        Scale pixbuf with given size, return cached pixbuf if it has scaled before.
+
+        @param pixbuf: Original pixbuf.
+        @param scale_width: Scale width of pixbuf.
+        @param scale_height: Scale height of pixbuf.
+        @param interp_type: Interpolation type, default is gtk.gdk.INTERP_BILINEAR.
+        @param vertical_mirror: Whether pixbuf mirror vertically.
+        @param horizontal_mirror: Whether pixbuf mirror horizontally.
+        @return: Return scaled pixbuf.
+        '''
+        cache_key = (id(pixbuf), scale_width, scale_height, interp_type, vertical_mirror, horizontal_mirror)
+        cache_info = self.cache_dict.pop(cache_key, None)
+
+        # Id of pixbuf maybe reuse after original pixbuf freed, so check source pixbuf too.
+        if cache_info != None and cache_info[0] is pixbuf:
+            self.hits += 1
+        else:
+            self.misses += 1
+            if cache_info != None:
+                self.cache_bytes -= cache_info[2]
+
+            # Scale size.
+            scale_pixbuf = pixbuf.scale_simple(scale_width, scale_height, interp_type)
+
+            # Mirror pixbuf.
+            if vertical_mirror:
+                scale_pixbuf = scale_pixbuf.flip(True)
+
+            if horizontal_mirror:
+                scale_pixbuf = scale_pixbuf.flip(False)
+
+            cache_info = (pixbuf, scale_pixbuf, scale_pixbuf.get_rowstride() * scale_pixbuf.get_height())
+            self.cache_bytes += cache_info[2]
+
+            # Evict least recently used pixbufs, but always keep new pixbuf.
+            while self.cache_bytes > self.max_bytes and len(self.cache_dict) > 0:
+                (_, (_, _, evict_bytes)) = self.cache_dict.popitem(last=False)
+                self.cache_bytes -= evict_bytes
+                self.evictions += 1
+
+        self.cache_dict[cache_key] = cache_info
+
+        return cache_info[1]
+
+    def clear(self):
+        '''
+        Clear cache, call it when theme or skin changed.
+        '''
+        self.cache_dict.clear()
+        self.cache_bytes = 0
+
+    def get_stats(self):
+        '''
+        Get cache statistics.
+
+        @return: Return dict with hit, miss, eviction counters and memory usage.
+        '''
+        return {
+            "hits" : self.hits,
+            "misses" : self.misses,
+            "evictions" : self.evictions,
+            "cache_length" : len(self.cache_dict),
+            "cache_bytes" : self.cache_bytes,
+            "max_bytes" : self.max_bytes,
+            }
+
+scaled_pixbuf_cache = ScaledPixbufCache()
+
 class CachePixbuf(object):
     '''
     Cache pixbuf use to cache pixbuf to avoid new pixbuf generate by scale_simple.
 
     gtk.gdk.pixbuf.scale_simple is function will make application very slow,
 
-    We use CachePixbuf increase the call times of gtk.gdk.pixbuf.scale_simple.
+    CachePixbuf is view of global L{ I{ScaledPixbufCache} <ScaledPixbufCache>}, different instances share scaled pixbufs.
     '''
 
     def __init__(self):
@@ -52,32 +147,16 @@ class CachePixbuf(object):
         @param vertical_mirror: Whether pixbuf mirror vertically.
         @param horizontal_mirror: Whether pixbuf mirror horizontally.
         '''
-        if self.pixbuf != pixbuf or self.scale_width != scale_width or self.scale_height != scale_height:
-            # Record init value.
-            self.pixbuf = pixbuf # pixbuf always is same as create from file
-            self.scale_width = scale_width
-            self.scale_height = scale_height
-
-            # Scale size.
-            self.cache_pixbuf = pixbuf.scale_simple(scale_width, scale_height, gtk.gdk.INTERP_BILINEAR)
+        # Record value.
+        self.pixbuf = pixbuf # pixbuf always is same as create from file
+        self.scale_width = scale_width
+        self.scale_height = scale_height
+        self.vertical_mirror = vertical_mirror
+        self.horizontal_mirror = horizontal_mirror
 
-            # If vertical_mirror default is True, vertical mirror *original* pixbuf first.
-            if self.vertical_mirror:
-                self.cache_pixbuf = self.cache_pixbuf.flip(True)
-
-            # If horizontal_mirror default is True, horizontal mirror *original* pixbuf first.
-            if self.horizontal_mirror:
-                self.cache_pixbuf = self.cache_pixbuf.flip(False)
-
-        # If vertical_mirror changed, vertical mirror *self* first
-        if self.vertical_mirror != vertical_mirror:
-            self.vertical_mirror = vertical_mirror
-            self.cache_pixbuf = self.cache_pixbuf.flip(True)
-
-        # If horizontal_mirror changed, horizontal mirror *self* first
-        if self.horizontal_mirror != horizontal_mirror:
-            self.horizontal_mirror = horizontal_mirror
-            self.cache_pixbuf = self.cache_pixbuf.flip(False)
+        self.cache_pixbuf = scaled_pixbuf_cache.scale(
+            pixbuf, scale_width, scale_height, gtk.gdk.INTERP_BILINEAR,
+            vertical_mirror, horizontal_mirror)
 
     def get_cache(self):
         '''
@@ -86,4 +165,3 @@ class CachePixbuf(object):
         @return: Return cache pixbuf.
         '''
         return self.cache_pixbuf
-
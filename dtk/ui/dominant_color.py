@@ -20,45 +20,160 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-from PIL import Image
 from constant import SHADOW_SIZE
 from draw import draw_pixbuf, draw_vlinear, draw_hlinear
+from file_cache import get_cache_home, write_cache_file
+from threads import AnonymityThread, post_gui
 from utils import propagate_expose, color_hex_to_cairo, find_similar_color
+import collections
 import gtk
-import scipy
-import scipy.cluster
-import scipy.misc
+import marshal
+import numpy
+import os
+import threading as td
 import urllib
 
-__all__ = ["get_dominant_color"]
+__all__ = ["get_dominant_color", "get_dominant_color_async", "compute_dominant_color"]
+
+THUMBNAIL_SIZE = 150
+HISTOGRAM_BITS = 3
+DOMINANT_COLOR_CACHE_VERSION = 1
+DOMINANT_COLOR_CACHE_SIZE = 256
+
+dominant_color_dict = None
+dominant_color_lock = td.Lock()
+
+def get_pixbuf_rgb_array(pixbuf):
+    '''
+    Get RGB values of pixbuf, fully transparent pixels are dropped.
+
+    @param pixbuf: gtk.gdk.Pixbuf with 8 bits per sample.
+    @return: Return numpy array with shape (number of pixels, 3).
+    '''
+    width = pixbuf.get_width()
+    height = pixbuf.get_height()
+    rowstride = pixbuf.get_rowstride()
+    n_channels = pixbuf.get_n_channels()
+
+    # Last row of pixels is not padded to rowstride.
+    pixels = pixbuf.get_pixels()
+    pixels += "\0" * (rowstride * height - len(pixels))
+    array = numpy.frombuffer(pixels, numpy.uint8).reshape(height, rowstride)[:, :width * n_channels].reshape(-1, n_channels)
+
+    if n_channels == 4:
+        array = array[array[:, 3] > 0]
+
+    return array[:, :3].astype(numpy.int32)
+
+def compute_dominant_color(image_path):
+    '''
+    Compute dominant color of image, without cache.
+
+    Image is decoded in thumbnail size, pixels are counted in coarse color histogram,
+    dominant color is average color of pixels in most frequent bin.
+    Result is deterministic, same image always get same color.
+
+    @param image_path: Image path to parse.
+    @return: Return dominant color, format as hexadecimal number.
+    '''
+    pixbuf = gtk.gdk.pixbuf_new_from_file_at_size(image_path, THUMBNAIL_SIZE, THUMBNAIL_SIZE)
+    rgb = get_pixbuf_rgb_array(pixbuf)
+    if len(rgb) == 0:
+        return "#000000"
+
+    shift = 8 - HISTOGRAM_BITS
+    bins = ((rgb[:, 0] >> shift) << (HISTOGRAM_BITS * 2)) | ((rgb[:, 1] >> shift) << HISTOGRAM_BITS) | (rgb[:, 2] >> shift)
+    counts = numpy.bincount(bins, minlength=1 << (HISTOGRAM_BITS * 3))
+
+    # Argmax return first bin if some bins have same count.
+    peak = rgb[bins == counts.argmax()].mean(axis=0)
+
+    return "#%02x%02x%02x" % tuple(map(lambda value: int(round(value)), peak))
+
+def get_dominant_color_cache_path():
+    '''
+    Get cache path of dominant colors.
+
+    @return: Return cache path.
+    '''
+    return os.path.join(get_cache_home(), "deepin-ui", "dominant-color.cache")
+
+def get_dominant_color_cache():
+    '''
+    Get dominant color cache, cache file is loaded once, it must call with dominant_color_lock.
+
+    @return: Return OrderedDict that map image path to (file key, color).
+    '''
+    global dominant_color_dict
+
+    if dominant_color_dict == None:
+        dominant_color_dict = collections.OrderedDict()
+        cache_path = get_dominant_color_cache_path()
+        if os.path.exists(cache_path):
+            try:
+                with open(cache_path, "rb") as cache_file:
+                    (version, entries) = marshal.load(cache_file)
+                if version == DOMINANT_COLOR_CACHE_VERSION:
+                    for (image_path, file_key, color) in entries:
+                        dominant_color_dict[image_path] = (file_key, color)
+            except Exception, e:
+                print "get_dominant_color_cache: load %s got error: %s" % (cache_path, e)
+
+    return dominant_color_dict
 
 def get_dominant_color(image_path):
     '''
     Parse image and return dominant color in image.
 
+    Result is cached in memory and in ~/.cache/deepin-ui/dominant-color.cache, keyed by path and modification time of image,
+    so same image is just parsed once.
+
     @param image_path: Image path to parse.
     @return: Return dominant color, format as hexadecimal number.
     '''
-    # print 'reading image'
-    im = Image.open(image_path)
-    im = im.resize((150, 150))      # optional, to reduce time
-    ar = scipy.misc.fromimage(im)
-    shape = ar.shape
-    ar = ar.reshape(scipy.product(shape[:2]), shape[2])
-
-    # print 'finding clusters'
-    NUM_CLUSTERS = 5
-    codes, dist = scipy.cluster.vq.kmeans(ar.astype(scipy.float32), NUM_CLUSTERS)
-    # print 'cluster centres:\n', codes
-
-    vecs, dist = scipy.cluster.vq.vq(ar, codes)         # assign codes
-    counts, bins = scipy.histogram(vecs, len(codes))    # count occurrences
-
-    index_max = scipy.argmax(counts)                    # find most frequent
-    peak = codes[index_max]
-    colour = ''.join(chr(c) for c in peak).encode('hex')
-
-    return "#%s" % (colour[0:6])
+    image_path = os.path.abspath(image_path)
+    file_stat = os.stat(image_path)
+    file_key = (file_stat.st_mtime, file_stat.st_size)
+
+    with dominant_color_lock:
+        cache_info = get_dominant_color_cache().get(image_path)
+    if cache_info != None and cache_info[0] == file_key:
+        return cache_info[1]
+
+    color = compute_dominant_color(image_path)
+
+    with dominant_color_lock:
+        cache_dict = get_dominant_color_cache()
+        cache_dict.pop(image_path, None)
+        cache_dict[image_path] = (file_key, color)
+        while len(cache_dict) > DOMINANT_COLOR_CACHE_SIZE:
+            cache_dict.popitem(last=False)
+
+        cache_data = (DOMINANT_COLOR_CACHE_VERSION,
+                      map(lambda (path, (key, value)): (path, key, value), cache_dict.items()))
+        def write_cache(temp_filepath):
+            with open(temp_filepath, "wb") as cache_file:
+                marshal.dump(cache_data, cache_file)
+
+        write_cache_file(get_dominant_color_cache_path(), write_cache)
+
+    return color
+
+def get_dominant_color_async(image_path, finish_callback):
+    '''
+    Parse dominant color of image in background thread.
+
+    @param image_path: Image path to parse.
+    @param finish_callback: Callback when parse finish, it's called in GUI thread, argument is dominant color, or None if image can't parse.
+    '''
+    def parse_color():
+        try:
+            return get_dominant_color(image_path)
+        except Exception, e:
+            print "get_dominant_color_async: parse %s got error: %s" % (image_path, e)
+            return None
+
+    AnonymityThread(parse_color, post_gui(finish_callback)).start()
 
 class ColorTestWidget(gtk.DrawingArea):
     '''
@@ -23,15 +23,128 @@
 from constant import DEFAULT_FONT, DEFAULT_FONT_SIZE
 from math import pi
 import cairo
+import collections
 import dtk_cairo_blur
 import gtk
 import math
 import pango
-import pangocairo
+from text_metrics import text_metrics
 from utils import (cairo_state, cairo_disable_antialias, color_hex_to_cairo,
                    add_color_stop_rgba, propagate_expose,
                    alpha_color_hex_to_cairo)
 
+class PatternCache(object):
+    '''
+    Cache of gradient patterns.
+
+    Pattern is created at origin and keyed by (geometry class, size, direction, color_infos),
+    draw functions translate cairo context to draw position, then same pattern is reused at any position.
+    Keys contain color values, so patterns don't need drop after theme changed.
+    '''
+
+    def __init__(self, cache_size=256):
+        '''
+        Initialize PatternCache class.
+
+        @param cache_size: The max number of patterns in cache, default is 256.
+        '''
+        self.cache_size = cache_size
+        self.cache_dict = collections.OrderedDict()
+        self.enable = True
+        self.hits = 0
+        self.misses = 0
+
+    def set_enable(self, enable):
+        '''
+        Enable or disable pattern cache, it's enable default.
+
+        @param enable: Set as False to create pattern every time.
+        '''
+        self.enable = enable
+        self.clear()
+
+    def get_color_key(self, color_infos):
+        '''
+        Internal function to get hashable key of color_infos, return None if color_infos can't hash.
+        '''
+        try:
+            color_key = tuple(color_infos)
+            hash(color_key)
+            return color_key
+        except TypeError:
+            return None
+
+    def get_pattern(self, pattern_key, create_pattern, color_infos):
+        '''
+        Internal function to get pattern from cache, or create pattern and add color stops.
+        '''
+        pattern = None
+        if self.enable:
+            color_key = self.get_color_key(color_infos)
+            if color_key != None:
+                cache_key = pattern_key + (color_key,)
+                pattern = self.cache_dict.pop(cache_key, None)
+
+        if pattern == None:
+            self.misses += 1
+            pattern = create_pattern(*pattern_key[1:])
+            for (pos, color_info) in color_infos:
+                add_color_stop_rgba(pattern, pos, color_info)
+
+            if self.enable and color_key != None:
+                if len(self.cache_dict) >= self.cache_size:
+                    self.cache_dict.popitem(last=False)
+                self.cache_dict[cache_key] = pattern
+        else:
+            self.hits += 1
+            # Insert at end of cache, make it most recently used.
+            self.cache_dict[cache_key] = pattern
+
+        return pattern
+
+    def get_linear_pattern(self, x1, y1, x2, y2, color_infos):
+        '''
+        Get linear gradient pattern.
+
+        @param x1: X coordinate of start point.
+        @param y1: Y coordinate of start point.
+        @param x2: X coordinate of end point.
+        @param y2: Y coordinate of end point.
+        @param color_infos: A list of ColorInfo, ColorInfo format: (color_stop_position, (color_hex_value, color_alpha))
+        @return: Return cairo.LinearGradient.
+        '''
+        return self.get_pattern(("linear", x1, y1, x2, y2), cairo.LinearGradient, color_infos)
+
+    def get_radial_pattern(self, r, color_infos):
+        '''
+        Get radial gradient pattern that center at origin, color from outside to center.
+
+        @param r: Radious of radial gradient.
+        @param color_infos: A list of ColorInfo, ColorInfo format: (color_stop_position, (color_hex_value, color_alpha))
+        @return: Return cairo.RadialGradient.
+        '''
+        return self.get_pattern(("radial", 0, 0, r, 0, 0, 0), cairo.RadialGradient, color_infos)
+
+    def clear(self):
+        '''
+        Clear cache.
+        '''
+        self.cache_dict.clear()
+
+    def get_stats(self):
+        '''
+        Get cache statistics.
+
+        @return: Return dict with hit and miss counters.
+        '''
+        return {
+            "hits" : self.hits,
+            "misses" : self.misses,
+            "cache_length" : len(self.cache_dict),
+            }
+
+pattern_cache = PatternCache()
+
 def draw_radial_ring(cr, x, y, outer_radius, inner_radius, color_infos, clip_corner=None):
     '''
     Draw radial ring.
@@ -442,21 +555,9 @@ def render_text(cr, markup,
         # Set color.
         cr.set_source_rgb(*color_hex_to_cairo(text_color))
 
-        # Create pangocairo context.
-        context = pangocairo.CairoContext(cr)
-
-        # Set layout.
-        layout = context.create_layout()
-        layout.set_font_description(pango.FontDescription("%s %s" % (text_font, text_size)))
-        layout.set_markup(markup)
-        layout.set_alignment(alignment)
-        if wrap_width == None:
-            layout.set_single_paragraph_mode(True)
-            layout.set_width(w * pango.SCALE)
-            layout.set_ellipsize(ellipsize)
-        else:
-            layout.set_width(wrap_width * pango.SCALE)
-            layout.set_wrap(pango.WRAP_WORD)
+        # Get layout, reuse cached layout if cell text not changed.
+        (context, layout) = text_metrics.get_layout(
+            cr, markup, text_size, text_font, alignment, w, wrap_width, ellipsize)
 
         (text_width, text_height) = layout.get_pixel_size()
 
@@ -533,12 +634,10 @@ def draw_vlinear(cr, x, y, w, h, color_infos, radius=0, top_to_bottom=True):
         cr.translate(0, y)
 
         if top_to_bottom:
-            pat = cairo.LinearGradient(0, 0, 0, h)
+            pat = pattern_cache.get_linear_pattern(0, 0, 0, h, color_infos)
         else:
-            pat = cairo.LinearGradient(0, h, 0, 0)
+            pat = pattern_cache.get_linear_pattern(0, h, 0, 0, color_infos)
 
-        for (pos, color_info) in color_infos:
-            add_color_stop_rgba(pat, pos, color_info)
         cr.set_operator(cairo.OPERATOR_OVER)
         cr.set_source(pat)
         draw_round_rectangle(cr, x, 0, w, h, radius)
@@ -563,11 +662,10 @@ def draw_hlinear(cr, x, y, w, h, color_infos, radius=0, left_to_right=True):
         cr.translate(x, 0)
 
         if left_to_right:
-            pat = cairo.LinearGradient(0, 0, w, 0)
+            pat = pattern_cache.get_linear_pattern(0, 0, w, 0, color_infos)
         else:
-            pat = cairo.LinearGradient(w, 0, 0, 0)
-        for (pos, color_info) in color_infos:
-            add_color_stop_rgba(pat, pos, color_info)
+            pat = pattern_cache.get_linear_pattern(w, 0, 0, 0, color_infos)
+
         cr.set_operator(cairo.OPERATOR_OVER)
         cr.set_source(pat)
         draw_round_rectangle(cr, 0, y, w, h, radius)
@@ -721,12 +819,12 @@ def draw_radial_round(cr, x, y, r, color_infos):
     @param r: Radious of radial round.
     @param color_infos: A list of ColorInfo, ColorInfo format: (color_stop_position, (color_hex_value, color_alpha))
     '''
-    radial = cairo.RadialGradient(x, y, r, x, y, 0)
-    for (pos, color_info) in color_infos:
-        add_color_stop_rgba(radial, pos, color_info)
-    cr.arc(x, y, r, 0, 2 * math.pi)
-    cr.set_source(radial)
-    cr.fill()
+    with cairo_state(cr):
+        # Pattern is created at origin, translate to center of round.
+        cr.translate(x, y)
+        cr.arc(0, 0, r, 0, 2 * math.pi)
+        cr.set_source(pattern_cache.get_radial_pattern(r, color_infos))
+        cr.fill()
 
 def draw_blank_mask(cr, x, y, w, h):
     '''
@@ -739,3 +837,57 @@ def draw_blank_mask(cr, x, y, w, h):
     @param h: Width of rectangle area.
     '''
     pass
+
+fade_mask_dict = collections.OrderedDict()
+FADE_MASK_CACHE_SIZE = 8
+
+def get_fade_mask(width, height, fade_in=True):
+    '''
+    Get alpha mask surface for fade edge, mask is cached with given size.
+
+    @param width: Width of mask.
+    @param height: Height of mask.
+    @param fade_in: Alpha fade in from top to bottom if True, otherwise fade out, default is True.
+    @return: Return cairo.ImageSurface with FORMAT_A8.
+    '''
+    mask_key = (width, height, fade_in)
+    mask_surface = fade_mask_dict.pop(mask_key, None)
+    if mask_surface == None:
+        mask_surface = cairo.ImageSurface(cairo.FORMAT_A8, width, height)
+        mask_cr = cairo.Context(mask_surface)
+        mask_cr.set_operator(cairo.OPERATOR_SOURCE)
+        for i in range(0, height):
+            alpha = math.sin(i * math.pi / 2 / height)
+            if not fade_in:
+                alpha = 1.0 - alpha
+            mask_cr.set_source_rgba(0, 0, 0, alpha)
+            mask_cr.rectangle(0, i, width, 1)
+            mask_cr.fill()
+
+        if len(fade_mask_dict) >= FADE_MASK_CACHE_SIZE:
+            fade_mask_dict.popitem(last=False)
+
+    fade_mask_dict[mask_key] = mask_surface
+
+    return mask_surface
+
+def draw_fade_surface(cr, surface, surface_x, surface_y, x, y, w, h, fade_in=True):
+    '''
+    Draw surface with fade edge, use one mask operation instead paint line by line.
+
+    @param cr: Cairo context.
+    @param surface: Surface to draw.
+    @param surface_x: X coordinate of surface.
+    @param surface_y: Y coordinate of surface.
+    @param x: X coordinate of fade area.
+    @param y: Y coordinate of fade area.
+    @param w: Width of fade area.
+    @param h: Height of fade area.
+    @param fade_in: Alpha fade in from top to bottom if True, otherwise fade out, default is True.
+    '''
+    if w > 0 and h > 0:
+        with cairo_state(cr):
+            cr.rectangle(x, y, w, h)
+            cr.clip()
+            cr.set_source_surface(surface, surface_x, surface_y)
+            cr.mask_surface(get_fade_mask(w, h, fade_in), x, y)
@@ -0,0 +1,362 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2011 ~ 2012 Deepin, Inc.
+#               2011 ~ 2012 Wang Yong
+#
+# Author:     Wang Yong <lazycat.manatee@gmail.com>
+# Maintainer: Wang Yong <lazycat.manatee@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from constant import DEFAULT_FONT, DEFAULT_FONT_SIZE
+import atexit
+import collections
+import gobject
+import gtk
+import hashlib
+import marshal
+import os
+import time
+
+__all__ = ["FileMetadataCache", "file_metadata_cache", "get_cache_home", "get_thumbnail"]
+
+METADATA_CACHE_VERSION = 1
+
+def get_cache_home():
+    '''
+    Get cache directory of user, follow XDG base directory specification.
+
+    @return: Return $XDG_CACHE_HOME, or ~/.cache if $XDG_CACHE_HOME is not set.
+    '''
+    return os.getenv("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+
+def write_cache_file(filepath, write_callback, mode=0600):
+    '''
+    Write cache file atomically, reader never see half written file.
+
+    @param filepath: Path of cache file.
+    @param write_callback: Callback to write content, argument is temp file path.
+    @param mode: Permission of cache file, default is 0600.
+    @return: Return True if write successfully.
+    '''
+    temp_filepath = "%s.%s.tmp" % (filepath, os.getpid())
+    try:
+        cache_dir = os.path.dirname(filepath)
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir, 0700)
+
+        write_callback(temp_filepath)
+        os.chmod(temp_filepath, mode)
+        os.rename(temp_filepath, filepath)
+        return True
+    except Exception, e:
+        print "write_cache_file: write %s got error: %s" % (filepath, e)
+
+        if os.path.exists(temp_filepath):
+            os.remove(temp_filepath)
+        return False
+
+def get_thumbnail_path(uri, thumbnail_size):
+    '''
+    Get thumbnail path of uri, follow freedesktop thumbnail managing standard.
+
+    @param uri: Uri of file.
+    @param thumbnail_size: Thumbnail size, "normal" or "large".
+    @return: Return thumbnail path.
+    '''
+    return os.path.join(get_cache_home(), "thumbnails", thumbnail_size, "%s.png" % hashlib.md5(uri).hexdigest())
+
+def load_thumbnail(uri, mtime, thumbnail_size):
+    '''
+    Load thumbnail of uri, return None if thumbnail not exists or file changed after thumbnail created.
+
+    @param uri: Uri of file.
+    @param mtime: Modification time of file.
+    @param thumbnail_size: Thumbnail size, "normal" or "large".
+    @return: Return thumbnail pixbuf, or None.
+    '''
+    thumbnail_path = get_thumbnail_path(uri, thumbnail_size)
+    if os.path.exists(thumbnail_path):
+        try:
+            pixbuf = gtk.gdk.pixbuf_new_from_file(thumbnail_path)
+        except gobject.GError:
+            return None
+
+        if (pixbuf.get_option("tEXt::Thumb::URI") == uri
+            and pixbuf.get_option("tEXt::Thumb::MTime") == str(int(mtime))):
+            return pixbuf
+
+    return None
+
+def save_thumbnail(uri, mtime, pixbuf, thumbnail_size):
+    '''
+    Save thumbnail of uri, thumbnail can share with other applications.
+
+    @param uri: Uri of file.
+    @param mtime: Modification time of file.
+    @param pixbuf: Thumbnail pixbuf.
+    @param thumbnail_size: Thumbnail size, "normal" or "large".
+    '''
+    options = {
+        "tEXt::Thumb::URI" : uri,
+        "tEXt::Thumb::MTime" : str(int(mtime)),
+        "tEXt::Software" : "deepin-ui",
+        }
+    write_cache_file(get_thumbnail_path(uri, thumbnail_size),
+                     lambda temp_filepath: pixbuf.save(temp_filepath, "png", options))
+
+def get_thumbnail(filepath, uri, mtime, icon_size):
+    '''
+    Get thumbnail of image file, thumbnail is created and saved if it not exists.
+
+    This function don't use GTK+ widget, so it can call in background thread.
+
+    @param filepath: Path of image file.
+    @param uri: Uri of image file.
+    @param mtime: Modification time of image file.
+    @param icon_size: Icon size, thumbnail is scaled in icon size.
+    @return: Return thumbnail pixbuf, or None if image can't decode.
+    '''
+    if icon_size <= 128:
+        (thumbnail_size, thumbnail_pixel) = ("normal", 128)
+    else:
+        (thumbnail_size, thumbnail_pixel) = ("large", 256)
+
+    pixbuf = load_thumbnail(uri, mtime, thumbnail_size)
+    if pixbuf == None:
+        try:
+            pixbuf = gtk.gdk.pixbuf_new_from_file_at_size(filepath, thumbnail_pixel, thumbnail_pixel)
+        except gobject.GError:
+            return None
+
+        save_thumbnail(uri, mtime, pixbuf, thumbnail_size)
+
+    # Scale thumbnail in icon size, keep aspect ratio.
+    width = pixbuf.get_width()
+    height = pixbuf.get_height()
+    scale = min(float(icon_size) / width, float(icon_size) / height, 1.0)
+    if scale < 1.0:
+        pixbuf = pixbuf.scale_simple(max(int(width * scale), 1),
+                                     max(int(height * scale), 1),
+                                     gtk.gdk.INTERP_BILINEAR)
+
+    return pixbuf
+
+class FileMetadataCache(object):
+    '''
+    Persistent cache of display metadata of files, such as formatted time, content type description and text widths.
+
+    Metadata of every directory is saved in one index file under ~/.cache/deepin-ui,
+    index is loaded with one read when directory open again, entry is valid when (mtime, size) of file is not changed.
+    Index is dropped when locale, timezone or font changed, because display strings and widths depend on them.
+
+    Index use marshal format, it just contain plain data, and load faster than pickle.
+    '''
+
+    def __init__(self, cache_dir=None, max_dir_number=64, save_delay=2000):
+        '''
+        Initialize FileMetadataCache class.
+
+        @param cache_dir: Directory to save index files, default is None to use ~/.cache/deepin-ui/file-metadata.
+        @param max_dir_number: The max number of directory indexes in memory, default is 64.
+        @param save_delay: Delay time to save changed indexes, in milliseconds, default is 2000.
+        '''
+        if cache_dir == None:
+            cache_dir = os.path.join(get_cache_home(), "deepin-ui", "file-metadata")
+        self.cache_dir = cache_dir
+        self.max_dir_number = max_dir_number
+        self.save_delay = save_delay
+        self.enable = False
+        self.index_dict = collections.OrderedDict()
+        self.dirty_dirs = set()
+        self.save_id = None
+        self.hits = 0
+        self.misses = 0
+
+    def set_enable(self, enable):
+        '''
+        Enable or disable cache, cache is disable default.
+
+        @param enable: Set as True to enable cache.
+        '''
+        if self.enable and not enable:
+            self.save()
+
+        self.enable = enable
+
+    def can_cache(self, path):
+        '''
+        Internal function to check whether cache metadata of path, only local file is cached.
+        '''
+        return self.enable and os.path.isabs(path)
+
+    def get_index_header(self):
+        '''
+        Internal function to get header of index, index is invalid when header changed.
+        '''
+        return (METADATA_CACHE_VERSION, os.getenv("LANG"), time.timezone, DEFAULT_FONT, DEFAULT_FONT_SIZE)
+
+    def get_index_path(self, dir_path):
+        '''
+        Internal function to get index file path of directory.
+        '''
+        return os.path.join(self.cache_dir, "%s.index" % hashlib.md5(dir_path).hexdigest())
+
+    def get_index(self, dir_path):
+        '''
+        Internal function to get index of directory, index file is loaded once.
+        '''
+        entries = self.index_dict.pop(dir_path, None)
+        if entries == None:
+            entries = {}
+            index_path = self.get_index_path(dir_path)
+            if os.path.exists(index_path):
+                try:
+                    with open(index_path, "rb") as index_file:
+                        (header, index_dir_path, index_entries) = marshal.load(index_file)
+                    if header == self.get_index_header() and index_dir_path == dir_path:
+                        entries = index_entries
+                except Exception, e:
+                    print "FileMetadataCache: load %s got error: %s" % (index_path, e)
+
+            # Save and drop least recently used index.
+            if len(self.index_dict) >= self.max_dir_number:
+                (drop_dir_path, drop_entries) = self.index_dict.popitem(last=False)
+                if drop_dir_path in self.dirty_dirs:
+                    self.save_index(drop_dir_path, drop_entries)
+
+        # Insert at end of cache, make it most recently used.
+        self.index_dict[dir_path] = entries
+
+        return entries
+
+    def get_metadata(self, file_record):
+        '''
+        Get cached metadata of file.
+
+        @param file_record: FileRecord of file.
+        @return: Return metadata dict, or None if cache is disable or file changed.
+        '''
+        if not self.can_cache(file_record.path):
+            return None
+
+        (dir_path, name) = os.path.split(os.path.normpath(file_record.path))
+        entry = self.get_index(dir_path).get(name)
+        if entry != None and entry[0] == (file_record.modification_time, file_record.size):
+            self.hits += 1
+            return entry[1]
+        else:
+            self.misses += 1
+            return None
+
+    def set_metadata(self, file_record, metadata):
+        '''
+        Set metadata of file, index is saved later.
+
+        @param file_record: FileRecord of file.
+        @param metadata: Metadata dict, value must be plain data that marshal support.
+        '''
+        if self.can_cache(file_record.path):
+            (dir_path, name) = os.path.split(os.path.normpath(file_record.path))
+            self.get_index(dir_path)[name] = ((file_record.modification_time, file_record.size), metadata)
+            self.mark_dirty(dir_path)
+
+    def retain(self, dir_path, names):
+        '''
+        Drop entries of deleted files, call it after directory is loaded.
+
+        @param dir_path: Directory path.
+        @param names: Names of all files in directory.
+        '''
+        if self.can_cache(dir_path):
+            dir_path = os.path.normpath(dir_path)
+            entries = self.get_index(dir_path)
+            name_set = set(names)
+            drop_names = filter(lambda name: not name in name_set, entries)
+            if len(drop_names) > 0:
+                for name in drop_names:
+                    del entries[name]
+                self.mark_dirty(dir_path)
+
+    def mark_dirty(self, dir_path):
+        '''
+        Internal function to mark index changed, and save index later.
+        '''
+        self.dirty_dirs.add(dir_path)
+
+        if self.save_id == None:
+            self.save_id = gobject.timeout_add(self.save_delay, self.save)
+
+    def save_index(self, dir_path, entries):
+        '''
+        Internal function to save index of directory.
+        '''
+        self.dirty_dirs.discard(dir_path)
+
+        index_data = (self.get_index_header(), dir_path, entries)
+        def write_index(temp_filepath):
+            with open(temp_filepath, "wb") as index_file:
+                marshal.dump(index_data, index_file)
+
+        write_cache_file(self.get_index_path(dir_path), write_index)
+
+    def save(self):
+        '''
+        Save changed indexes.
+        '''
+        if self.save_id:
+            gobject.source_remove(self.save_id)
+            self.save_id = None
+
+        for dir_path in list(self.dirty_dirs):
+            if dir_path in self.index_dict:
+                self.save_index(dir_path, self.index_dict[dir_path])
+
+        self.dirty_dirs.clear()
+
+        return False
+
+    def clear(self):
+        '''
+        Drop all indexes in memory and on disk.
+        '''
+        if self.save_id:
+            gobject.source_remove(self.save_id)
+            self.save_id = None
+
+        self.index_dict.clear()
+        self.dirty_dirs.clear()
+
+        if os.path.isdir(self.cache_dir):
+            for filename in os.listdir(self.cache_dir):
+                os.remove(os.path.join(self.cache_dir, filename))
+
+    def get_stats(self):
+        '''
+        Get cache statistics.
+
+        @return: Return dict with hit and miss counters.
+        '''
+        return {
+            "hits" : self.hits,
+            "misses" : self.misses,
+            "index_length" : len(self.index_dict),
+            "dirty_length" : len(self.dirty_dirs),
+            }
+
+file_metadata_cache = FileMetadataCache()
+
+# Save changed indexes before program exit.
+atexit.register(file_metadata_cache.save)
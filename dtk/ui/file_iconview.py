@@ -21,9 +21,8 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import collections
-from gio_utils import (get_file_icon_pixbuf, is_directory, get_dir_child_files,
-                       get_file_type_dict,
-                       get_gfile_name, sort_file_by_name)
+from gio_utils import (file_icon_cache, get_file_type_dict,
+                       get_file_record, get_dir_child_records, sort_record_by_name)
 from draw import draw_pixbuf, draw_text, draw_vlinear
 from theme import ui_theme
 import pango
@@ -111,17 +110,25 @@ class DirItem(gobject.GObject):
     LOADING_START = 1
     LOADING_FINSIH = 2
 
-    def __init__(self, gfile, icon_size):
+    def __init__(self, gfile, icon_size, file_record=None):
         '''
         Initialize DirItem class.
+
+        @param gfile: gio.File of item.
+        @param icon_size: Icon size.
+        @param file_record: FileRecord of item, default is None to query attributes from gfile.
         '''
         # Init.
         gobject.GObject.__init__(self)
+        if file_record == None:
+            file_record = get_file_record(gfile)
         self.gfile = gfile
-        self.name = get_gfile_name(self.gfile)
+        self.file_record = file_record
+        self.name = file_record.name
+        self.type = file_record.type
         self.directory_path = gfile.get_path()
         self.icon_size = icon_size
-        self.pixbuf = get_file_icon_pixbuf(self.directory_path, self.icon_size)
+        self.pixbuf = None
         self.is_button_press = False;
 
     def render(self, cr, rect):
@@ -133,7 +140,8 @@ class DirItem(gobject.GObject):
             draw_vlinear(cr, rect.x ,rect.y, rect.width, rect.height,
                          ui_theme.get_shadow_color("listview_select").get_color_info())
 
-        # Draw directory icon.
+        # Draw directory icon, draw generic icon before icon is loaded.
+        self.pixbuf = file_icon_cache.get_pixbuf(self.file_record, self.icon_size, self.update_pixbuf)
         draw_pixbuf(cr, self.pixbuf,
                     rect.x + self.icon_size / 2,
                     rect.y + (rect.height - self.icon_size) / 2,
@@ -157,6 +165,23 @@ class DirItem(gobject.GObject):
         '''
         self.emit("redraw-request")
 
+    def update_pixbuf(self, pixbuf):
+        '''
+        Callback when icon is loaded.
+        '''
+        self.emit_redraw_request()
+
+    def update_file_record(self, file_record):
+        '''
+        Update record when file changed, icon is loaded again.
+
+        @param file_record: New FileRecord of item.
+        '''
+        self.file_record = file_record
+        self.pixbuf = None
+
+        self.emit_redraw_request()
+
     def get_width(self):
         '''
         Get item width.
@@ -282,17 +307,25 @@ class FileItem(gobject.GObject):
     LOADING_START = 1
     LOADING_FINSIH = 2
 
-    def __init__(self, gfile, icon_size):
+    def __init__(self, gfile, icon_size, file_record=None):
         '''
         Initialize DirItem class.
+
+        @param gfile: gio.File of item.
+        @param icon_size: Icon size.
+        @param file_record: FileRecord of item, default is None to query attributes from gfile.
         '''
         # Init.
         gobject.GObject.__init__(self)
+        if file_record == None:
+            file_record = get_file_record(gfile)
         self.gfile = gfile
-        self.name = get_gfile_name(self.gfile)
+        self.file_record = file_record
+        self.name = file_record.name
+        self.type = file_record.type
         self.directory_path = gfile.get_path()
         self.icon_size = icon_size
-        self.pixbuf = get_file_icon_pixbuf(self.directory_path, self.icon_size)
+        self.pixbuf = None
         self.is_button_press = False;
 
     def render(self, cr, rect):
@@ -304,7 +337,8 @@ class FileItem(gobject.GObject):
             draw_vlinear(cr, rect.x ,rect.y, rect.width, rect.height,
                          ui_theme.get_shadow_color("listview_select").get_color_info())
 
-        # Draw directory icon.
+        # Draw directory icon, draw generic icon before icon is loaded.
+        self.pixbuf = file_icon_cache.get_pixbuf(self.file_record, self.icon_size, self.update_pixbuf)
         draw_pixbuf(cr, self.pixbuf,
                     rect.x + self.icon_size / 2,
                     rect.y + (rect.height - self.icon_size) / 2,
@@ -328,6 +362,23 @@ class FileItem(gobject.GObject):
         '''
         self.emit("redraw-request")
 
+    def update_pixbuf(self, pixbuf):
+        '''
+        Callback when icon is loaded.
+        '''
+        self.emit_redraw_request()
+
+    def update_file_record(self, file_record):
+        '''
+        Update record when file changed, icon is loaded again.
+
+        @param file_record: New FileRecord of item.
+        '''
+        self.file_record = file_record
+        self.pixbuf = None
+
+        self.emit_redraw_request()
+
     def get_width(self):
         '''
         Get item width.
@@ -414,7 +465,12 @@ class FileItem(gobject.GObject):
         Handle double click event.
 
         '''
-        app_info = gio.app_info_get_default_for_type(self.gfile.query_info("standard::content-type").get_content_type(), False)
+        # Content type is read when file record is created, don't query file again.
+        content_type = self.file_record.content_type
+        if content_type == None:
+            app_info = None
+        else:
+            app_info = gio.app_info_get_default_for_type(content_type, False)
         if app_info:
             app_info.launch([self.gfile], None)
         else:
@@ -489,9 +545,19 @@ def iconview_get_dir_items(dir_path, icon_size=48, show_hidden=False):
     Get children items with given directory path.
     '''
     items = []
-    for gfile in get_dir_child_files(dir_path, sort_file_by_name, False, show_hidden):
-        if is_directory(gfile):
-            items.append(DirItem(gfile, icon_size))
-        else:
-            items.append(FileItem(gfile, icon_size))
+    for file_record in get_dir_child_records(dir_path, sort_record_by_name, False, show_hidden):
+        items.append(create_icon_item(file_record, icon_size))
     return items
+
+def create_icon_item(file_record, icon_size=48):
+    '''
+    Create DirItem or FileItem with given file record.
+
+    @param file_record: FileRecord.
+    @param icon_size: Icon size, default is 48.
+    @return: Return DirItem if record is directory, otherwise return FileItem.
+    '''
+    if file_record.is_directory():
+        return DirItem(file_record.get_gfile(), icon_size, file_record)
+    else:
+        return FileItem(file_record.get_gfile(), icon_size, file_record)
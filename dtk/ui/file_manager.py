@@ -26,9 +26,11 @@ from locales import _
 from theme import ui_theme
 from paned import HPaned
 from categorybar import Categorybar
-from file_iconview import (FileIconView, iconview_get_dir_items)
+from file_iconview import FileIconView, create_icon_item
 from treeview import TreeView
-from file_treeview import get_dir_items
+from file_treeview import DirItem, create_item
+from file_cache import file_metadata_cache
+from gio_utils import file_icon_cache, DirLoader, DirWatcher, merge_file_records, update_file_records
 
 class FileManager(HPaned):
     HOME_DIR = os.getenv("HOME", "") + "/"
@@ -37,9 +39,21 @@ class FileManager(HPaned):
 
     def __init__(self,
                  dir=HOME_DIR,
-                 view_mode=ICONVIEW
+                 view_mode=ICONVIEW,
+                 enable_cache=False,
                 ):
+        '''
+        Initialize FileManager class.
+
+        @param dir: Directory to open, default is home directory.
+        @param view_mode: View mode, ICONVIEW or TREEVIEW, default is ICONVIEW.
+        @param enable_cache: Whether enable persistent metadata cache and thumbnails of images, default is False, application should opt in because cache is written under ~/.cache.
+        '''
         HPaned.__init__(self)
+        if enable_cache:
+            file_metadata_cache.set_enable(True)
+            file_icon_cache.set_thumbnail_enable(True)
+
         self.categorybar = Categorybar([
             (ui_theme.get_pixbuf("filemanager/computer.png"), _("Computer"), None),
             (ui_theme.get_pixbuf("filemanager/user-home.png"), _("Home"), lambda : self.open_dir(self.HOME_DIR)),
@@ -53,16 +67,132 @@ class FileManager(HPaned):
             ])
         self.icon_size = 48
         self.iconview = FileIconView()
-        self.iconview.add_items(iconview_get_dir_items(dir, self.icon_size))
-        self.treeview = TreeView(get_dir_items(dir))
+        self.treeview = TreeView()
+        self.dir_loader = None
+        self.dir_watcher = None
+        self.records = []
+        self.record_items = {}
         self.add1(self.categorybar)
         if view_mode == self.ICONVIEW:
             self.add2(self.iconview)
         else:
             self.add2(self.treeview)
 
+        self.open_dir(dir)
+
     def open_dir(self, dir):
-        self.iconview.add_items(iconview_get_dir_items(dir), True)
-        self.treeview.add_items(get_dir_items(dir), None, True)
+        '''
+        Open directory, children are loaded in batches and show when every batch arrive.
+
+        @param dir: Directory path.
+        '''
+        # Cancel loading and watching of previous directory.
+        if self.dir_loader:
+            self.dir_loader.cancel()
+
+        if self.dir_watcher:
+            self.dir_watcher.stop()
+            self.dir_watcher = None
+
+        for item in self.treeview.get_items():
+            if isinstance(item, DirItem):
+                item.cancel_load()
+
+        self.records = []
+        self.record_items = {}
+        self.iconview.add_items([], True)
+        self.treeview.clear()
+
+        # Scan directory once for both views.
+        self.dir_loader = DirLoader(dir, self.load_batch, lambda : self.finish_load(dir))
+        self.dir_loader.start()
+
+    def finish_load(self, dir):
+        '''
+        Internal callback when directory load finish, watch directory to apply changes.
+        '''
+        file_metadata_cache.retain(dir, map(lambda record: record.name, self.records))
+
+        self.dir_watcher = DirWatcher(dir, self.apply_changes)
+        self.dir_watcher.start()
+
+    def load_batch(self, records):
+        '''
+        Internal callback to merge batch of records into views.
+        '''
+        new_icon_items = []
+        new_tree_items = []
+        for record in records:
+            icon_item = create_icon_item(record, self.icon_size)
+            tree_item = create_item(record)
+            self.record_items[record.path] = (icon_item, tree_item)
+            new_icon_items.append(icon_item)
+            new_tree_items.append(tree_item)
+
+        self.records = merge_file_records(self.records, records)
+
+        # Get merged order, child items of expanded directory follow their parent.
+        icon_items = []
+        tree_items = []
+        for record in self.records:
+            (icon_item, tree_item) = self.record_items[record.path]
+            icon_items.append(icon_item)
+            tree_items.append(tree_item)
+            if isinstance(tree_item, DirItem) and tree_item.is_expand:
+                tree_items += tree_item.get_visible_child_items()
+
+        # Just add new items, then move items to merged order.
+        iconview = self.iconview.file_iconview
+        iconview.add_items(new_icon_items)
+        iconview.set_items(icon_items)
+
+        self.treeview.add_items(new_tree_items)
+        self.treeview.reorder_items(tree_items)
+
+    def apply_changes(self, changed_records, deleted_paths):
+        '''
+        Internal callback when directory changed, only changed items are added or deleted,
+        then views keep select status and scroll position.
+        '''
+        (self.records, added_records, updated_records, removed_paths) = update_file_records(
+            self.records, changed_records, deleted_paths)
+        iconview = self.iconview.file_iconview
+
+        # Delete removed items, collapse directory first to stop watch its children.
+        removed_icon_items = []
+        removed_tree_items = []
+        for path in removed_paths:
+            (icon_item, tree_item) = self.record_items.pop(path)
+            if isinstance(tree_item, DirItem) and tree_item.is_expand:
+                tree_item.unexpand()
+            removed_icon_items.append(icon_item)
+            removed_tree_items.append(tree_item)
+
+        iconview.delete_items(removed_icon_items)
+        self.treeview.delete_items(removed_tree_items)
+
+        # Update changed items in place.
+        for record in updated_records:
+            for item in self.record_items[record.path]:
+                item.update_file_record(record)
+
+        if len(added_records) > 0:
+            for record in added_records:
+                self.record_items[record.path] = (create_icon_item(record, self.icon_size), create_item(record))
+
+            added_set = set(added_records)
+            added_indexes = filter(lambda index: self.records[index] in added_set, range(len(self.records)))
+
+            # Insert icon items from top, items before insert position are always in view.
+            for index in added_indexes:
+                iconview.add_items([self.record_items[self.records[index].path][0]], index)
+
+            # Insert tree items from bottom, then next item is always in view.
+            for index in reversed(added_indexes):
+                if index + 1 < len(self.records):
+                    insert_pos = self.record_items[self.records[index + 1].path][1].row_index
+                else:
+                    insert_pos = None
+                self.treeview.add_items([self.record_items[self.records[index].path][1]], insert_pos)
 
 gobject.type_register(FileManager)
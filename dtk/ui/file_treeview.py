@@ -23,21 +23,18 @@
 
 from treeview import TreeItem
 import collections
-from gio_utils import (get_file_icon_pixbuf, is_directory, get_dir_child_files,
-                       get_gfile_modification_time, get_gfile_size,
-                       get_gfile_type,get_file_type_dict,
-                       get_gfile_name, get_gfile_content_type, sort_file_by_name)
+from gio_utils import (file_icon_cache, dir_child_counter, get_file_type_dict,
+                       get_file_record, get_dir_child_records, sort_record_by_name,
+                       get_content_type_description, format_modification_time,
+                       merge_file_records, update_file_records, DirLoader, DirWatcher)
+from file_cache import file_metadata_cache
 from draw import draw_pixbuf, draw_text, draw_vlinear
-from threads import post_gui
 from theme import ui_theme
 import pango
 import gobject
 import gio
-import threading as td
 from deepin_utils.file import format_file_size
 from utils import cairo_disable_antialias, get_content_size
-import traceback
-import sys
 
 ICON_SIZE = 24
 ICON_PADDING_LEFT = ICON_PADDING_RIGHT = 4
@@ -71,7 +68,8 @@ def sort_by_name(items, sort_reverse):
     return sort_by_key(items, sort_reverse, lambda i: i.name)
 
 def sort_by_size(items, sort_reverse):
-    return sort_by_key(items, sort_reverse, lambda i: i.size)
+    # Size of directory is None before children counted, keep them at end of list in both order.
+    return sort_by_key(items, sort_reverse, lambda i: ((i.size == None) != sort_reverse, i.size))
 
 def sort_by_type(items, sort_reverse):
     return sort_by_key(items, sort_reverse, lambda i: i.content_type)
@@ -79,54 +77,58 @@ def sort_by_type(items, sort_reverse):
 def sort_by_mtime(items, sort_reverse):
     return sort_by_key(items, sort_reverse, lambda i: i.modification_time)
 
-def get_name_width(column_index, name):
+def get_text_width(text, text_width=None):
+    if text_width == None:
+        return get_content_size(text)[0]
+    else:
+        return text_width
+
+def get_name_width(column_index, name, text_width=None):
     expand_indicator_pixbuf = ui_theme.get_pixbuf("treeview/arrow_down.png").get_pixbuf()
-    return COLUMN_OFFSET * column_index + INDICATOR_PADDING_LEFT + expand_indicator_pixbuf.get_width() + INDICATOR_PADDING_RIGHT + ICON_PADDING_LEFT + ICON_SIZE + ICON_PADDING_RIGHT + get_content_size(name)[0]
+    return COLUMN_OFFSET * column_index + INDICATOR_PADDING_LEFT + expand_indicator_pixbuf.get_width() + INDICATOR_PADDING_RIGHT + ICON_PADDING_LEFT + ICON_SIZE + ICON_PADDING_RIGHT + get_text_width(name, text_width)
 
-def get_modification_time_width(time):
-    return get_content_size(time)[0] + MODIFICATION_TIME_PADDING_LEFT
+def get_modification_time_width(time, text_width=None):
+    return get_text_width(time, text_width) + MODIFICATION_TIME_PADDING_LEFT
 
-def get_type_width(file_type):
-    return get_content_size(file_type)[0] + CONTENT_TYPE_PADDING_LEFT
+def get_type_width(file_type, text_width=None):
+    return get_text_width(file_type, text_width) + CONTENT_TYPE_PADDING_LEFT
 
-def get_size_width(size):
-    return get_content_size(size)[0] + SIZE_PADDING_LEFT
+def get_size_width(size, text_width=None):
+    return get_text_width(size, text_width) + SIZE_PADDING_LEFT
+
+def get_file_metadata(file_record):
+    '''
+    Get display strings and text widths of file, they are loaded from persistent cache if file not changed.
+
+    @param file_record: FileRecord of file.
+    @return: Return metadata dict.
+    '''
+    metadata = file_metadata_cache.get_metadata(file_record)
+    if metadata == None:
+        modification_time = format_modification_time(file_record.modification_time)
+        content_type = get_content_type_description(file_record.content_type)
+        metadata = {
+            "modification_time" : modification_time,
+            "content_type" : content_type,
+            "name_text_width" : get_text_width(file_record.name),
+            "modification_time_text_width" : get_text_width(modification_time),
+            "content_type_text_width" : get_text_width(content_type),
+            }
+
+        if not file_record.is_directory():
+            size_name = format_file_size(file_record.size)
+            metadata["size_name"] = size_name
+            metadata["size_text_width"] = get_text_width(size_name)
+
+        file_metadata_cache.set_metadata(file_record, metadata)
+
+    return metadata
 
 def render_background(item, cr, rect):
     if item.is_select:
         draw_vlinear(cr, rect.x ,rect.y, rect.width, rect.height,
                      ui_theme.get_shadow_color("listview_select").get_color_info())
 
-class LoadingThread(td.Thread):
-
-    def __init__(self, dir_item):
-        td.Thread.__init__(self)
-        self.setDaemon(True) # make thread exit when main program exit
-        self.dir_item = dir_item
-
-    def run(self):
-        try:
-            self.dir_item.load_status = self.dir_item.LOADING_START
-            self.items = get_dir_items(self.dir_item.gfile.get_path(), self.dir_item.column_index + 1)
-            if self.items == []:
-                self.items = [EmptyItem(self.dir_item.column_index + 1)]
-
-            for item in self.items:
-                item.parent_item = self.dir_item
-
-            self.dir_item.load_status = self.dir_item.LOADING_FINSIH
-
-            self.render_items()
-        except Exception, e:
-            print "class LoadingThread got error: %s" % (e)
-            traceback.print_exc(file=sys.stdout)
-
-    @post_gui
-    def render_items(self):
-        self.dir_item.delete_chlid_item()
-        self.dir_item.child_items = self.items
-        self.dir_item.add_child_item()
-
 class DirItem(TreeItem):
     '''
     Directory item.
@@ -136,35 +138,49 @@ class DirItem(TreeItem):
     LOADING_START = 1
     LOADING_FINSIH = 2
 
-    def __init__(self, gfile, column_index=0):
+    def __init__(self, gfile, column_index=0, file_record=None):
         '''
         Initialize DirItem class.
+
+        @param gfile: gio.File of directory.
+        @param column_index: Column index, default is 0.
+        @param file_record: FileRecord of directory, default is None to query attributes from gfile.
         '''
         # Init.
         TreeItem.__init__(self)
+        if file_record == None:
+            file_record = get_file_record(gfile)
         self.gfile = gfile
-        self.type = get_gfile_type(self.gfile)
-        self.name = get_gfile_name(self.gfile)
-        self.modification_time = get_gfile_modification_time(self.gfile)
-        self.content_type = get_gfile_content_type(self.gfile)
-        self.size = get_gfile_size(self.gfile)
-        self.size_name = "%s 项" % (self.size)
+        self.file_record = file_record
+        self.type = file_record.type
+        self.name = file_record.name
+        metadata = get_file_metadata(file_record)
+        self.modification_time = metadata["modification_time"]
+        self.content_type = metadata["content_type"]
+        # Child number is counted when row become visible.
+        self.size = None
+        self.size_name = "..."
         self.directory_path = gfile.get_path()
         self.pixbuf = None
         self.column_index = column_index
         self.is_expand = False
         self.load_status = self.LOADING_INIT
-        self.name_width = get_name_width(self.column_index, self.name)
-        self.modification_time_width = get_modification_time_width(self.modification_time)
-        self.content_type_width = get_type_width(self.content_type)
+        self.dir_loader = None
+        self.dir_watcher = None
+        self.child_records = []
+        self.child_record_items = {}
+        self.name_width = get_name_width(self.column_index, self.name, metadata["name_text_width"])
+        self.modification_time_width = get_modification_time_width(
+            self.modification_time, metadata["modification_time_text_width"])
+        self.content_type_width = get_type_width(self.content_type, metadata["content_type_text_width"])
         self.size_width = get_size_width(self.size_name)
 
     def render_name(self, cr, rect):
         '''
         Render icon and name of DirItem.
         '''
-        if self.pixbuf == None:
-            self.pixbuf = get_file_icon_pixbuf(self.directory_path, ICON_SIZE)
+        # Draw generic icon before icon is loaded.
+        self.pixbuf = file_icon_cache.get_pixbuf(self.file_record, ICON_SIZE, self.update_pixbuf)
 
         # Draw select background.
         if self.is_select or self.is_highlight:
@@ -257,6 +273,15 @@ class DirItem(TreeItem):
         '''
         Render size of DirItem.
         '''
+        # Count children in background, draw placeholder before count finish.
+        if self.size == None:
+            child_num = dir_child_counter.get_count(
+                self.directory_path, self.file_record.modification_time, self.update_size)
+            if child_num != None:
+                # Don't change column widths in expose, update width later.
+                self.set_size(child_num, False)
+                gobject.idle_add(self.update_width)
+
         # Draw select background.
         if self.is_select or self.is_highlight:
             draw_vlinear(cr, rect.x ,rect.y, rect.width, rect.height,
@@ -280,12 +305,69 @@ class DirItem(TreeItem):
                     cr.rectangle(rect.x, rect.y, rect.width, 1)
                 cr.fill()
 
+    def set_size(self, child_num, update_width=True):
+        '''
+        Set child number of directory.
+        '''
+        self.size = child_num
+        self.size_name = "%s 项" % (self.size)
+        self.size_width = get_size_width(self.size_name)
+
+        if update_width:
+            self.update_width()
+
+    def update_width(self):
+        '''
+        Notify treeview that width of item changed.
+        '''
+        if self.update_width_callback:
+            self.update_width_callback(self)
+
+        return False
+
+    def update_size(self, child_num):
+        '''
+        Callback when child number is counted.
+        '''
+        if self.size == None:
+            self.set_size(child_num)
+
+            if self.redraw_request_callback:
+                self.redraw_request_callback(self)
+
+    def update_file_record(self, file_record):
+        '''
+        Update attributes of directory when directory changed.
+
+        @param file_record: New FileRecord of directory.
+        '''
+        self.file_record = file_record
+        metadata = get_file_metadata(file_record)
+        self.modification_time = metadata["modification_time"]
+        self.content_type = metadata["content_type"]
+        self.modification_time_width = get_modification_time_width(
+            self.modification_time, metadata["modification_time_text_width"])
+        self.content_type_width = get_type_width(self.content_type, metadata["content_type_text_width"])
+        self.pixbuf = None
+
+        # Count children again with new modification time.
+        self.size = None
+        self.size_name = "..."
+        self.size_width = get_size_width(self.size_name)
+
+        if self.update_width_callback:
+            self.update_width_callback(self)
+
+        if self.redraw_request_callback:
+            self.redraw_request_callback(self)
+
     def expand(self):
         self.is_expand = True
 
         if self.load_status == self.LOADING_INIT:
             self.add_loading_item()
-        elif self.load_status == self.LOADING_FINSIH:
+        else:
+            # Show loaded child items even directory is still loading.
             self.add_child_item()
 
         if self.redraw_request_callback:
@@ -296,6 +378,9 @@ class DirItem(TreeItem):
 
         self.delete_chlid_item()
 
+        # Don't watch collapsed directory, load again when expand.
+        self.cancel_load()
+
         if self.redraw_request_callback:
             self.redraw_request_callback(self)
 
@@ -306,11 +391,142 @@ class DirItem(TreeItem):
 
         self.add_child_item()
 
-        LoadingThread(self).start()
+        # Stream child items, show every batch when it arrive.
+        self.load_status = self.LOADING_START
+        self.child_records = []
+        self.child_record_items = {}
+        self.dir_loader = DirLoader(self.directory_path, self.load_batch, self.finish_load)
+        self.dir_loader.start()
+
+    def load_batch(self, records):
+        '''
+        Merge batch of child records into sorted child items.
+        '''
+        for record in records:
+            item = create_item(record, self.column_index + 1)
+            item.parent_item = self
+            self.child_record_items[record.path] = item
+
+        self.child_records = merge_file_records(self.child_records, records)
+        self.update_child_items(map(lambda record: self.child_record_items[record.path], self.child_records))
+
+    def finish_load(self):
+        self.load_status = self.LOADING_FINSIH
+        self.dir_loader = None
+
+        if self.child_records == []:
+            self.update_child_items([self.create_empty_item()])
+
+        file_metadata_cache.retain(self.directory_path, map(lambda record: record.name, self.child_records))
+
+        # Watch expanded directory after load finish.
+        self.dir_watcher = DirWatcher(self.directory_path, self.apply_changes)
+        self.dir_watcher.start()
+
+    def cancel_load(self):
+        '''
+        Cancel load and watch child items, directory will load again when expand.
+        '''
+        if self.dir_loader:
+            self.dir_loader.cancel()
+            self.dir_loader = None
+
+        if self.dir_watcher:
+            self.dir_watcher.stop()
+            self.dir_watcher = None
+
+        self.load_status = self.LOADING_INIT
+
+        for child_item in self.child_items:
+            if isinstance(child_item, DirItem):
+                child_item.cancel_load()
+
+    def create_empty_item(self):
+        '''
+        Create EmptyItem of directory.
+        '''
+        empty_item = EmptyItem(self.column_index + 1)
+        empty_item.parent_item = self
+
+        return empty_item
+
+    def apply_changes(self, changed_records, deleted_paths):
+        '''
+        Callback when children of directory changed, only changed items are added or deleted.
+        '''
+        has_child_items = self.child_records != []
+        (self.child_records, added_records, updated_records, removed_paths) = update_file_records(
+            self.child_records, changed_records, deleted_paths)
+
+        # Collapse removed directory first, and stop watch its children.
+        removed_items = []
+        for path in removed_paths:
+            item = self.child_record_items.pop(path)
+            if isinstance(item, DirItem) and item.is_expand:
+                item.unexpand()
+            removed_items.append(item)
+
+        for record in updated_records:
+            self.child_record_items[record.path].update_file_record(record)
+
+        for record in added_records:
+            item = create_item(record, self.column_index + 1)
+            item.parent_item = self
+            self.child_record_items[record.path] = item
+
+        child_items = map(lambda record: self.child_record_items[record.path], self.child_records)
+        if not self.is_expand or not has_child_items or child_items == []:
+            # Replace EmptyItem or show EmptyItem.
+            self.update_child_items(child_items or [self.create_empty_item()])
+        else:
+            self.delete_items_callback(removed_items)
+
+            removed_set = set(removed_items)
+            self.child_items = filter(lambda item: not item in removed_set, self.child_items)
+            end_pos = self.row_index + 1 + len(self.get_visible_child_items())
+            self.child_items = child_items
+
+            # Insert from bottom, then next item is always in view.
+            added_set = set(added_records)
+            for (index, record) in reversed(list(enumerate(self.child_records))):
+                if record in added_set:
+                    if index + 1 < len(self.child_records):
+                        insert_pos = self.child_record_items[self.child_records[index + 1].path].row_index
+                    else:
+                        insert_pos = end_pos
+                    self.add_items_callback([self.child_record_items[record.path]], insert_pos)
+
+    def update_child_items(self, child_items):
+        '''
+        Replace child items, expanded child items keep expand status.
+        '''
+        if self.is_expand:
+            self.delete_items_callback(self.get_visible_child_items())
+            self.child_items = child_items
+            self.add_child_item()
+        else:
+            self.child_items = child_items
+
+    def get_visible_child_items(self):
+        '''
+        Get all child items that show in treeview, include child items of expanded child items.
+        '''
+        items = []
+        for child_item in self.child_items:
+            items.append(child_item)
+            if isinstance(child_item, DirItem) and child_item.is_expand:
+                items += child_item.get_visible_child_items()
+
+        return items
 
     def add_child_item(self):
         self.add_items_callback(self.child_items, self.row_index + 1)
 
+        # Show child items of expanded child items.
+        for child_item in self.child_items:
+            if isinstance(child_item, DirItem) and child_item.is_expand:
+                child_item.add_child_item()
+
     def delete_chlid_item(self):
         for child_item in self.child_items:
             if isinstance(child_item, DirItem) and child_item.is_expand:
@@ -318,6 +534,13 @@ class DirItem(TreeItem):
 
         self.delete_items_callback(self.child_items)
 
+    def update_pixbuf(self, pixbuf):
+        '''
+        Callback when icon is loaded.
+        '''
+        if self.redraw_request_callback:
+            self.redraw_request_callback(self)
+
     def get_height(self):
         return ITEM_HEIGHT
 
@@ -385,32 +608,41 @@ class FileItem(TreeItem):
     File item.
     '''
 
-    def __init__(self, gfile, column_index=0):
+    def __init__(self, gfile, column_index=0, file_record=None):
         '''
         Initialize FileItem class.
+
+        @param gfile: gio.File of file.
+        @param column_index: Column index, default is 0.
+        @param file_record: FileRecord of file, default is None to query attributes from gfile.
         '''
         TreeItem.__init__(self)
+        if file_record == None:
+            file_record = get_file_record(gfile)
         self.gfile = gfile
-        self.type = get_gfile_type(self.gfile)
-        self.name = get_gfile_name(self.gfile)
-        self.modification_time = get_gfile_modification_time(self.gfile)
-        self.content_type = get_gfile_content_type(self.gfile)
-        self.size = get_gfile_size(self.gfile)
-        self.size_name = format_file_size(self.size)
+        self.file_record = file_record
+        self.type = file_record.type
+        self.name = file_record.name
+        metadata = get_file_metadata(file_record)
+        self.modification_time = metadata["modification_time"]
+        self.content_type = metadata["content_type"]
+        self.size = file_record.size
+        self.size_name = metadata["size_name"]
         self.file_path = gfile.get_path()
         self.pixbuf = None
         self.column_index = column_index
-        self.name_width = get_name_width(self.column_index, self.name)
-        self.modification_time_width = get_modification_time_width(self.modification_time)
-        self.content_type_width = get_type_width(self.content_type)
-        self.size_width = get_size_width(self.size_name)
+        self.name_width = get_name_width(self.column_index, self.name, metadata["name_text_width"])
+        self.modification_time_width = get_modification_time_width(
+            self.modification_time, metadata["modification_time_text_width"])
+        self.content_type_width = get_type_width(self.content_type, metadata["content_type_text_width"])
+        self.size_width = get_size_width(self.size_name, metadata["size_text_width"])
 
     def render_name(self, cr, rect):
         '''
         Render icon and name of DirItem.
         '''
-        if self.pixbuf == None:
-            self.pixbuf = get_file_icon_pixbuf(self.file_path, ICON_SIZE)
+        # Draw generic icon before icon is loaded.
+        self.pixbuf = file_icon_cache.get_pixbuf(self.file_record, ICON_SIZE, self.update_pixbuf)
 
         # Draw select background.
         if self.is_select or self.is_highlight:
@@ -520,12 +752,43 @@ class FileItem(TreeItem):
                     cr.rectangle(rect.x, rect.y, rect.width, 1)
                 cr.fill()
 
+    def update_file_record(self, file_record):
+        '''
+        Update attributes of file when file changed.
+
+        @param file_record: New FileRecord of file.
+        '''
+        self.file_record = file_record
+        metadata = get_file_metadata(file_record)
+        self.modification_time = metadata["modification_time"]
+        self.content_type = metadata["content_type"]
+        self.size = file_record.size
+        self.size_name = metadata["size_name"]
+        self.modification_time_width = get_modification_time_width(
+            self.modification_time, metadata["modification_time_text_width"])
+        self.content_type_width = get_type_width(self.content_type, metadata["content_type_text_width"])
+        self.size_width = get_size_width(self.size_name, metadata["size_text_width"])
+        self.pixbuf = None
+
+        if self.update_width_callback:
+            self.update_width_callback(self)
+
+        if self.redraw_request_callback:
+            self.redraw_request_callback(self)
+
     def expand(self):
         pass
 
     def unexpand(self):
         pass
 
+    def update_pixbuf(self, pixbuf):
+        '''
+        Callback when icon is loaded.
+        '''
+        if self.redraw_request_callback:
+            self.redraw_request_callback(self)
+
     def get_height(self):
         return ITEM_HEIGHT
 
@@ -552,7 +815,12 @@ class FileItem(TreeItem):
             self.redraw_request_callback(self)
 
     def double_click(self, column, offset_x, offset_y):
-        app_info = gio.app_info_get_default_for_type(self.gfile.query_info("standard::content-type").get_content_type(), False)
+        # Content type is read when file record is created, don't query file again.
+        content_type = self.file_record.content_type
+        if content_type == None:
+            app_info = None
+        else:
+            app_info = gio.app_info_get_default_for_type(content_type, False)
         if app_info:
             app_info.launch([self.gfile], None)
         else:
@@ -725,11 +993,18 @@ def get_dir_items(dir_path, column_index=0, show_hidden=False):
     '''
     Get children items with given directory path.
     '''
-    items = []
-    for gfile in get_dir_child_files(dir_path, sort_file_by_name, False, show_hidden):
-        if is_directory(gfile):
-            items.append(DirItem(gfile, column_index))
-        else:
-            items.append(FileItem(gfile, column_index))
+    return map(lambda file_record: create_item(file_record, column_index),
+               get_dir_child_records(dir_path, sort_record_by_name, False, show_hidden))
+
+def create_item(file_record, column_index=0):
+    '''
+    Create DirItem or FileItem with given file record.
 
-    return items
+    @param file_record: FileRecord.
+    @param column_index: Column index, default is 0.
+    @return: Return DirItem if record is directory, otherwise return FileItem.
+    '''
+    if file_record.is_directory():
+        return DirItem(file_record.get_gfile(), column_index, file_record)
+    else:
+        return FileItem(file_record.get_gfile(), column_index, file_record)
@@ -0,0 +1,220 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2011 ~ 2012 Deepin, Inc.
+#               2011 ~ 2012 Wang Yong
+#
+# Author:     Wang Yong <lazycat.manatee@gmail.com>
+# Maintainer: Wang Yong <lazycat.manatee@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import collections
+import gobject
+import sys
+import time
+import traceback
+
+__all__ = ["FrameClock", "frame_clock", "AnimationClock", "animation_clock"]
+
+class FrameClock(object):
+    '''
+    Shared frame scheduler of views.
+
+    View register frame callback when it has dirty items, clock arm one timeout only when there are pending callbacks,
+    and call callbacks of all views in one tick. Clock don't wake up process when all views are idle.
+    '''
+
+    def __init__(self, frame_interval=50):
+        '''
+        Initialize FrameClock class.
+
+        @param frame_interval: Interval between request and tick, in milliseconds, default is 50.
+        '''
+        self.frame_interval = frame_interval
+        self.pending_dict = collections.OrderedDict()
+        self.tick_id = None
+
+        self.ticks = 0
+        self.requests = 0
+        self.coalesced_requests = 0
+
+    def request_frame(self, widget, callback):
+        '''
+        Request callback of widget is called in next tick.
+
+        Callback of same widget is called once in one tick, however many times widget request.
+
+        @param widget: Widget that request frame.
+        @param callback: Frame callback, it's called without argument.
+        '''
+        self.requests += 1
+
+        if widget in self.pending_dict:
+            self.coalesced_requests += 1
+        self.pending_dict[widget] = callback
+
+        if self.tick_id == None:
+            self.tick_id = gobject.timeout_add(self.frame_interval, self.tick)
+
+    def cancel_frame(self, widget):
+        '''
+        Cancel pending frame callback of widget, call it when widget destroy.
+
+        @param widget: Widget that request frame.
+        '''
+        self.pending_dict.pop(widget, None)
+
+        if len(self.pending_dict) == 0 and self.tick_id != None:
+            gobject.source_remove(self.tick_id)
+            self.tick_id = None
+
+    def tick(self):
+        '''
+        Internal function to call frame callbacks of all pending widgets.
+        '''
+        self.tick_id = None
+        self.ticks += 1
+
+        # Callback maybe request next frame, swap pending dict first.
+        pending_dict = self.pending_dict
+        self.pending_dict = collections.OrderedDict()
+        for (widget, callback) in pending_dict.items():
+            try:
+                callback()
+            except Exception, e:
+                # Broken view don't drop redraws of other views.
+                print "FrameClock: frame callback of %s got error: %s" % (widget, e)
+                traceback.print_exc(file=sys.stdout)
+
+        return False
+
+    def get_stats(self):
+        '''
+        Get clock statistics.
+
+        @return: Return dict with number of ticks, requests and coalesced requests.
+        '''
+        return {
+            "ticks" : self.ticks,
+            "requests" : self.requests,
+            "coalesced_requests" : self.coalesced_requests,
+            "pending_length" : len(self.pending_dict),
+            }
+
+frame_clock = FrameClock()
+
+class AnimationClock(object):
+    '''
+    Shared scheduler of animations.
+
+    All running animations are driven by one periodic timeout, animation compute its progress with wall-clock time of tick,
+    so dropped frames don't stretch animation duration.
+    Timeout is removed when last animation finish, clock don't wake up process when nothing is animating.
+    '''
+
+    def __init__(self, frame_interval=16):
+        '''
+        Initialize AnimationClock class.
+
+        @param frame_interval: Interval between two ticks, in milliseconds, default is 16.
+        '''
+        self.frame_interval = frame_interval
+        self.animation_dict = collections.OrderedDict()
+        self.tick_id = None
+        self.last_tick_time = None
+
+        self.ticks = 0
+        self.dropped_frames = 0
+
+    def add_animation(self, animation, callback):
+        '''
+        Add animation to clock, callback is called in every tick until it return False.
+
+        Add same animation again will replace its callback.
+
+        @param animation: Animation object, it's key of callback.
+        @param callback: Tick callback, argument is wall-clock time of tick, return False to remove animation.
+        '''
+        self.animation_dict[animation] = callback
+
+        if self.tick_id == None:
+            self.last_tick_time = time.time()
+            self.tick_id = gobject.timeout_add(self.frame_interval, self.tick)
+
+    def remove_animation(self, animation):
+        '''
+        Remove animation from clock.
+
+        @param animation: Animation object.
+        '''
+        self.animation_dict.pop(animation, None)
+
+        if len(self.animation_dict) == 0 and self.tick_id != None:
+            gobject.source_remove(self.tick_id)
+            self.tick_id = None
+
+    def is_animating(self, animation=None):
+        '''
+        Whether animation is running.
+
+        @param animation: Animation object, default is None to check any animation.
+        @return: Return True if animation is running.
+        '''
+        if animation == None:
+            return len(self.animation_dict) > 0
+        else:
+            return animation in self.animation_dict
+
+    def tick(self):
+        '''
+        Internal function to call tick callbacks of all animations.
+        '''
+        now = time.time()
+        self.ticks += 1
+        self.dropped_frames += max(int((now - self.last_tick_time) * 1000 / self.frame_interval) - 1, 0)
+        self.last_tick_time = now
+
+        # Callback maybe add or remove animations, iterate over copy.
+        for (animation, callback) in self.animation_dict.items():
+            try:
+                continue_animation = callback(now)
+            except Exception, e:
+                # Remove broken animation, other animations keep running.
+                print "AnimationClock: animation %s got error: %s" % (animation, e)
+                traceback.print_exc(file=sys.stdout)
+                continue_animation = False
+
+            if not continue_animation and self.animation_dict.get(animation) == callback:
+                del self.animation_dict[animation]
+
+        if len(self.animation_dict) == 0:
+            self.tick_id = None
+            return False
+        else:
+            return True
+
+    def get_stats(self):
+        '''
+        Get clock statistics.
+
+        @return: Return dict with number of ticks, dropped frames and running animations.
+        '''
+        return {
+            "ticks" : self.ticks,
+            "dropped_frames" : self.dropped_frames,
+            "animation_length" : len(self.animation_dict),
+            }
+
+animation_clock = AnimationClock()
@@ -21,15 +21,18 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import gio
+import gobject
 import gtk
 import os
 import collections
 import sys
 import traceback
 import time
+import threading as td
+import Queue as Q
 from locales import _
-
-file_icon_pixbuf_dict = {}
+from threads import post_gui
+from file_cache import get_thumbnail
 
 def get_file_type_dict():
     '''
@@ -44,28 +47,315 @@ def get_file_type_dict():
              (gio.FILE_TYPE_UNKNOWN, []),
              ])
 
-def get_file_icon_pixbuf(filepath, icon_size):
+FILE_TYPE_ORDER = dict(map(lambda (index, (file_type, files)): (file_type, index),
+                           enumerate(get_file_type_dict())))
+
+def get_file_icon_pixbuf(filepath, icon_size, content_type=None, icon=None):
     '''
     Get icon pixbuf with given filepath.
 
+    Icon is loaded in current thread if it's not in cache,
+    use L{ I{file_icon_cache.get_pixbuf} <FileIconCache.get_pixbuf>} to load icon in background.
+
     @param filepath: File path.
+    @param icon_size: Icon size.
+    @param content_type: Content type of file, default is None to query from file.
+    @param icon: gio.Icon of file, default is None to query from file.
     @return: Return icon pixbuf with given filepath.
     '''
-    gfile = gio.File(filepath)
-    mime_type = gfile.query_info("standard::content-type").get_content_type()
-    if file_icon_pixbuf_dict.has_key(mime_type):
-        return file_icon_pixbuf_dict[mime_type]
-    else:
-        icon_theme = gtk.icon_theme_get_default()
-        icon_info = icon_theme.lookup_by_gicon(
-            gfile.query_info("standard::icon").get_icon(),
-            icon_size,
-            gtk.ICON_LOOKUP_USE_BUILTIN)
-        if icon_info:
-            return icon_info.load_icon()
-        # Return unknown icon when icon_info is None.
+    if content_type == None or icon == None:
+        file_info = gio.File(filepath).query_info("standard::content-type,standard::icon")
+        content_type = file_info.get_content_type()
+        icon = file_info.get_icon()
+
+    return file_icon_cache.load_pixbuf(content_type, icon, icon_size)
+
+class FileIconCache(object):
+    '''
+    Cache of file icons, keyed by (icon, size).
+
+    Icon is looked up in GUI thread, and icon file is decoded in background thread.
+    Cache total bytes is limited, least recently used icons are dropped first,
+    and all icons are dropped when icon theme changed.
+
+    Image files can show thumbnail instead of icon, thumbnails are shared with other applications
+    follow freedesktop thumbnail managing standard, it's disable default.
+    '''
+
+    def __init__(self, max_bytes=8 * 1024 * 1024, max_thumbnail_file_size=32 * 1024 * 1024):
+        '''
+        Initialize FileIconCache class.
+
+        @param max_bytes: The max bytes of icon pixbufs in cache, default is 8MB.
+        @param max_thumbnail_file_size: Image file bigger than this size won't create thumbnail, default is 32MB.
+        '''
+        self.max_bytes = max_bytes
+        self.max_thumbnail_file_size = max_thumbnail_file_size
+        self.thumbnail_enable = False
+        self.cache_bytes = 0
+        self.cache_dict = collections.OrderedDict()
+        self.generic_dict = {}
+        self.pending_dict = {}
+        self.pending_record_dict = {}
+        self.request_queue = Q.Queue()
+        self.worker = None
+        self.icon_theme = None
+        self.generation = 0
+
+    def get_icon_theme(self):
+        '''
+        Internal function to get default icon theme, and drop cache when icon theme changed.
+        '''
+        if self.icon_theme == None:
+            self.icon_theme = gtk.icon_theme_get_default()
+            self.icon_theme.connect("changed", lambda icon_theme: self.clear())
+
+        return self.icon_theme
+
+    def set_thumbnail_enable(self, enable):
+        '''
+        Enable or disable thumbnail of image files.
+
+        @param enable: Set as True to show thumbnail.
+        '''
+        if self.thumbnail_enable != enable:
+            self.thumbnail_enable = enable
+            self.clear()
+
+    def can_thumbnail(self, file_record):
+        '''
+        Internal function to check whether show thumbnail of file.
+        '''
+        return (self.thumbnail_enable
+                and file_record.content_type != None
+                and file_record.content_type.startswith("image/")
+                and file_record.size <= self.max_thumbnail_file_size
+                and os.path.isabs(file_record.path))
+
+    def get_icon_key(self, content_type, icon, icon_size):
+        '''
+        Internal function to get cache key of icon.
+        '''
+        try:
+            icon_name = icon.to_string()
+        except Exception:
+            icon_name = None
+
+        if icon_name:
+            return (icon_name, icon_size)
         else:
-            return icon_theme.load_icon("unknown", icon_size, gtk.ICON_LOOKUP_USE_BUILTIN)
+            return (content_type, icon_size)
+
+    def add_pixbuf(self, icon_key, pixbuf):
+        '''
+        Internal function to add pixbuf into cache.
+        '''
+        if icon_key in self.cache_dict:
+            self.cache_bytes -= self.get_pixbuf_bytes(self.cache_dict.pop(icon_key))
+
+        self.cache_dict[icon_key] = pixbuf
+        self.cache_bytes += self.get_pixbuf_bytes(pixbuf)
+
+        # Drop least recently used icons.
+        while self.cache_bytes > self.max_bytes and len(self.cache_dict) > 1:
+            (drop_key, drop_pixbuf) = self.cache_dict.popitem(last=False)
+            self.cache_bytes -= self.get_pixbuf_bytes(drop_pixbuf)
+
+    def get_pixbuf_bytes(self, pixbuf):
+        return pixbuf.get_rowstride() * pixbuf.get_height()
+
+    def get_cache_pixbuf(self, icon_key):
+        '''
+        Internal function to get pixbuf from cache.
+        '''
+        pixbuf = self.cache_dict.pop(icon_key, None)
+        if pixbuf != None:
+            # Insert at end of cache, make it most recently used.
+            self.cache_dict[icon_key] = pixbuf
+
+        return pixbuf
+
+    def lookup_icon(self, icon, icon_size):
+        '''
+        Internal function to lookup icon in icon theme.
+        '''
+        icon_info = self.get_icon_theme().lookup_by_gicon(icon, icon_size, gtk.ICON_LOOKUP_USE_BUILTIN)
+        if icon_info == None:
+            icon_info = self.icon_theme.lookup_icon("unknown", icon_size, gtk.ICON_LOOKUP_USE_BUILTIN)
+
+        return icon_info
+
+    def load_pixbuf(self, content_type, icon, icon_size):
+        '''
+        Get icon pixbuf, load icon in current thread if icon not in cache.
+
+        @param content_type: Content type of file.
+        @param icon: gio.Icon of file.
+        @param icon_size: Icon size.
+        @return: Return icon pixbuf.
+        '''
+        icon_key = self.get_icon_key(content_type, icon, icon_size)
+        pixbuf = self.get_cache_pixbuf(icon_key)
+        if pixbuf == None:
+            icon_info = self.lookup_icon(icon, icon_size)
+            if icon_info:
+                pixbuf = icon_info.load_icon()
+            else:
+                pixbuf = self.get_generic_pixbuf(False, icon_size)
+
+            self.add_pixbuf(icon_key, pixbuf)
+
+        return pixbuf
+
+    def get_pixbuf(self, file_record, icon_size, callback):
+        '''
+        Get icon pixbuf of file record, icon is loaded in background thread if it not in cache.
+
+        @param file_record: FileRecord.
+        @param icon_size: Icon size.
+        @param callback: Callback when icon is loaded, argument is icon pixbuf, callback is called in GUI thread.
+        @return: Return icon pixbuf if icon in cache, otherwise return generic icon and call callback later.
+        '''
+        return self.request_pixbuf(file_record, icon_size, callback)[0]
+
+    def request_pixbuf(self, file_record, icon_size, callback):
+        '''
+        Internal function to get icon pixbuf of file record.
+
+        @return: Return (pixbuf, is_pending), callback is called later if is_pending is True.
+        '''
+        can_thumbnail = self.can_thumbnail(file_record)
+        if can_thumbnail:
+            icon_key = ("thumbnail", file_record.path, file_record.modification_time, icon_size)
+        else:
+            icon_key = self.get_icon_key(file_record.content_type, file_record.icon, icon_size)
+
+        pixbuf = self.get_cache_pixbuf(icon_key)
+        if pixbuf != None:
+            return (pixbuf, False)
+        elif icon_key in self.pending_dict:
+            if not callback in self.pending_dict[icon_key]:
+                self.pending_dict[icon_key].append(callback)
+        else:
+            if can_thumbnail:
+                # Show file icon if image can't decode.
+                request = (get_thumbnail,
+                           (file_record.path, file_record.get_gfile().get_uri(), file_record.modification_time, icon_size),
+                           (file_record.content_type, file_record.icon, icon_size))
+            else:
+                icon_info = self.lookup_icon(file_record.icon, icon_size)
+                if icon_info == None or icon_info.get_filename() == None:
+                    # Builtin icon don't need decode file, load it directly.
+                    return (self.load_pixbuf(file_record.content_type, file_record.icon, icon_size), False)
+
+                request = (gtk.gdk.pixbuf_new_from_file_at_size,
+                           (icon_info.get_filename(), icon_size, icon_size),
+                           None)
+
+            self.pending_dict[icon_key] = [callback]
+            self.pending_record_dict[icon_key] = (file_record, icon_size)
+            self.request_queue.put((self.generation, icon_key) + request)
+
+            if self.worker == None:
+                self.worker = td.Thread(target=self.load_loop)
+                self.worker.setDaemon(True)   # make thread exit when main program exit
+                self.worker.start()
+
+        return (self.get_generic_pixbuf(file_record.is_directory(), icon_size), True)
+
+    def get_generic_pixbuf(self, is_directory, icon_size):
+        '''
+        Get generic icon that paint before real icon is loaded.
+
+        @param is_directory: Whether get generic icon of directory.
+        @param icon_size: Icon size.
+        @return: Return generic icon pixbuf.
+        '''
+        generic_key = (is_directory, icon_size)
+        if not generic_key in self.generic_dict:
+            if is_directory:
+                icon_names = ["folder", "unknown"]
+            else:
+                icon_names = ["text-x-generic", "unknown"]
+
+            icon_info = self.get_icon_theme().choose_icon(icon_names, icon_size, gtk.ICON_LOOKUP_USE_BUILTIN)
+            if icon_info:
+                self.generic_dict[generic_key] = icon_info.load_icon()
+            else:
+                self.generic_dict[generic_key] = gtk.gdk.Pixbuf(gtk.gdk.COLORSPACE_RGB, True, 8, icon_size, icon_size)
+                self.generic_dict[generic_key].fill(0)
+
+        return self.generic_dict[generic_key]
+
+    def load_loop(self):
+        '''
+        Internal function to decode icon files in background thread.
+        '''
+        while True:
+            (generation, icon_key, load_func, load_args, fallback_args) = self.request_queue.get()
+            try:
+                pixbuf = load_func(*load_args)
+            except Exception, e:
+                print "FileIconCache: load %s got error: %s" % (load_args[0], e)
+                pixbuf = None
+
+            self.finish_load(generation, icon_key, pixbuf, fallback_args)
+
+    @post_gui
+    def finish_load(self, generation, icon_key, pixbuf, fallback_args=None):
+        '''
+        Internal function to add loaded icon in GUI thread.
+        '''
+        # Drop icon that load before icon theme changed.
+        if generation != self.generation:
+            return
+
+        callbacks = self.pending_dict.pop(icon_key, [])
+        self.pending_record_dict.pop(icon_key, None)
+        if pixbuf == None:
+            if fallback_args:
+                pixbuf = self.load_pixbuf(*fallback_args)
+            else:
+                pixbuf = self.get_generic_pixbuf(False, icon_key[-1])
+        self.add_pixbuf(icon_key, pixbuf)
+
+        for callback in callbacks:
+            callback(pixbuf)
+
+    def clear(self):
+        '''
+        Drop all icons in cache, pending icons are requested again with new settings.
+        '''
+        pending_requests = map(lambda (icon_key, callbacks): (self.pending_record_dict[icon_key], callbacks),
+                               self.pending_dict.items())
+
+        self.generation += 1
+        self.cache_dict.clear()
+        self.cache_bytes = 0
+        self.generic_dict.clear()
+        self.pending_dict.clear()
+        self.pending_record_dict.clear()
+
+        # Loaded icon of old generation is dropped, request again then items don't keep showing generic icon.
+        for ((file_record, icon_size), callbacks) in pending_requests:
+            for callback in callbacks:
+                (pixbuf, is_pending) = self.request_pixbuf(file_record, icon_size, callback)
+                if not is_pending:
+                    callback(pixbuf)
+
+    def get_stats(self):
+        '''
+        Get cache statistics.
+
+        @return: Return dict with number and bytes of icons in cache.
+        '''
+        return {
+            "cache_length" : len(self.cache_dict),
+            "cache_bytes" : self.cache_bytes,
+            "pending_length" : len(self.pending_dict),
+            }
+
+file_icon_cache = FileIconCache()
 
 def get_dir_child_num(gfile):
     '''
@@ -74,7 +364,8 @@ def get_dir_child_num(gfile):
     @param gfile: The directory GFile.
     @return: Return number of child files with given directory.
     '''
-    gfile_enumerator = gfile.enumerate_children("standard::*")
+    # Just need name to count children.
+    gfile_enumerator = gfile.enumerate_children("standard::name")
 
     # Return empty list if enumerator is None.
     if gfile_enumerator == None:
@@ -89,6 +380,95 @@ def get_dir_child_num(gfile):
 
         return child_num
 
+class DirChildCounter(object):
+    '''
+    Count children of directories in background worker threads.
+
+    Count is cached by (path, mtime), directory modification time change when children added or removed,
+    so cache don't need invalidate manually.
+    Newest request is processed first, then rows that just become visible get count quickly.
+    '''
+
+    def __init__(self, worker_num=2, cache_size=4096):
+        '''
+        Initialize DirChildCounter class.
+
+        @param worker_num: The number of worker threads, default is 2.
+        @param cache_size: The max number of counts in cache, default is 4096.
+        '''
+        self.worker_num = worker_num
+        self.cache_size = cache_size
+        self.cache_dict = collections.OrderedDict()
+        self.pending_dict = {}
+        self.request_queue = Q.LifoQueue()
+        self.lock = td.Lock()
+        self.workers = []
+
+    def get_count(self, dir_path, mtime, callback):
+        '''
+        Get child number of directory.
+
+        @param dir_path: Directory path.
+        @param mtime: Modification time of directory.
+        @param callback: Callback when count finish, argument is child number, callback is called in GUI thread.
+        @return: Return child number if it is in cache, otherwise return None and call callback later.
+        '''
+        count_key = (dir_path, mtime)
+        with self.lock:
+            if count_key in self.cache_dict:
+                # Move hit to end, cache drop least recently used count first.
+                child_num = self.cache_dict.pop(count_key)
+                self.cache_dict[count_key] = child_num
+                return child_num
+            elif count_key in self.pending_dict:
+                self.pending_dict[count_key].append(callback)
+                return None
+            else:
+                self.pending_dict[count_key] = [callback]
+
+            # Start workers when first request arrive.
+            if len(self.workers) == 0:
+                for index in range(self.worker_num):
+                    worker = td.Thread(target=self.count_loop)
+                    worker.setDaemon(True)  # make thread exit when main program exit
+                    worker.start()
+                    self.workers.append(worker)
+
+        self.request_queue.put(count_key)
+
+        return None
+
+    def count_loop(self):
+        '''
+        Internal function to count directory children in worker thread.
+        '''
+        while True:
+            count_key = self.request_queue.get()
+            try:
+                child_num = get_dir_child_num(gio.File(count_key[0]))
+            except Exception, e:
+                print "DirChildCounter: count %s got error: %s" % (count_key[0], e)
+                child_num = 0
+
+            with self.lock:
+                self.cache_dict[count_key] = child_num
+                if len(self.cache_dict) > self.cache_size:
+                    self.cache_dict.popitem(last=False)
+
+                callbacks = self.pending_dict.pop(count_key, [])
+
+            self.finish_count(callbacks, child_num)
+
+    @post_gui
+    def finish_count(self, callbacks, child_num):
+        '''
+        Internal function to call callbacks in GUI thread.
+        '''
+        for callback in callbacks:
+            callback(child_num)
+
+dir_child_counter = DirChildCounter()
+
 def get_dir_child_infos(dir_path, sort=None, reverse=False, show_hidden=False):
     '''
     Get children FileInfos with given directory path.
@@ -139,6 +519,116 @@ def get_dir_child_infos(dir_path, sort=None, reverse=False, show_hidden=False):
         else:
             return []
 
+class FileRecord(object):
+    '''
+    Lightweight record of file attributes, file views build items with record without query file again.
+    '''
+
+    __slots__ = ["path", "name", "type", "content_type", "icon", "size", "modification_time"]
+
+    def __init__(self, dir_path, file_info):
+        '''
+        Initialize FileRecord class.
+
+        @param dir_path: Directory path of file.
+        @param file_info: gio.FileInfo that query with FILE_RECORD_ATTRIBUTES.
+        '''
+        self.name = file_info.get_name()
+        self.path = os.path.join(dir_path, self.name)
+        self.type = file_info.get_file_type()
+        self.content_type = file_info.get_content_type()
+        self.icon = file_info.get_icon()
+        self.size = file_info.get_size()
+        self.modification_time = file_info.get_modification_time()
+
+    def get_gfile(self):
+        '''
+        Get gio.File of record.
+
+        @return: Return gio.File of record.
+        '''
+        return gio.File(self.path)
+
+    def is_directory(self):
+        '''
+        Whether record is directory.
+
+        @return: Return True if record is directory.
+        '''
+        return self.type == gio.FILE_TYPE_DIRECTORY
+
+FILE_RECORD_ATTRIBUTES = ",".join(["standard::name",
+                                   "standard::type",
+                                   "standard::content-type",
+                                   "standard::icon",
+                                   "standard::size",
+                                   "time::modified",
+                                   ])
+
+def get_file_record(gfile):
+    '''
+    Get FileRecord of gfile, query all attributes once.
+
+    @param gfile: gio.File.
+    @return: Return FileRecord of gfile.
+    '''
+    return FileRecord(os.path.dirname(gfile.get_path()), gfile.query_info(FILE_RECORD_ATTRIBUTES))
+
+def iter_dir_child_records(dir_path, show_hidden=False):
+    '''
+    Enumerate children of directory, all attributes are requested in one enumeration.
+
+    @param dir_path: Directory path.
+    @param show_hidden: Show hidden file or not, default is False.
+    @return: Return generator of FileRecord.
+    '''
+    try:
+        gfile_enumerator = gio.File(dir_path).enumerate_children(FILE_RECORD_ATTRIBUTES)
+    # Return if file not exists or file is not directory.
+    except gio.Error:
+        return
+
+    # Return if enumerator is None.
+    if gfile_enumerator == None:
+        return
+
+    try:
+        while True:
+            file_info = gfile_enumerator.next_file()
+            if file_info == None:
+                break
+            elif show_hidden == False and file_info.get_name()[0] == '.':
+                continue
+            else:
+                yield FileRecord(dir_path, file_info)
+    finally:
+        gfile_enumerator.close()
+
+def get_dir_child_records(dir_path, sort=None, reverse=False, show_hidden=False):
+    '''
+    Get children FileRecords with given directory path.
+
+    @param dir_path: Directory path.
+    @param sort: The function to sort records, this function have two arguments:
+     - records: FileRecord list.
+     - reverse: Whether sort records reverse.
+    @param reverse: Whether sort records reverse, default is False.
+    @param show_hidden: Show hidden file or not, default is False.
+    @return: Return a list of FileRecord.
+    '''
+    try:
+        records = list(iter_dir_child_records(dir_path, show_hidden))
+    except Exception, e:
+        print "function get_dir_child_records got error: %s" % (e)
+        traceback.print_exc(file=sys.stdout)
+
+        return []
+
+    if sort:
+        return sort(records, reverse)
+    else:
+        return records
+
 def get_dir_child_names(dir_path):
     '''
     Get children names with given directory path.
@@ -187,6 +677,384 @@ def sort_file_by_name(file_infos, reverse):
 
     return infos
 
+def sort_record_by_name(records, reverse):
+    '''
+    Sort file record by name.
+
+    @param records: The FileRecord list.
+    @param reverse: Whether sort records reverse, default is False.
+    '''
+    # Init.
+    record_oreder_dict = collections.OrderedDict(get_file_type_dict())
+
+    # Split record with different file type.
+    for record in records:
+        record_oreder_dict[record.type].append(record)
+
+    # Get sorted record list.
+    sort_records = []
+    for (file_type, file_type_records) in record_oreder_dict.items():
+        sort_records += sorted(file_type_records, key=lambda record: record.name)
+
+    return sort_records
+
+def get_record_sort_key(record):
+    '''
+    Get sort key of file record, same order as function L{ I{sort_record_by_name} <sort_record_by_name>}.
+
+    @param record: FileRecord.
+    @return: Return sort key of record.
+    '''
+    return (FILE_TYPE_ORDER.get(record.type, len(FILE_TYPE_ORDER)), record.name)
+
+def merge_file_records(records, new_records):
+    '''
+    Merge new records into sorted records.
+
+    @param records: Records that sorted by function L{ I{sort_record_by_name} <sort_record_by_name>}.
+    @param new_records: New records to merge.
+    @return: Return new sorted record list.
+    '''
+    # Timsort just merge two sorted runs, don't sort all records again.
+    return sorted(records + sorted(new_records, key=get_record_sort_key), key=get_record_sort_key)
+
+def update_file_records(records, changed_records, deleted_paths):
+    '''
+    Apply file changes to sorted records.
+
+    @param records: Records that sorted by function L{ I{sort_record_by_name} <sort_record_by_name>}.
+    @param changed_records: Records of created or changed files.
+    @param deleted_paths: Paths of deleted files.
+    @return: Return (records, added_records, updated_records, removed_paths), records is new sorted record list, updated_records are records that exist before and keep same type, removed_paths are deleted paths that exist before, and path of file that change type.
+    '''
+    record_dict = dict(map(lambda record: (record.path, record), records))
+    removed_paths = filter(lambda path: path in record_dict, set(deleted_paths))
+
+    added_records = []
+    updated_records = []
+    for record in changed_records:
+        old_record = record_dict.get(record.path)
+        if old_record == None:
+            added_records.append(record)
+        elif old_record.type == record.type:
+            updated_records.append(record)
+        else:
+            # File replaced by directory with same name, remove old item.
+            removed_paths.append(record.path)
+            added_records.append(record)
+
+    update_dict = dict(map(lambda record: (record.path, record), updated_records))
+    remove_set = set(removed_paths)
+    new_records = []
+    for record in records:
+        if not record.path in remove_set:
+            new_records.append(update_dict.get(record.path, record))
+
+    return (merge_file_records(new_records, added_records), added_records, updated_records, removed_paths)
+
+class DirLoader(object):
+    '''
+    Stream children records of directory with gio asynchronous API.
+
+    All callbacks are called in main loop, so callbacks can update widgets directly.
+    Batch size grow after every batch, first batch show quickly, and later batches don't rebuild view too many times.
+    '''
+
+    def __init__(self,
+                 dir_path,
+                 batch_callback,
+                 finish_callback=None,
+                 show_hidden=False,
+                 batch_size=64,
+                 max_batch_size=4096,
+                 ):
+        '''
+        Initialize DirLoader class.
+
+        @param dir_path: Directory path.
+        @param batch_callback: Callback when receive batch, argument is FileRecord list that sorted by name.
+        @param finish_callback: Callback when directory load finish, default is None, it won't call if loader is cancelled.
+        @param show_hidden: Show hidden file or not, default is False.
+        @param batch_size: The number of files in first batch, default is 64.
+        @param max_batch_size: The max number of files in one batch, default is 4096.
+        '''
+        self.dir_path = dir_path
+        self.batch_callback = batch_callback
+        self.finish_callback = finish_callback
+        self.show_hidden = show_hidden
+        self.batch_size = batch_size
+        self.max_batch_size = max_batch_size
+        self.cancellable = gio.Cancellable()
+        self.running = False
+
+    def start(self):
+        '''
+        Start load directory.
+        '''
+        self.running = True
+        gio.File(self.dir_path).enumerate_children_async(
+            FILE_RECORD_ATTRIBUTES,
+            self.enumerate_children_finish,
+            cancellable=self.cancellable)
+
+    def cancel(self):
+        '''
+        Cancel load directory, callbacks won't call after cancel.
+        '''
+        if self.running:
+            self.running = False
+            self.cancellable.cancel()
+
+    def is_running(self):
+        '''
+        Whether loader is running.
+
+        @return: Return True if loader is running.
+        '''
+        return self.running
+
+    def enumerate_children_finish(self, gfile, result):
+        '''
+        Internal callback when enumerator is ready.
+        '''
+        try:
+            gfile_enumerator = gfile.enumerate_children_finish(result)
+        except gio.Error, e:
+            if self.running:
+                print "DirLoader: load %s got error: %s" % (self.dir_path, e)
+                self.finish()
+            return
+
+        if self.running:
+            self.next_files(gfile_enumerator)
+
+    def next_files(self, gfile_enumerator):
+        '''
+        Internal function to request next batch.
+        '''
+        gfile_enumerator.next_files_async(
+            self.batch_size,
+            self.next_files_finish,
+            cancellable=self.cancellable)
+
+    def next_files_finish(self, gfile_enumerator, result):
+        '''
+        Internal callback when batch is ready.
+        '''
+        try:
+            file_infos = gfile_enumerator.next_files_finish(result)
+        except gio.Error, e:
+            if self.running:
+                print "DirLoader: load %s got error: %s" % (self.dir_path, e)
+                self.finish()
+            return
+
+        if not self.running:
+            return
+        elif len(file_infos) == 0:
+            gfile_enumerator.close_async(lambda enumerator, result: enumerator.close_finish(result))
+            self.finish()
+        else:
+            records = []
+            for file_info in file_infos:
+                if self.show_hidden or file_info.get_name()[0] != '.':
+                    records.append(FileRecord(self.dir_path, file_info))
+
+            if len(records) > 0:
+                self.batch_callback(sort_record_by_name(records, False))
+
+            # Callback maybe cancel loader.
+            if self.running:
+                self.batch_size = min(self.batch_size * 2, self.max_batch_size)
+                self.next_files(gfile_enumerator)
+
+    def finish(self):
+        '''
+        Internal function to finish load.
+        '''
+        self.running = False
+        if self.finish_callback:
+            self.finish_callback()
+
+class DirWatcher(object):
+    '''
+    Watch children of directory with gio.FileMonitor.
+
+    Events in short time are coalesced, then changed files are queried asynchronously,
+    and change callback receive all changes of directory once.
+    Callback is called in main loop.
+    '''
+
+    WATCH_EVENTS = [gio.FILE_MONITOR_EVENT_CHANGED,
+                    gio.FILE_MONITOR_EVENT_CHANGES_DONE_HINT,
+                    gio.FILE_MONITOR_EVENT_DELETED,
+                    gio.FILE_MONITOR_EVENT_CREATED,
+                    gio.FILE_MONITOR_EVENT_ATTRIBUTE_CHANGED,
+                    gio.FILE_MONITOR_EVENT_MOVED,
+                    ]
+
+    def __init__(self,
+                 dir_path,
+                 change_callback,
+                 show_hidden=False,
+                 coalesce_time=200,
+                 ):
+        '''
+        Initialize DirWatcher class.
+
+        @param dir_path: Directory path.
+        @param change_callback: Callback when children changed, arguments is (changed_records, deleted_paths), changed_records is FileRecord list of created or changed files that sorted by name.
+        @param show_hidden: Show hidden file or not, default is False.
+        @param coalesce_time: Time to coalesce events, in milliseconds, default is 200.
+        '''
+        self.dir_path = dir_path
+        self.change_callback = change_callback
+        self.show_hidden = show_hidden
+        self.coalesce_time = coalesce_time
+        self.gfile = gio.File(dir_path)
+        self.file_monitor = None
+        self.cancellable = None
+        self.flush_id = None
+        self.pending_paths = set()
+        self.query_count = 0
+        self.changed_records = []
+        self.deleted_paths = []
+
+    def start(self):
+        '''
+        Start watch directory.
+        '''
+        try:
+            self.file_monitor = self.gfile.monitor_directory(gio.FILE_MONITOR_SEND_MOVED)
+        except gio.Error, e:
+            print "DirWatcher: watch %s got error: %s" % (self.dir_path, e)
+            return
+
+        self.cancellable = gio.Cancellable()
+        self.file_monitor.connect("changed", self.monitor_changed)
+
+    def stop(self):
+        '''
+        Stop watch directory, change callback won't call after stop.
+        '''
+        if self.file_monitor:
+            self.file_monitor.cancel()
+            self.file_monitor = None
+
+            self.cancellable.cancel()
+            self.cancellable = None
+
+        if self.flush_id:
+            gobject.source_remove(self.flush_id)
+            self.flush_id = None
+
+        self.pending_paths = set()
+        self.query_count = 0
+
+    def is_watching(self):
+        '''
+        Whether watcher is watching directory.
+
+        @return: Return True if watcher is watching.
+        '''
+        return self.file_monitor != None
+
+    def add_pending_file(self, gfile):
+        '''
+        Internal function to add changed file, it will query when coalesce time end.
+        '''
+        name = gfile.get_basename()
+        if self.show_hidden or name[0] != '.':
+            self.pending_paths.add(os.path.join(self.dir_path, name))
+
+            if self.flush_id == None:
+                self.flush_id = gobject.timeout_add(self.coalesce_time, self.flush)
+
+    def monitor_changed(self, file_monitor, gfile, other_file, event_type):
+        '''
+        Internal callback for `changed` signal of gio.FileMonitor.
+        '''
+        if file_monitor == self.file_monitor and event_type in self.WATCH_EVENTS:
+            self.add_pending_file(gfile)
+
+            # Rename in same directory, add new file too.
+            if event_type == gio.FILE_MONITOR_EVENT_MOVED and other_file != None:
+                other_parent = other_file.get_parent()
+                if other_parent != None and other_parent.equal(self.gfile):
+                    self.add_pending_file(other_file)
+
+    def flush(self):
+        '''
+        Internal function to query pending files.
+        '''
+        # Wait previous query finish, then changes are delivered in order.
+        if self.query_count > 0:
+            return True
+
+        self.flush_id = None
+        paths = self.pending_paths
+        self.pending_paths = set()
+        self.changed_records = []
+        self.deleted_paths = []
+        self.query_count = len(paths)
+
+        # Query file again, then events of same file don't need handle one by one.
+        for path in paths:
+            gio.File(path).query_info_async(
+                FILE_RECORD_ATTRIBUTES,
+                self.query_info_finish,
+                cancellable=self.cancellable,
+                user_data=path)
+
+        return False
+
+    def query_info_finish(self, gfile, result, path):
+        '''
+        Internal callback when file info is ready.
+        '''
+        try:
+            file_info = gfile.query_info_finish(result)
+        except gio.Error:
+            file_info = None
+
+        if not self.is_watching():
+            return
+
+        if file_info == None:
+            self.deleted_paths.append(path)
+        else:
+            self.changed_records.append(FileRecord(self.dir_path, file_info))
+
+        self.query_count -= 1
+        if self.query_count == 0:
+            self.change_callback(sort_record_by_name(self.changed_records, False), self.deleted_paths)
+
+content_type_description_dict = {}
+
+def get_content_type_description(content_type):
+    '''
+    Get description of content type, description is cached.
+
+    @param content_type: Content type, it can be None if file has no content type.
+    @return: Return description of content type, or empty string if content_type is None.
+    '''
+    if content_type == None:
+        return ""
+
+    if not content_type in content_type_description_dict:
+        content_type_description_dict[content_type] = gio.content_type_get_description(content_type)
+
+    return content_type_description_dict[content_type]
+
+def format_modification_time(modification_time):
+    '''
+    Format modification time.
+
+    @param modification_time: Modification time, in seconds.
+    @return: Return modification time string.
+    '''
+    return time.strftime("%Y/%m/%d %H:%M:%S", time.localtime(modification_time))
+
 def get_gfile_name(gfile):
     '''
     Get name of gfile.
@@ -203,7 +1071,7 @@ def get_gfile_content_type(gfile):
     @param gfile: The GFile.
     @return: Return content type with given gfile, use \"standard::content-type\" to query info from gfile.
     '''
-    return gio.content_type_get_description(gfile.query_info("standard::content-type").get_content_type())
+    return get_content_type_description(gfile.query_info("standard::content-type").get_content_type())
 
 def get_gfile_modification_time(gfile):
     '''
@@ -212,7 +1080,7 @@ def get_gfile_modification_time(gfile):
     @param gfile: The GFile.
     @return: Return modified time with given gfile, use \"time::modified\" to query info from gfile.
     '''
-    return time.strftime("%Y/%m/%d %H:%M:%S", time.localtime(gfile.query_info("time::modified").get_modification_time()))
+    return format_modification_time(gfile.query_info("time::modified").get_modification_time())
 
 def get_gfile_size(gfile):
     '''
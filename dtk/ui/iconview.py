@@ -27,6 +27,7 @@ from keymap import get_keyevent_name
 from skin_config import skin_config
 from theme import ui_theme
 from locales import _
+from frame_clock import frame_clock
 import gc
 import gobject
 import gtk
@@ -122,10 +123,9 @@ class IconView(gtk.DrawingArea):
         self.connect("single-click-item", lambda view, item, x, y: item.icon_item_single_click(x, y))
         self.connect("double-click-item", lambda view, item, x, y: item.icon_item_double_click(x, y))
 
-        # Redraw.
+        # Redraw request items in next tick of frame clock.
         self.redraw_request_list = []
-        self.redraw_delay = 50 # 50 milliseconds should be enough for redraw
-        gtk.timeout_add(self.redraw_delay, self.update_redraw_request_list)
+        self.connect("destroy", lambda widget: frame_clock.cancel_frame(widget))
 
         self.keymap = {
             "Home" : self.select_first_item,
@@ -827,7 +827,7 @@ class IconView(gtk.DrawingArea):
         Internal function to update redraw request list.
         '''
         # Redraw when request list is not empty.
-        if len(self.redraw_request_list) > 0:
+        if len(self.redraw_request_list) > 0 and len(self.items) > 0:
             # Get offset.
             (offset_x, offset_y, viewport) = self.get_offset_coordinate(self)
 
@@ -856,13 +856,12 @@ class IconView(gtk.DrawingArea):
         # Clear redraw request list.
         self.redraw_request_list = []
 
-        return True
-
     def redraw_item(self, list_item):
         '''
         Internal function to redraw item.
         '''
         self.redraw_request_list.append(list_item)
+        frame_clock.request_frame(self, self.update_redraw_request_list)
 
     def get_offset_coordinate(self, widget):
         '''
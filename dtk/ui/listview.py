@@ -22,15 +22,19 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 from cache_pixbuf import CachePixbuf
+from row_cache import RowSurfaceCache
+from frame_clock import frame_clock
 from constant import DEFAULT_FONT_SIZE, ALIGN_END, ALIGN_START
 from contextlib import contextmanager
-from draw import draw_pixbuf, draw_vlinear, draw_text
+from draw import draw_pixbuf, draw_vlinear, draw_text, draw_fade_surface
 from keymap import get_keyevent_name, has_ctrl_mask, has_shift_mask
 from skin_config import skin_config
+from sort_engine import SortEngine
+from threads import post_gui
 from theme import ui_theme
 from deepin_utils.file import get_parent_dir
-import math
 import cairo
+import collections
 import copy
 import gobject
 import gtk
@@ -74,8 +78,12 @@ class ListView(gtk.DrawingArea):
     @undocumented: key_release_list_view
     @undocumented: draw_items
     @undocumented: draw_items_row
+    @undocumented: get_viewport_index
+    @undocumented: get_bound_surface
+    @undocumented: get_row_surface
     @undocumented: keep_select_status
     @undocumented: emit_item_event
+    @undocumented: finish_sort
     '''
 
     SORT_DESCENDING = False
@@ -119,6 +127,7 @@ class ListView(gtk.DrawingArea):
         # Init.
         gtk.DrawingArea.__init__(self)
         self.sorts = sorts
+        self.sort_engine = SortEngine()
         self.drag_data = drag_data
         self.add_events(gtk.gdk.ALL_EVENTS_MASK)
         self.set_can_focus(True) # can focus to response key-press signal
@@ -154,10 +163,13 @@ class ListView(gtk.DrawingArea):
         self.drag_icon_pixbuf = drag_icon_pixbuf
         self.drag_out_offset = drag_out_offset
         self.mask_bound_height = mask_bound_height
+        self.bound_surfaces = {}
+        self.row_surface_cache = None
         self.auto_scroll_id = None
         self.auto_scroll_delay = 70 # milliseconds
         self.hide_columns = hide_columns
         self.hide_column_resize = hide_column_resize
+        self.data_source = None
         if len(self.hide_columns):
             self.hide_column_flag = True
         else:
@@ -179,10 +191,9 @@ class ListView(gtk.DrawingArea):
             # We will manually start drags, details look function `hover-item`.
             self.drag_source_unset()
 
-        # Redraw.
+        # Redraw request items in next tick of frame clock.
         self.redraw_request_list = []
-        self.redraw_delay = 100 # 100 milliseconds should be enough for redraw
-        gtk.timeout_add(self.redraw_delay, self.update_redraw_request_list)
+        self.connect("destroy", lambda widget: frame_clock.cancel_frame(widget))
 
         # Add key map.
         self.keymap = {
@@ -247,26 +258,28 @@ class ListView(gtk.DrawingArea):
             (offset_x, offset_y, viewport) = self.get_offset_coordinate(self)
 
             # Get viewport index.
-            start_y = offset_y - self.title_offset_y
-            end_y = offset_y + viewport.allocation.height - self.title_offset_y
-            start_index = max(start_y / self.item_height, 0)
-            if (end_y - end_y / self.item_height * self.item_height) == 0:
-                end_index = min(end_y / self.item_height + 1, len(self.items))
-            else:
-                end_index = min(end_y / self.item_height + 2, len(self.items))
+            (start_index, end_index) = self.get_viewport_index(offset_y, viewport)
 
-            # Redraw whole viewport area once found any request item in viewport.
-            viewport_range = range(start_index, end_index)
+            # Collect damage rows of request items in viewport,
+            # adjacent rows are merged into one rectangle by region.
+            rect = self.allocation
+            damage_region = gtk.gdk.Region()
             for item in self.redraw_request_list:
-                if item.get_index() in viewport_range:
-                    self.queue_draw()
-                    break
+                index = item.get_index()
+                if index != None and start_index <= index < end_index:
+                    damage_region.union_with_rect(
+                        gtk.gdk.Rectangle(rect.x,
+                                          rect.y + index * self.item_height + self.title_offset_y,
+                                          rect.width,
+                                          self.item_height))
+
+            # Just redraw damage area, expose handler will draw rows in damage area.
+            for damage_rect in damage_region.get_rectangles():
+                self.queue_draw_area(damage_rect.x, damage_rect.y, damage_rect.width, damage_rect.height)
 
         # Clear redraw request list.
         self.redraw_request_list = []
 
-        return True
-
     def add_titles(self, titles, title_height=24):
         '''
         Add titles.
@@ -315,15 +328,58 @@ class ListView(gtk.DrawingArea):
         @param items: A list of item.
         @param insert_pos: The position to insert, default is None will insert new item at end of list.
         @param sort_list: Whether sort list after insert, default is False.
+
+        In virtual mode, add rows to data source and call L{ I{update_data_source} <update_data_source>} instead.
+
+        @raise ValueError: Raise ValueError if listview is in virtual mode.
         '''
+        if self.is_virtual():
+            raise ValueError("add_items: listview is in virtual mode, add rows to data source and call update_data_source instead.")
+
         # Add new items.
         with self.keep_select_status():
             if insert_pos == None:
+                index_start = len(self.items)
                 self.items += items
             else:
+                index_start = insert_pos
                 self.items = self.items[0:insert_pos] + items + self.items[insert_pos::]
 
         # Re-calculate.
+        for item in items:
+            # Binding redraw request signal.
+            item.connect("redraw_request", self.redraw_item)
+
+        self.update_cell_sizes(items)
+
+        # Sort list if sort_list enable, sort in current thread then caller get sorted items after return.
+        if sort_list and self.sorts != [] and self.title_sort_column != None:
+            if self.title_sorts == None:
+                reverse_order = False
+            else:
+                reverse_order = self.title_sorts[0]
+
+            (key_func, cmp_func) = self.sorts[self.title_sort_column]
+
+            # Drop result of running background sort, it don't contain new items.
+            self.sort_engine.cancel()
+            with self.keep_select_status():
+                self.items = self.sort_engine.sort_items(self.items, [(key_func, cmp_func, reverse_order)])
+
+            index_start = 0
+
+        # Update vertical adjustment.
+        self.update_vadjustment()
+
+        # Update item index, items before insert position keep their index.
+        self.update_item_index(index_start)
+
+    def update_cell_sizes(self, items):
+        '''
+        Internal function to update cell sizes with given items.
+
+        @param items: Items to measure, can be a sample of list.
+        '''
         (title_widths, title_heights) = self.get_title_sizes()
         sort_pixbuf = ui_theme.get_pixbuf("listview/sort_descending.png").get_pixbuf()
         sort_icon_width = sort_pixbuf.get_width() + self.SORT_PADDING_X * 2
@@ -331,9 +387,6 @@ class ListView(gtk.DrawingArea):
 
         cell_min_sizes = []
         for item in items:
-            # Binding redraw request signal.
-            item.connect("redraw_request", self.redraw_item)
-
             sizes = item.get_column_sizes()
             if cell_min_sizes == []:
                 cell_min_sizes = sizes
@@ -348,6 +401,9 @@ class ListView(gtk.DrawingArea):
 
                     cell_min_sizes[index] = (max_width, max_height)
 
+        if cell_min_sizes == []:
+            return
+
         # Get value.
         (cell_min_widths, cell_min_heights) = unzip(cell_min_sizes)
         self.cell_min_widths = mix_list_max(self.cell_min_widths, cell_min_widths)
@@ -356,24 +412,61 @@ class ListView(gtk.DrawingArea):
 
         self.item_height = max(self.item_height, max(copy.deepcopy(cell_min_heights)))
 
-        # Sort list if sort_list enable.
-        if sort_list and self.sorts != [] and self.title_sort_column != None:
-            if self.title_sorts == None:
-                reverse_order = False
-            else:
-                reverse_order = self.title_sorts[0]
+    def is_virtual(self):
+        '''
+        Whether listview is in virtual mode.
 
-            with self.keep_select_status():
-                self.items = sorted(self.items,
-                                    key=self.sorts[self.title_sort_column][0],
-                                    cmp=self.sorts[self.title_sort_column][1],
-                                    reverse=reverse_order)
+        @return: Return True if listview fetch items from data source.
+        '''
+        return self.data_source != None
 
-        # Update vertical adjustment.
-        self.update_vadjustment()
+    def set_data_source(self, data_source, cache_size=1024, sample_size=100):
+        '''
+        Switch listview to virtual mode, items will create from data source only when they need to draw.
 
-        # Update item index.
-        self.update_item_index()
+        In virtual mode, listview won't keep every item alive, only the recently used items are cached.
+        Add, delete and sort items through data source, then call L{ I{update_data_source} <update_data_source>} to refresh listview.
+        L{ I{add_items} <add_items>} raise ValueError in virtual mode, and L{ I{sort_items} <sort_items>} do nothing.
+
+        @param data_source: Data source to supply items, see L{ I{ListDataSource} <ListDataSource>}.
+        @param cache_size: The number of created items that keep in cache, default is 1024.
+        @param sample_size: The number of items to measure cell sizes, default is 100.
+        '''
+        self.data_source = data_source
+        self.sample_size = sample_size
+        self.start_select_row = None
+        self.select_rows = []
+        self.hover_row = None
+        self.items = VirtualItemList(data_source, cache_size, self.bind_virtual_item)
+
+        self.update_data_source()
+
+    def update_data_source(self):
+        '''
+        Refresh listview after rows of data source changed.
+        '''
+        if self.is_virtual():
+            self.items.reset()
+
+            # Remove select rows out of range.
+            self.select_rows = filter(lambda row: row < len(self.items), self.select_rows)
+            if self.start_select_row != None and self.start_select_row >= len(self.items):
+                self.start_select_row = None
+
+            # Estimate cell sizes with sample items.
+            self.update_cell_sizes(self.items.get_sample_items(self.sample_size))
+
+            self.update_vadjustment()
+
+            self.queue_draw()
+
+    def bind_virtual_item(self, item):
+        '''
+        Internal function to bind signal when virtual item created.
+
+        @param item: Item that create by data source.
+        '''
+        item.connect("redraw_request", self.redraw_item)
 
     def sort_items(self, compare_method, sort_reverse=False):
         '''
@@ -382,6 +475,10 @@ class ListView(gtk.DrawingArea):
         @param compare_method: Compare method to sort.
         @param sort_reverse: Whether sort reverse, default is False.
         '''
+        # Sort rows through data source in virtual mode.
+        if self.is_virtual():
+            return
+
         # Sort items.
         with self.keep_select_status():
             self.items = sorted(self.items,
@@ -394,20 +491,83 @@ class ListView(gtk.DrawingArea):
         # Redraw.
         self.queue_draw()
 
+    def sort_by_columns(self, sort_columns):
+        '''
+        Sort items with multiple columns in background thread.
+
+        Sort is stable, rows that have same key in primary column are sorted with next column,
+        new sort request will cancel running sort request.
+
+        @param sort_columns: Sort column list, primary column at first, format as [(column, reverse)], sort function of column is set by argument `sorts` of listview.
+        '''
+        if self.is_virtual() or len(self.items) == 0:
+            return
+
+        sort_keys = []
+        for (column, reverse) in sort_columns:
+            if column < len(self.sorts):
+                (key_func, cmp_func) = self.sorts[column]
+                sort_keys.append((key_func, cmp_func, reverse))
+
+        if sort_keys != []:
+            items = list(self.items)
+            self.sort_engine.start(
+                lambda request_id: self.sort_engine.sort_items(items, sort_keys, request_id),
+                lambda sort_items, request_id: self.finish_sort(items, sort_items, sort_columns, request_id))
+
+    @post_gui
+    def finish_sort(self, items, sort_items, sort_columns, request_id):
+        '''
+        Internal function to swap sort result in GUI thread.
+
+        @param items: Items when sort start.
+        @param sort_items: Sorted items.
+        @param sort_columns: Sort columns of sort request.
+        @param request_id: Request id of sort request.
+        '''
+        if self.sort_engine.is_cancelled(request_id):
+            return
+
+        # Sort again if items changed when sort running.
+        if items != self.items:
+            self.sort_by_columns(sort_columns)
+            return
+
+        # Just swap order and keep select status, don't need add items again.
+        with self.keep_select_status():
+            self.items = sort_items
+
+        self.update_item_index()
+
+        self.queue_draw()
+
     def redraw_item(self, list_item):
         '''
         Redraw item.
 
         @param list_item: List item need to redraw.
         '''
+        if self.row_surface_cache:
+            self.row_surface_cache.invalidate(list_item)
+
+        # Content of item maybe changed, drop cache sort keys.
+        self.sort_engine.clear_keys([list_item])
+
         self.redraw_request_list.append(list_item)
+        frame_clock.request_frame(self, self.update_redraw_request_list)
 
-    def update_item_index(self):
+    def update_item_index(self, start_index=0):
         '''
         Update index of items.
+
+        @param start_index: Update index from this position, items before it keep index, default is 0.
         '''
-        for (index, item) in enumerate(self.items):
-            item.set_index(index)
+        # Virtual items set index when they are created.
+        if self.is_virtual():
+            return
+
+        for index in xrange(start_index, len(self.items)):
+            self.items[index].set_index(index)
 
     def reorder_item(self, item, index):
         '''
@@ -418,6 +578,9 @@ class ListView(gtk.DrawingArea):
 
         If index < 0, move to begin position of list view, if index > max_index, move to end position of list view.
         '''
+        if self.is_virtual():
+            return
+
         if index < 0:
             index = 0
         else:
@@ -497,6 +660,24 @@ class ListView(gtk.DrawingArea):
         set_cursor(self, None)
         self.adjust_cursor = False
 
+    def get_viewport_index(self, offset_y, viewport):
+        '''
+        Get index range of rows in viewport.
+
+        @param offset_y: Y offset of viewport.
+        @param viewport: Viewport widget.
+        @return: Return (start_index, end_index), end_index is exclusive.
+        '''
+        start_y = offset_y - self.title_offset_y
+        end_y = offset_y + viewport.allocation.height - self.title_offset_y
+        start_index = max(start_y / self.item_height, 0)
+        if (end_y - end_y / self.item_height * self.item_height) == 0:
+            end_index = min(end_y / self.item_height + 1, len(self.items))
+        else:
+            end_index = min(end_y / self.item_height + 2, len(self.items))
+
+        return (start_index, end_index)
+
     def get_offset_coordinate(self, widget):
         '''
         Get viewport offset coordinate and viewport.
@@ -637,7 +818,7 @@ class ListView(gtk.DrawingArea):
         self.draw_mask(cr, offset_x, offset_y, viewport.allocation.width, viewport.allocation.height)
 
         # Draw items.
-        self.draw_items(cr, rect, offset_x, offset_y, viewport, cell_widths)
+        self.draw_items(cr, rect, offset_x, offset_y, viewport, cell_widths, event.area)
 
         # Draw titles.
         if self.titles:
@@ -722,15 +903,21 @@ class ListView(gtk.DrawingArea):
 
         return False
 
-    def draw_items(self, cr, rect, offset_x, offset_y, viewport, cell_widths):
+    def draw_items(self, cr, rect, offset_x, offset_y, viewport, cell_widths, area=None):
         if len(self.items) > 0:
             # Init.
             vadjust = get_match_parent(self, ["ScrolledWindow"]).get_vadjustment()
 
+            # Get row range of damage area.
+            if area == None:
+                damage_rows = None
+            else:
+                damage_rows = ((area.y - rect.y - self.title_offset_y) / self.item_height,
+                               (area.y + area.height - rect.y - self.title_offset_y) / self.item_height + 1)
+
             # Init top surface.
             if vadjust.get_value() != vadjust.get_lower():
-                top_surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, rect.width, self.mask_bound_height)
-                top_surface_cr = gtk.gdk.CairoContext(cairo.Context(top_surface))
+                (top_surface, top_surface_cr) = self.get_bound_surface("top", rect.width)
 
                 clip_y = vadjust.get_value() + self.mask_bound_height
             else:
@@ -740,8 +927,7 @@ class ListView(gtk.DrawingArea):
 
             # Init bottom surface.
             if vadjust.get_value() + vadjust.get_page_size() != vadjust.get_upper():
-                bottom_surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, rect.width, self.mask_bound_height)
-                bottom_surface_cr = gtk.gdk.CairoContext(cairo.Context(bottom_surface))
+                (bottom_surface, bottom_surface_cr) = self.get_bound_surface("bottom", rect.width)
 
                 clip_height = vadjust.get_page_size() - self.mask_bound_height - (clip_y - vadjust.get_value())
             else:
@@ -755,14 +941,15 @@ class ListView(gtk.DrawingArea):
                     top_surface_cr.clip()
 
                     self.draw_items_row(top_surface_cr, offset_x, viewport,
-                                        int(vadjust.get_value()))
+                                        int(vadjust.get_value()), damage_rows)
 
                 if bottom_surface_cr:
                     bottom_surface_cr.rectangle(rect.x, 0, rect.width, self.mask_bound_height)
                     bottom_surface_cr.clip()
 
                     self.draw_items_row(bottom_surface_cr, offset_x, viewport,
-                                        int(vadjust.get_value()) + int(vadjust.get_page_size()) + self.mask_bound_height)
+                                        int(vadjust.get_value()) + int(vadjust.get_page_size()) + self.mask_bound_height,
+                                        damage_rows)
 
                 # Don't draw any item under title area.
                 cr.rectangle(offset_x,
@@ -772,7 +959,7 @@ class ListView(gtk.DrawingArea):
                              )
                 cr.clip()
 
-                self.draw_items_row(cr, offset_x, viewport)
+                self.draw_items_row(cr, offset_x, viewport, damage_rows=damage_rows)
 
             with cairo_state(cr):
                 # Don't draw any item under title area.
@@ -784,13 +971,12 @@ class ListView(gtk.DrawingArea):
                 cr.clip()
 
                 # Get viewport index.
-                start_y = offset_y - self.title_offset_y
-                end_y = offset_y + viewport.allocation.height - self.title_offset_y
-                start_index = max(start_y / self.item_height, 0)
-                if (end_y - end_y / self.item_height * self.item_height) == 0:
-                    end_index = min(end_y / self.item_height + 1, len(self.items))
-                else:
-                    end_index = min(end_y / self.item_height + 2, len(self.items))
+                (start_index, end_index) = self.get_viewport_index(offset_y, viewport)
+
+                # Just draw rows in damage area.
+                if damage_rows != None:
+                    start_index = max(start_index, damage_rows[0])
+                    end_index = min(end_index, damage_rows[1])
 
                 filter_renders = []
                 for (row, item) in enumerate(self.items[start_index:end_index]):
@@ -801,7 +987,11 @@ class ListView(gtk.DrawingArea):
                         renders = item.get_renders()
                     render_y = rect.y + (row + start_index) * self.item_height + self.title_offset_y
                     render_height = self.item_height
+                    in_select = (start_index + row) in self.select_rows
+                    in_highlight = item == self.highlight_item
 
+                    # Get cell coordinates.
+                    cells = []
                     for (column, render) in enumerate(renders):
                         index = column
                         if self.hide_column_flag:
@@ -814,35 +1004,59 @@ class ListView(gtk.DrawingArea):
                         render_x = rect.x + cell_x
                         render_width = cell_width
 
+                        cells.append((render, render_x, render_width))
+
+                    draw_top = top_surface_cr and (not float(render_y) > vadjust.get_value() + float(self.mask_bound_height)) and (not float(render_y + render_height) < vadjust.get_value())
+                    draw_bottom = bottom_surface_cr and (not float(render_y) > vadjust.get_value() + vadjust.get_page_size()) and (not float(render_y + render_height) < vadjust.get_value() + vadjust.get_page_size() - float(self.mask_bound_height))
+
+                    if self.row_surface_cache:
+                        # Blit cached row surface instead of render every cell.
+                        row_surface = self.get_row_surface(item, cells, rect.x, render_height, in_select, in_highlight)
+
+                        if draw_top:
+                            top_surface_cr.set_source_surface(row_surface, rect.x, render_y - int(vadjust.get_value()))
+                            top_surface_cr.paint()
+
+                        if draw_bottom:
+                            bottom_surface_cr.set_source_surface(
+                                row_surface,
+                                rect.x,
+                                render_y - int(vadjust.get_value()) - int(vadjust.get_page_size() - self.mask_bound_height))
+                            bottom_surface_cr.paint()
+
+                        cr.set_source_surface(row_surface, rect.x, render_y)
+                        cr.paint()
+
+                        continue
+
+                    for (render, render_x, render_width) in cells:
                         # Draw on top surface.
-                        if top_surface_cr:
-                            if (not float(render_y) > vadjust.get_value() + float(self.mask_bound_height)) and (not float(render_y + render_height) < vadjust.get_value()):
-                                top_surface_cr.rectangle(rect.x, 0, rect.width, self.mask_bound_height)
-                                top_surface_cr.clip()
-
-                                render(
-                                    top_surface_cr,
-                                    gtk.gdk.Rectangle(render_x,
-                                                      render_y - int(vadjust.get_value()),
-                                                      render_width,
-                                                      render_height),
-                                    (start_index + row) in self.select_rows,
-                                    item == self.highlight_item)
+                        if draw_top:
+                            top_surface_cr.rectangle(rect.x, 0, rect.width, self.mask_bound_height)
+                            top_surface_cr.clip()
+
+                            render(
+                                top_surface_cr,
+                                gtk.gdk.Rectangle(render_x,
+                                                  render_y - int(vadjust.get_value()),
+                                                  render_width,
+                                                  render_height),
+                                in_select,
+                                in_highlight)
 
                         # Draw on bottom surface.
-                        if bottom_surface_cr:
-                            if (not float(render_y) > vadjust.get_value() + vadjust.get_page_size()) and (not float(render_y + render_height) < vadjust.get_value() + vadjust.get_page_size() - float(self.mask_bound_height)):
-                                bottom_surface_cr.rectangle(rect.x, 0, rect.width, self.mask_bound_height)
-                                bottom_surface_cr.clip()
-
-                                render(
-                                    bottom_surface_cr,
-                                    gtk.gdk.Rectangle(render_x,
-                                                      render_y - int(vadjust.get_value()) - int(vadjust.get_page_size() - self.mask_bound_height),
-                                                      render_width,
-                                                      render_height),
-                                    (start_index + row) in self.select_rows,
-                                    item == self.highlight_item)
+                        if draw_bottom:
+                            bottom_surface_cr.rectangle(rect.x, 0, rect.width, self.mask_bound_height)
+                            bottom_surface_cr.clip()
+
+                            render(
+                                bottom_surface_cr,
+                                gtk.gdk.Rectangle(render_x,
+                                                  render_y - int(vadjust.get_value()) - int(vadjust.get_page_size() - self.mask_bound_height),
+                                                  render_width,
+                                                  render_height),
+                                in_select,
+                                in_highlight)
 
                         with cairo_state(cr):
                             cr.rectangle(render_x,
@@ -857,48 +1071,107 @@ class ListView(gtk.DrawingArea):
                                                      render_y,
                                                      render_width,
                                                      render_height),
-                                   (start_index + row) in self.select_rows,
-                                   item == self.highlight_item)
+                                   in_select,
+                                   in_highlight)
 
             # Draw alpha mask on top surface.
             if top_surface:
-                i = 0
-                while (i <= self.mask_bound_height):
-                    with cairo_state(cr):
-                        cr.rectangle(rect.x, vadjust.get_value() + self.title_offset_y + i, rect.width, 1)
-                        cr.clip()
-                        cr.set_source_surface(
-                            top_surface,
-                            0,
-                            vadjust.get_value() + self.title_offset_y
-                            )
-                        cr.paint_with_alpha(math.sin(i * math.pi / 2 / self.mask_bound_height))
-
-                    i += 1
+                draw_fade_surface(
+                    cr, top_surface,
+                    0, vadjust.get_value() + self.title_offset_y,
+                    rect.x, vadjust.get_value() + self.title_offset_y,
+                    rect.width, self.mask_bound_height,
+                    True)
 
             # Draw alpha mask on bottom surface.
             if bottom_surface:
-                i = 0
-                while (i <= self.mask_bound_height):
-                    with cairo_state(cr):
-                        cr.rectangle(rect.x, vadjust.get_value() + vadjust.get_page_size() - self.mask_bound_height + i, rect.width, 1)
-                        cr.clip()
-                        cr.set_source_surface(
-                            bottom_surface,
-                            0,
-                            vadjust.get_value() + vadjust.get_page_size() - self.mask_bound_height
-                            )
-                        cr.paint_with_alpha(1.0 - (math.sin(i * math.pi / 2 / self.mask_bound_height)))
-
-                    i += 1
-
-    def draw_items_row(self, cr, offset_x, viewport, render_offset_y=0):
+                draw_fade_surface(
+                    cr, bottom_surface,
+                    0, vadjust.get_value() + vadjust.get_page_size() - self.mask_bound_height,
+                    rect.x, vadjust.get_value() + vadjust.get_page_size() - self.mask_bound_height,
+                    rect.width, self.mask_bound_height,
+                    False)
+
+    def get_bound_surface(self, bound_name, width):
+        '''
+        Internal function to get surface for draw mask bound, surface is reused if size not changed.
+
+        @param bound_name: Bound name, "top" or "bottom".
+        @param width: Width of surface.
+        @return: Return (surface, surface_cr), surface is cleared before return.
+        '''
+        surface = self.bound_surfaces.get(bound_name)
+        if surface == None or surface.get_width() != width or surface.get_height() != self.mask_bound_height:
+            surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, width, self.mask_bound_height)
+            self.bound_surfaces[bound_name] = surface
+
+        # New cairo context on surface, don't keep clip of last frame.
+        surface_cr = gtk.gdk.CairoContext(cairo.Context(surface))
+        with cairo_state(surface_cr):
+            surface_cr.set_operator(cairo.OPERATOR_CLEAR)
+            surface_cr.paint()
+
+        return (surface, surface_cr)
+
+    def set_row_cache(self, enable, cache_size=256):
+        '''
+        Enable or disable row surface cache.
+
+        When row cache enable, listview render row into surface once, and blit surface when row not change,
+        item should call emit_redraw_request when its content changed.
+
+        @param enable: Whether enable row cache.
+        @param cache_size: The max number of cached rows, default is 256.
+        '''
+        if enable:
+            self.row_surface_cache = RowSurfaceCache(cache_size)
+        else:
+            self.row_surface_cache = None
+
+        self.queue_draw()
+
+    def get_row_surface(self, item, cells, x, height, in_select, in_highlight):
+        '''
+        Internal function to get cached row surface.
+
+        @param item: List item.
+        @param cells: Cell list, format as [(render, render_x, render_width)].
+        @param x: X coordinate of row.
+        @param height: Height of row.
+        @param in_select: Whether row is selected.
+        @param in_highlight: Whether row is highlighted.
+        @return: Return row surface.
+        '''
+        cell_bounds = tuple(map(lambda (render, render_x, render_width): (render_x - x, render_width), cells))
+        if len(cells) > 0:
+            width = max(map(lambda (cell_x, cell_width): cell_x + cell_width, cell_bounds))
+        else:
+            width = 0
+
+        def render_row(cr, width, height):
+            for (render, render_x, render_width) in cells:
+                with cairo_state(cr):
+                    cr.rectangle(render_x - x, 0, render_width, height)
+                    cr.clip()
+
+                    render(cr,
+                           gtk.gdk.Rectangle(render_x - x, 0, render_width, height),
+                           in_select,
+                           in_highlight)
+
+        return self.row_surface_cache.get_surface(
+            item, (in_select, in_highlight, cell_bounds), width, height, render_row)
+
+    def draw_items_row(self, cr, offset_x, viewport, render_offset_y=0, damage_rows=None):
+        def in_damage_rows(row):
+            return damage_rows == None or damage_rows[0] <= row < damage_rows[1]
+
         # Draw hover row.
         highlight_row = None
         if self.highlight_item:
             highlight_row = self.highlight_item.get_index()
 
-        if self.hover_row != None and not self.hover_row in self.select_rows and self.hover_row != highlight_row:
+        if self.hover_row != None and not self.hover_row in self.select_rows and self.hover_row != highlight_row and in_damage_rows(self.hover_row):
             self.draw_item_hover(
                 cr,
                 offset_x,
@@ -908,7 +1181,7 @@ class ListView(gtk.DrawingArea):
 
         # Draw select rows.
         for select_row in self.select_rows:
-            if select_row != highlight_row:
+            if select_row != highlight_row and in_damage_rows(select_row):
                 self.draw_item_select(
                     cr,
                     offset_x,
@@ -917,11 +1190,11 @@ class ListView(gtk.DrawingArea):
                     self.item_height)
 
         # Draw highlight row.
-        if self.highlight_item:
+        if self.highlight_item and in_damage_rows(highlight_row):
             self.draw_item_highlight(
                 cr,
                 offset_x,
-                self.title_offset_y + self.highlight_item.get_index() * self.item_height - render_offset_y,
+                self.title_offset_y + highlight_row * self.item_height - render_offset_y,
                 viewport.allocation.width,
                 self.item_height)
 
@@ -1269,16 +1542,9 @@ class ListView(gtk.DrawingArea):
                                 self.title_sorts[column] = not self.title_sorts[column]
                                 self.title_clicks[column] = False
 
-                                if len(self.sorts) >= column + 1:
-                                    with self.keep_select_status():
-                                        # Re-sort.
-                                        self.items = sorted(self.items,
-                                                            key=self.sorts[column][0],
-                                                            cmp=self.sorts[column][1],
-                                                            reverse=self.title_sorts[column])
-
-                                    # Update item index.
-                                    self.update_item_index()
+                                if len(self.sorts) >= column + 1 and not self.is_virtual():
+                                    # Re-sort in background, stable sort keep previous order for equal rows.
+                                    self.sort_by_columns([(column, self.title_sorts[column])])
                                 break
                 elif len(self.items) > 0:
                     self.release_item(event)
@@ -1298,6 +1564,11 @@ class ListView(gtk.DrawingArea):
         '''
         Handy function that change listview and keep select status not change.
         '''
+        # Virtual mode keep select rows, restore select items need create all items.
+        if self.is_virtual():
+            yield
+            return
+
         # Save select items.
         start_select_item = None
         if self.start_select_row != None:
@@ -1324,6 +1595,8 @@ class ListView(gtk.DrawingArea):
                 if select_items != []:
                     self.select_rows = []
 
+                # Use set to check select item, list search is too slow when select many items.
+                select_items = set(select_items)
                 for (index, item) in enumerate(self.items):
                     # Try restore select row.
                     if item in select_items:
@@ -1336,7 +1609,7 @@ class ListView(gtk.DrawingArea):
                         start_select_item = None
 
                     # Stop loop when finish restore row status.
-                    if select_items == [] and start_select_item == None:
+                    if len(select_items) == 0 and start_select_item == None:
                         break
 
     def release_item(self, event):
@@ -1387,6 +1660,10 @@ class ListView(gtk.DrawingArea):
         '''
         Internal function to drag select items at cursor position.
         '''
+        # Data source decide order of items in virtual mode.
+        if self.is_virtual():
+            return
+
         (event_x, event_y) = get_event_coords(event)
         hover_row = min(max(int((event_y - self.title_offset_y) / self.item_height), 0),
                         len(self.items))
@@ -1905,6 +2182,12 @@ class ListView(gtk.DrawingArea):
         self.select_rows = []
         cache_remove_items = []
 
+        # Just emit signal in virtual mode, remove rows from data source in signal handler.
+        if self.is_virtual():
+            self.emit("delete-select-items", list(remove_items))
+            self.queue_draw()
+            return
+
         # Remove select items.
         for remove_item in remove_items:
             cache_remove_items.append(remove_item)
@@ -1948,6 +2231,12 @@ class ListView(gtk.DrawingArea):
         self.start_select_row = None
         self.select_rows = []
         self.items = []
+        self.data_source = None
+        if self.row_surface_cache:
+            self.row_surface_cache.clear()
+
+        self.sort_engine.cancel()
+        self.sort_engine.clear_keys()
 
         # Update vertical adjustment.
         self.update_vadjustment()
@@ -2145,6 +2434,124 @@ class ListItem(gobject.GObject):
         '''
         return [self.render_title, self.render_artist, self.render_length]
 
+class ListDataSource(object):
+    '''
+    ListDataSource template to supply items for L{ I{ListView} <ListView>} in virtual mode.
+
+    Data source keep light-weight rows, and create item only when listview need it.
+
+    @note: This class just template to build data source, you can build new data source with same interface.
+    '''
+
+    def __init__(self, rows, create_item):
+        '''
+        Initialize ListDataSource class.
+
+        @param rows: A list of row data.
+        @param create_item: Function to create item with row data, such as: lambda row: ListItem(*row).
+        '''
+        self.rows = rows
+        self.create_item_callback = create_item
+
+    def get_row_count(self):
+        '''
+        Get row count.
+
+        This is ListView interface, you should implement it.
+
+        @return: Return the number of rows.
+        '''
+        return len(self.rows)
+
+    def create_item(self, index):
+        '''
+        Create item at given index.
+
+        This is ListView interface, you should implement it.
+
+        @param index: Row index.
+        @return: Return new item at given index.
+        '''
+        return self.create_item_callback(self.rows[index])
+
+class VirtualItemList(object):
+    '''
+    List-like wrapper of data source, create items on demand and keep recently used items in LRU cache.
+
+    @undocumented: get_sample_items
+    '''
+
+    def __init__(self, data_source, cache_size=1024, create_callback=None):
+        '''
+        Initialize VirtualItemList class.
+
+        @param data_source: Data source, see L{ I{ListDataSource} <ListDataSource>}.
+        @param cache_size: The number of created items that keep in cache, default is 1024.
+        @param create_callback: Callback when item created, default is None.
+        '''
+        self.data_source = data_source
+        self.cache_size = cache_size
+        self.create_callback = create_callback
+        self.cache_items = collections.OrderedDict()
+        self.row_count = data_source.get_row_count()
+
+    def reset(self):
+        '''
+        Drop created items and read row count from data source again.
+        '''
+        self.cache_items.clear()
+        self.row_count = self.data_source.get_row_count()
+
+    def get_item(self, index):
+        '''
+        Get item at given index, create item if it not in cache.
+
+        @param index: Row index.
+        @return: Return item at given index.
+        '''
+        if self.cache_items.has_key(index):
+            # Move item to end of cache, make it most recently used.
+            item = self.cache_items.pop(index)
+        else:
+            item = self.data_source.create_item(index)
+            item.set_index(index)
+            if self.create_callback:
+                self.create_callback(item)
+
+            # Evict least recently used item.
+            if len(self.cache_items) >= self.cache_size:
+                self.cache_items.popitem(last=False)
+
+        self.cache_items[index] = item
+        return item
+
+    def get_sample_items(self, sample_size):
+        '''
+        Get items disperse in whole list to estimate cell sizes.
+
+        @param sample_size: The number of sample items.
+        @return: Return sample items.
+        '''
+        step = max(self.row_count / max(sample_size, 1), 1)
+        return [self.get_item(index) for index in xrange(0, self.row_count, step)[0:sample_size]]
+
+    def __len__(self):
+        return self.row_count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.get_item(i) for i in xrange(*index.indices(self.row_count))]
+        else:
+            if index < 0:
+                index += self.row_count
+            if not 0 <= index < self.row_count:
+                raise IndexError("list index out of range")
+            return self.get_item(index)
+
+    def __iter__(self):
+        for index in xrange(self.row_count):
+            yield self.get_item(index)
+
 def render_text(cr, rect, content, in_select, in_highlight, align=ALIGN_START, font_size=DEFAULT_FONT_SIZE):
     '''
     Helper render text function for ListItem, you should implement your own.
@@ -24,9 +24,9 @@
 from draw import draw_pixbuf
 from utils import is_in_rect, color_hex_to_cairo
 from constant import PANED_HANDLE_SIZE
+from timeline import Timeline, CURVE_SINE
 import gobject
 import gtk
-import math
 from theme import ui_theme
 
 # Load customize rc style before any other.
@@ -43,6 +43,8 @@ class Paned(gtk.Paned):
     @undocumented: is_in_button
     @undocumented: draw_handle
     @undocumented: do_expose_event
+    @undocumented: update_position
+    @undocumented: completed_position
 
     gtk.Paned with custom better apperance.
     '''
@@ -69,7 +71,7 @@ class Paned(gtk.Paned):
         self.init_button("normal")
         self.animation_delay = 20 # milliseconds
         self.animation_times = 10
-        self.animation_position_frames = []
+        self.position_timeline = None
         self.press_coordinate = None
 
     def init_button(self, status):
@@ -256,27 +258,28 @@ class Paned(gtk.Paned):
             self.saved_position = -1
 
     def change_position(self, new_position):
+        if self.position_timeline:
+            self.position_timeline.stop()
+            self.position_timeline = None
+
         current_position = self.get_position()
         if self.enable_animation:
             if new_position != current_position:
-                for i in range(0, self.animation_times + 1):
-                    step = int(math.sin(math.pi * i / 2 / self.animation_times) * (new_position - current_position))
-                    self.animation_position_frames.append(current_position + step)
-
-                if self.animation_position_frames[-1] != new_position:
-                    self.animation_position_frames.append(new_position)
-
-                gtk.timeout_add(self.animation_delay, self.update_position)
+                self.position_timeline = Timeline(self.animation_delay * self.animation_times, CURVE_SINE)
+                self.position_timeline.connect(
+                    "update",
+                    lambda source, status: self.update_position(current_position, new_position, status))
+                self.position_timeline.connect("completed", lambda source: self.completed_position(source))
+                self.position_timeline.run()
         else:
             self.set_position(new_position)
 
-    def update_position(self):
-        self.set_position(self.animation_position_frames.pop(0))
+    def update_position(self, start_position, end_position, status):
+        self.set_position(start_position + int(status * (end_position - start_position)))
 
-        if self.animation_position_frames == []:
-            return False
-        else:
-            return True
+    def completed_position(self, timeline):
+        if self.position_timeline == timeline:
+            self.position_timeline = None
 
     def do_size_allocate(self, e):
         gtk.Paned.do_size_allocate(self, e)
@@ -22,6 +22,7 @@
 
 from skin_config import skin_config
 from theme import ui_theme
+from timeline import Timeline, CURVE_LINEAR
 from utils import remove_timeout_id
 import cairo
 import gobject
@@ -38,6 +39,8 @@ class Panel(gtk.Window):
     @undocumented: start_hide
     @undocumented: render_show
     @undocumented: render_hide
+    @undocumented: completed_show
+    @undocumented: completed_hide
     @undocumented: shape_panel
     '''
 
@@ -60,8 +63,8 @@ class Panel(gtk.Window):
         self.add_events(gtk.gdk.ALL_EVENTS_MASK)
         self.set_skip_taskbar_hint(True)
         self.set_type_hint(gtk.gdk.WINDOW_TYPE_HINT_DIALOG) # make panel window don't switch in window manager
-        self.start_show_id = None
-        self.start_hide_id = None
+        self.show_timeline = None
+        self.hide_timeline = None
         self.delay = 50         # milliseconds
         self.show_inc_opacity = 0.1
         self.hide_dec_opacity = 0.05
@@ -76,9 +79,12 @@ class Panel(gtk.Window):
         '''
         Internal function to stop render.
         '''
-        # Stop callback.
-        remove_timeout_id(self.start_show_id)
-        remove_timeout_id(self.start_hide_id)
+        # Stop timeline.
+        for timeline in [self.show_timeline, self.hide_timeline]:
+            if timeline:
+                timeline.stop()
+        self.show_timeline = None
+        self.hide_timeline = None
 
     def show_panel(self):
         '''
@@ -98,43 +104,54 @@ class Panel(gtk.Window):
         '''
         Internal function to start show.
         '''
-        if self.start_show_id == None and self.get_opacity() != 1:
+        if self.show_timeline == None and self.get_opacity() != 1:
             self.stop_render()
-            self.start_show_id = gtk.timeout_add(self.delay, self.render_show)
+
+            # Keep same speed as step animation: show_inc_opacity every delay milliseconds.
+            start_opacity = self.get_opacity()
+            self.show_timeline = Timeline((1 - start_opacity) / self.show_inc_opacity * self.delay, CURVE_LINEAR)
+            self.show_timeline.connect("update", lambda source, status: self.render_show(start_opacity, status))
+            self.show_timeline.connect("completed", lambda source: self.completed_show())
+            self.show_timeline.run()
             self.show_all()
 
     def start_hide(self):
         '''
         Internal function to start hide.
         '''
-        if self.start_hide_id == None and self.get_opacity() != 0:
+        if self.hide_timeline == None and self.get_opacity() != 0:
             self.stop_render()
-            self.start_hide_id = gtk.timeout_add(self.delay, self.render_hide)
 
-    def render_show(self):
+            start_opacity = self.get_opacity()
+            self.hide_timeline = Timeline(start_opacity / self.hide_dec_opacity * self.delay, CURVE_LINEAR)
+            self.hide_timeline.connect("update", lambda source, status: self.render_hide(start_opacity, status))
+            self.hide_timeline.connect("completed", lambda source: self.completed_hide())
+            self.hide_timeline.run()
+
+    def render_show(self, start_opacity, status):
         '''
         Internal function to render show effect.
         '''
-        self.set_opacity(min(self.get_opacity() + self.show_inc_opacity, 1))
+        self.set_opacity(start_opacity + (1 - start_opacity) * status)
 
-        if self.get_opacity() >= 1:
-            self.stop_render()
-            return False
-        else:
-            return True
-
-    def render_hide(self):
+    def render_hide(self, start_opacity, status):
         '''
         Internal function to render hide effect.
         '''
-        self.set_opacity(max(self.get_opacity() - self.hide_dec_opacity, 0))
+        self.set_opacity(start_opacity * (1 - status))
 
-        if self.get_opacity() <= 0:
-            self.stop_render()
-            self.hide_panel()
-            return False
-        else:
-            return True
+    def completed_show(self):
+        '''
+        Internal function to finish show effect.
+        '''
+        self.show_timeline = None
+
+    def completed_hide(self):
+        '''
+        Internal function to finish hide effect.
+        '''
+        self.hide_timeline = None
+        self.hide_panel()
 
     def resize_panel(self, w, h):
         '''
@@ -0,0 +1,107 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2011 ~ 2012 Deepin, Inc.
+#               2011 ~ 2012 Wang Yong
+#
+# Author:     Wang Yong <lazycat.manatee@gmail.com>
+# Maintainer: Wang Yong <lazycat.manatee@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from theme import ui_theme
+import cairo
+import collections
+import gtk
+
+class RowSurfaceCache(object):
+    '''
+    Cache rendered row surface for ListView and TreeView.
+
+    Row surface is keyed by item, state key and size of row,
+    view just blit cached surface when row haven't changed, instead of call render callbacks of every cell.
+
+    Item must call emit_redraw_request when its content changed, view will drop cache surface of item.
+    '''
+
+    def __init__(self, cache_size=256):
+        '''
+        Initialize RowSurfaceCache class.
+
+        @param cache_size: The max number of row surfaces in cache, default is 256.
+        '''
+        self.cache_size = cache_size
+        self.cache_dict = collections.OrderedDict()
+        self.theme_ticker = ui_theme.get_ticker()
+        self.hits = 0
+        self.misses = 0
+
+    def get_surface(self, item, state_key, width, height, render_callback):
+        '''
+        Get row surface of item, render new surface if state or size of row changed.
+
+        @param item: Item of row.
+        @param state_key: Hashable value that describe state of row, such as select or highlight status.
+        @param width: Width of row.
+        @param height: Height of row.
+        @param render_callback: Callback to render row, callback arguments: (cr, width, height).
+        @return: Return cairo.ImageSurface of row.
+        '''
+        # Drop all surfaces after theme changed.
+        if self.theme_ticker != ui_theme.get_ticker():
+            self.theme_ticker = ui_theme.get_ticker()
+            self.clear()
+
+        cache_key = (state_key, width, height)
+        cache_info = self.cache_dict.pop(item, None)
+        if cache_info != None and cache_info[0] == cache_key:
+            self.hits += 1
+            surface = cache_info[1]
+        else:
+            self.misses += 1
+            surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, max(width, 1), max(height, 1))
+            render_callback(gtk.gdk.CairoContext(cairo.Context(surface)), width, height)
+
+            if cache_info == None and len(self.cache_dict) >= self.cache_size:
+                self.cache_dict.popitem(last=False)
+
+        self.cache_dict[item] = (cache_key, surface)
+
+        return surface
+
+    def invalidate(self, item):
+        '''
+        Drop cache surface of given item.
+
+        @param item: Item that need redraw.
+        '''
+        self.cache_dict.pop(item, None)
+
+    def clear(self):
+        '''
+        Drop all cache surfaces.
+        '''
+        self.cache_dict.clear()
+
+    def get_stats(self):
+        '''
+        Get cache statistics.
+
+        @return: Return dict with hit and miss counters.
+        '''
+        return {
+            "hits" : self.hits,
+            "misses" : self.misses,
+            "cache_length" : len(self.cache_dict),
+            }
@@ -27,15 +27,19 @@ from constant import SHADOW_SIZE, COLOR_SEQUENCE
 from dialog import ConfirmDialog, OpenFileDialog, SaveFileDialog
 from dialog import DialogBox, DIALOG_MASK_SINGLE_PAGE
 from draw import draw_pixbuf, draw_vlinear, draw_hlinear
+from file_cache import get_cache_home, write_cache_file
 from iconview import IconView
 from label import Label
 from locales import _, LANGUAGE
 from scrolled_window import ScrolledWindow
 from skin_config import skin_config
 from theme import ui_theme
+from threads import post_gui
 import tooltip as Tooltip
+import Queue as Q
 import gobject
 import gtk
+import hashlib
 import math
 import os
 import threading as td
@@ -46,11 +50,160 @@ from utils import (is_in_rect, set_cursor, remove_timeout_id,
                    cairo_disable_antialias,
                    scroll_to_bottom,
                    place_center, file_is_image,
-                   get_optimum_pixbuf_from_file)
+                   get_optimum_pixbuf_from_pixbuf)
 
 
 __all__ = ["SkinWindow"]
 
+PREVIEW_WORKER_NUM = 4
+
+def get_skin_preview_path(background_path, width, height):
+    '''
+    Get cache path of skin preview.
+
+    @param background_path: Background image path of skin.
+    @param width: Preview width.
+    @param height: Preview height.
+    @return: Return cache path of preview.
+    '''
+    return os.path.join(get_cache_home(), "deepin-ui", "skin-preview",
+                        "%s.png" % hashlib.md5("%s:%sx%s" % (background_path, width, height)).hexdigest())
+
+def decode_skin_preview(background_path, width, height):
+    '''
+    Decode skin preview at reduced size, don't decode full resolution image.
+
+    Preview is same as get_optimum_pixbuf_from_file(background_path, width, height, False).
+
+    @param background_path: Background image path of skin.
+    @param width: Preview width.
+    @param height: Preview height.
+    @return: Return preview pixbuf.
+    '''
+    file_info = gtk.gdk.pixbuf_get_file_info(background_path)
+    if file_info == None:
+        raise ValueError("%s is not image" % background_path)
+
+    (image_format, image_width, image_height) = file_info
+    scale = max(float(width) / image_width, float(height) / image_height)
+    if scale < 1.0:
+        # Decode at size that cover preview area, then crop like get_optimum_pixbuf_from_pixbuf.
+        pixbuf = gtk.gdk.pixbuf_new_from_file_at_scale(
+            background_path,
+            max(int(math.ceil(image_width * scale)), width),
+            max(int(math.ceil(image_height * scale)), height),
+            False)
+    else:
+        pixbuf = gtk.gdk.pixbuf_new_from_file(background_path)
+
+    return get_optimum_pixbuf_from_pixbuf(pixbuf, width, height, False)
+
+def get_skin_preview(background_path, width, height):
+    '''
+    Get skin preview, preview is cached on disk and decode again when background image changed.
+
+    This function don't use GTK+ widget, so it can call in background thread.
+
+    @param background_path: Background image path of skin.
+    @param width: Preview width.
+    @param height: Preview height.
+    @return: Return preview pixbuf, or None if background image can't decode.
+    '''
+    try:
+        stat = os.stat(background_path)
+    except OSError:
+        return None
+
+    options = {
+        "tEXt::Thumb::URI" : background_path,
+        "tEXt::Thumb::MTime" : str(int(stat.st_mtime)),
+        "tEXt::Thumb::Size" : str(stat.st_size),
+        "tEXt::Software" : "deepin-ui",
+        }
+
+    preview_path = get_skin_preview_path(background_path, width, height)
+    if os.path.exists(preview_path):
+        try:
+            pixbuf = gtk.gdk.pixbuf_new_from_file(preview_path)
+            if all(map(lambda (key, value): pixbuf.get_option(key) == value, options.items())):
+                return pixbuf
+        except gobject.GError:
+            pass
+
+    try:
+        pixbuf = decode_skin_preview(background_path, width, height)
+    except Exception, e:
+        print "get_skin_preview: decode %s got error: %s" % (background_path, e)
+        return None
+
+    write_cache_file(preview_path, lambda temp_filepath: pixbuf.save(temp_filepath, "png", options))
+
+    return pixbuf
+
+class SkinPreviewLoader(object):
+    '''
+    Load skin previews with worker threads, every preview is passed to its item once it finish.
+
+    @undocumented: load_loop
+    @undocumented: finish_load
+    '''
+
+    def __init__(self, worker_num=PREVIEW_WORKER_NUM):
+        '''
+        Initialize SkinPreviewLoader class.
+
+        @param worker_num: The max number of worker threads, default is 4.
+        '''
+        self.worker_num = worker_num
+        self.worker_count = 0
+        self.item_queue = Q.Queue()
+        self.lock = td.Lock()
+        self.stopped = False
+
+    def load(self, items):
+        '''
+        Load previews of items, worker threads are started if necessary.
+
+        @param items: SkinPreviewIcon list.
+        '''
+        with self.lock:
+            for item in items:
+                self.item_queue.put(item)
+
+            while self.worker_count < min(self.worker_num, self.item_queue.qsize()):
+                self.worker_count += 1
+                worker = td.Thread(target=self.load_loop)
+                worker.setDaemon(True)
+                worker.start()
+
+    def stop(self):
+        '''
+        Stop loader, pending items are dropped.
+        '''
+        self.stopped = True
+
+    def load_loop(self):
+        while not self.stopped:
+            # Worker exit when queue is empty, check and exit in lock to avoid miss new item.
+            with self.lock:
+                try:
+                    item = self.item_queue.get_nowait()
+                except Q.Empty:
+                    self.worker_count -= 1
+                    return
+
+            pixbuf = get_skin_preview(item.background_path, item.width, item.height)
+            if pixbuf != None:
+                self.finish_load(item, pixbuf)
+
+        with self.lock:
+            self.worker_count -= 1
+
+    @post_gui
+    def finish_load(self, item, pixbuf):
+        if not self.stopped:
+            item.set_pixbuf(pixbuf)
+
 class LoadSkinThread(td.Thread):
     '''
     Thread to load skin.
@@ -75,18 +228,27 @@ class LoadSkinThread(td.Thread):
         self.add_skin_icons = add_skin_icons
         self.add_add_icon = add_add_icon
 
-        self.skin_icon_list = []
+        self.skin_icon_queue = Q.Queue()
 
         self.in_loading = True
 
     def render_skin_icons(self):
-        if len(self.skin_icon_list) > 0:
-            self.add_skin_icons(self.skin_icon_list)
-            self.skin_icon_list = []
+        # Read loading status before get skin infos, don't miss skin that put at last.
+        in_loading = self.in_loading
+
+        skin_icon_list = []
+        while True:
+            try:
+                skin_icon_list.append(self.skin_icon_queue.get_nowait())
+            except Q.Empty:
+                break
 
-        if not self.in_loading:
+        if len(skin_icon_list) > 0:
+            self.add_skin_icons(skin_icon_list)
+
+        if not in_loading:
             self.add_add_icon()
-        return self.in_loading
+        return in_loading
 
     def run(self):
         '''
@@ -94,11 +256,22 @@ class LoadSkinThread(td.Thread):
         '''
         gtk.timeout_add(100, self.render_skin_icons)
         for skin_dir in self.skin_dirs:
-            for root, dirs, files in os.walk(skin_dir):
-                dirs.sort()         # sort directory with alpha order
-                for filename in files:
-                    if file_is_image(os.path.join(root, filename)):
-                        self.skin_icon_list.append((root, filename))
+            if os.path.isdir(skin_dir):
+                # Background image of skin is read from config.ini, don't need sniff every file.
+                for skin_name in sorted(os.listdir(skin_dir)):
+                    skin_path = os.path.join(skin_dir, skin_name)
+                    config_path = os.path.join(skin_path, "config.ini")
+                    if os.path.isfile(config_path):
+                        try:
+                            config = Config(config_path)
+                            config.load()
+                            background_file = config.get("background", "image")
+                        except Exception, e:
+                            print "LoadSkinThread: load %s got error: %s" % (config_path, e)
+                            continue
+
+                        if os.path.isfile(os.path.join(skin_path, background_file)):
+                            self.skin_icon_queue.put((skin_path, background_file, config))
         self.in_loading = False
 
 class SkinWindow(DialogBox):
@@ -199,6 +372,10 @@ class SkinPreviewPage(gtk.VBox):
         self.preview_scrolled_window.add_child(self.preview_view)
         self.pack_start(self.preview_align, True, True)
 
+        # Previews are streamed into icons when they finish.
+        self.preview_loader = SkinPreviewLoader()
+        self.connect("destroy", lambda w: self.preview_loader.stop())
+
         LoadSkinThread([skin_config.system_skin_dir, skin_config.user_skin_dir],
                        self.add_skin_icons,
                        self.add_add_icon).start()
@@ -217,15 +394,17 @@ class SkinPreviewPage(gtk.VBox):
         Add skin icon.
         '''
         items = []
-        for (root, filename) in skin_infos:
+        for (root, filename, config) in skin_infos:
             items.append(
                 SkinPreviewIcon(
                     root,
                     filename,
                     self.change_skin_callback,
                     self.switch_edit_page_callback,
-                    self.pop_delete_skin_dialog))
+                    self.pop_delete_skin_dialog,
+                    config))
         self.preview_view.add_items(items)
+        self.preview_loader.load(items)
 
     def add_add_icon(self):
         '''
@@ -252,8 +431,12 @@ class SkinPreviewPage(gtk.VBox):
         '''
         Create skin from image.
         '''
-        (load_skin_status, skin_dir, skin_image_file) = skin_config.load_skin_from_image(filepath)
+        skin_config.load_skin_from_image(filepath, self.finish_create_skin_from_image)
 
+    def finish_create_skin_from_image(self, load_skin_status, skin_dir, skin_image_file):
+        '''
+        Internal callback when skin created from image.
+        '''
         if load_skin_status:
             self.add_skin_preview_icon(skin_dir, skin_image_file)
 
@@ -270,13 +453,15 @@ class SkinPreviewPage(gtk.VBox):
                           _("Imported skin version mismatches with current one!")).show_all()
 
     def add_skin_preview_icon(self, skin_dir, skin_image_file):
-        self.preview_view.add_items([SkinPreviewIcon(
-                    skin_dir,
-                    skin_image_file,
-                    self.change_skin_callback,
-                    self.switch_edit_page_callback,
-                    self.pop_delete_skin_dialog
-                    )], -1)
+        item = SkinPreviewIcon(
+            skin_dir,
+            skin_image_file,
+            self.change_skin_callback,
+            self.switch_edit_page_callback,
+            self.pop_delete_skin_dialog
+            )
+        self.preview_view.add_items([item], -1)
+        self.preview_loader.load([item])
 
         self.highlight_skin()
 
@@ -352,9 +537,14 @@ class SkinPreviewIcon(gobject.GObject):
                  background_file,
                  change_skin_callback,
                  switch_edit_page_callback,
-                 pop_delete_skin_dialog_callback):
+                 pop_delete_skin_dialog_callback,
+                 config=None):
         '''
         Init item icon.
+
+        Preview is empty until L{ I{set_pixbuf} <SkinPreviewIcon.set_pixbuf>} is called.
+
+        @param config: Loaded config of skin, default is None to load config.ini of skin_dir.
         '''
         gobject.GObject.__init__(self)
         self.skin_dir = skin_dir
@@ -373,15 +563,65 @@ class SkinPreviewIcon(gobject.GObject):
         self.delete_button_status = self.BUTTON_HIDE
         self.edit_button_status = self.BUTTON_HIDE
 
-        self.pixbuf = get_optimum_pixbuf_from_file(self.background_path, self.width, self.height, False)
+        self.pixbuf = None
+        self.preview_pixbuf = None
 
         self.show_delete_button_id = None
         self.show_edit_button_id = None
         self.show_delay = 500  # milliseconds
 
         # Load skin config information.
-        self.config = Config(os.path.join(self.skin_dir, "config.ini"))
-        self.config.load()
+        self.config_path = os.path.join(self.skin_dir, "config.ini")
+        self.config_mtime = self.get_config_mtime()
+        if config == None:
+            self.config = Config(self.config_path)
+            self.config.load()
+        else:
+            self.config = config
+
+    def get_config_mtime(self):
+        '''
+        Get modification time of skin config.
+        '''
+        try:
+            return os.path.getmtime(self.config_path)
+        except OSError:
+            return None
+
+    def set_pixbuf(self, pixbuf):
+        '''
+        Set preview pixbuf.
+
+        @param pixbuf: Preview pixbuf.
+        '''
+        self.pixbuf = pixbuf
+        self.preview_pixbuf = None
+
+        self.emit_redraw_request()
+
+    def get_preview_pixbuf(self):
+        '''
+        Get mirrored preview pixbuf, config is loaded again only when config.ini changed.
+        '''
+        config_mtime = self.get_config_mtime()
+        if config_mtime != self.config_mtime:
+            self.config_mtime = config_mtime
+            self.config = Config(self.config_path)
+            self.config.load()
+            self.preview_pixbuf = None
+
+        if self.preview_pixbuf == None and self.pixbuf != None:
+            # Mirror image if necessarily.
+            pixbuf = self.pixbuf
+            if self.config.getboolean("action", "vertical_mirror"):
+                pixbuf = pixbuf.flip(True)
+
+            if self.config.getboolean("action", "horizontal_mirror"):
+                pixbuf = pixbuf.flip(False)
+
+            self.preview_pixbuf = pixbuf
+
+        return self.preview_pixbuf
 
     def is_in_delete_button_area(self, x, y):
         '''
@@ -455,25 +695,16 @@ class SkinPreviewIcon(gobject.GObject):
             rect.y + self.padding_y)
 
         # Draw background.
-        with cairo_state(cr):
-            # Mirror image if necessarily.
-            preview_config = Config(os.path.join(self.skin_dir, "config.ini"))
-            preview_config.load()
-
-            pixbuf = self.pixbuf.copy()
-            if preview_config.getboolean("action", "vertical_mirror"):
-                pixbuf = pixbuf.flip(True)
-
-            if preview_config.getboolean("action", "horizontal_mirror"):
-                pixbuf = pixbuf.flip(False)
-
-            # Draw cover.
-            draw_pixbuf(
-                cr,
-                pixbuf,
-                rect.x + (rect.width - self.pixbuf.get_width()) / 2,
-                rect.y + (rect.height - self.pixbuf.get_height()) / 2
-                )
+        pixbuf = self.get_preview_pixbuf()
+        if pixbuf != None:
+            with cairo_state(cr):
+                # Draw cover.
+                draw_pixbuf(
+                    cr,
+                    pixbuf,
+                    rect.x + (rect.width - pixbuf.get_width()) / 2,
+                    rect.y + (rect.height - pixbuf.get_height()) / 2
+                    )
 
         # Draw delete button.
         if self.delete_button_status != self.BUTTON_HIDE:
@@ -20,13 +20,15 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-from dominant_color import get_dominant_color
-from cache_pixbuf import CachePixbuf
+from dominant_color import get_dominant_color, get_dominant_color_async
+from cache_pixbuf import CachePixbuf, scaled_pixbuf_cache
 from deepin_utils.config import Config
 from constant import SHADOW_SIZE, COLOR_SEQUENCE
 from draw import draw_pixbuf, draw_vlinear, draw_hlinear
 from deepin_utils.file import create_directory, remove_file, touch_file, remove_directory
 from utils import color_hex_to_cairo, find_similar_color
+import cairo
+import collections
 import shutil
 import gobject
 import gtk
@@ -51,6 +53,8 @@ class SkinConfig(gobject.GObject):
     @undocumented: save_skin
     @undocumented: change_theme
     @undocumented: apply_skin
+    @undocumented: finish_stage_theme
+    @undocumented: redraw_skin
     @undocumented: add_theme
     @undocumented: remove_theme
     @undocumented: wrap_skin_window
@@ -61,8 +65,11 @@ class SkinConfig(gobject.GObject):
     @undocumented: vertical_mirror_background
     @undocumented: horizontal_mirror_background
     @undocumented: render_background
+    @undocumented: draw_background
+    @undocumented: clear_background_cache
     @undocumented: export_skin
     @undocumented: load_skin_from_image
+    @undocumented: create_skin_from_image
     @undocumented: load_skin_from_package
     '''
 
@@ -77,9 +84,12 @@ class SkinConfig(gobject.GObject):
         # Init.
         gobject.GObject.__init__(self)
         self.cache_pixbuf = CachePixbuf()
+        self.background_surface_dict = collections.OrderedDict()
+        self.background_surface_cache_size = 3
 
         self.theme_list = []
         self.window_list = []
+        self.theme_request_id = 0
 
     def set_application_window_size(self, app_window_width, app_window_height):
         '''
@@ -258,6 +268,7 @@ class SkinConfig(gobject.GObject):
 
             # Generate background pixbuf.
             self.background_pixbuf = gtk.gdk.pixbuf_new_from_file(self.get_skin_file_path(self.image))
+            self.clear_background_cache()
 
             # Save skin name.
             self.save_skin_name()
@@ -296,12 +307,52 @@ class SkinConfig(gobject.GObject):
     def apply_skin(self):
         '''
         Internal function to apply skin.
+
+        If theme changed, pixbufs of new theme are decoded in background,
+        all themes are swapped together when they are ready, then application just redraw once.
+        '''
+        # Drop scaled pixbufs and background surfaces of old theme.
+        scaled_pixbuf_cache.clear()
+        self.clear_background_cache()
+
+        # Newer request drop staging of older request.
+        self.theme_request_id += 1
+
+        change_themes = filter(lambda theme: theme.theme_name != self.theme_name, self.theme_list)
+        if len(change_themes) == 0:
+            self.redraw_skin()
+        else:
+            request_id = self.theme_request_id
+            stagings = {}
+            for theme in change_themes:
+                theme.stage_theme(
+                    self.theme_name,
+                    lambda staging, theme=theme: self.finish_stage_theme(
+                        theme, staging, request_id, stagings, len(change_themes)))
+
+    def finish_stage_theme(self, theme, staging, request_id, stagings, theme_number):
         '''
-        # Change theme.
-        for theme in self.theme_list:
-            if theme.theme_name != self.theme_name:
-                theme.change_theme(self.theme_name)
+        Internal callback when staging of theme is ready.
+        '''
+        if request_id == self.theme_request_id:
+            stagings[theme] = staging
+
+            # Swap all themes at same time, theme that failed to load keep current theme.
+            if len(stagings) == theme_number:
+                for (staging_theme, theme_staging) in stagings.items():
+                    if theme_staging != None:
+                        staging_theme.apply_staging(theme_staging)
 
+                # Drop caches that create with old theme when staging.
+                scaled_pixbuf_cache.clear()
+                self.clear_background_cache()
+
+                self.redraw_skin()
+
+    def redraw_skin(self):
+        '''
+        Internal function to redraw application windows.
+        '''
         # Redraw application.
         for window in self.window_list:
             window.queue_draw()
@@ -388,17 +439,51 @@ class SkinConfig(gobject.GObject):
 
         self.apply_skin()
 
+    def clear_background_cache(self):
+        '''
+        Internal function to clear cache surfaces of background.
+        '''
+        self.background_surface_dict.clear()
+
     def render_background(self, cr, widget, x, y,
                           translate_width=0,
                           translate_height=0):
         '''
         Internal function to render background.
+
+        Background is composed once for each toplevel size, then every expose just blit clip area of cache surface.
         '''
         # Init.
         toplevel_rect = widget.get_toplevel().allocation
         render_width = toplevel_rect.width + translate_width
         render_height = toplevel_rect.height + translate_height
 
+        if render_width <= 0 or render_height <= 0:
+            return
+
+        cache_key = (render_width, render_height, self.skin_name, self.image,
+                     self.x, self.y, self.scale_x, self.scale_y,
+                     self.vertical_mirror, self.horizontal_mirror, self.dominant_color)
+        surface = self.background_surface_dict.pop(cache_key, None)
+        if surface == None:
+            surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, render_width, render_height)
+            surface_cr = gtk.gdk.CairoContext(cairo.Context(surface))
+            self.draw_background(surface_cr, 0, 0, render_width, render_height)
+
+            # Drop background surface that least recently used.
+            if len(self.background_surface_dict) >= self.background_surface_cache_size:
+                self.background_surface_dict.popitem(last=False)
+
+        self.background_surface_dict[cache_key] = surface
+
+        # Blit background surface, cairo just paint clip area.
+        cr.set_source_surface(surface, x, y)
+        cr.paint()
+
+    def draw_background(self, cr, x, y, render_width, render_height):
+        '''
+        Internal function to draw background with dominant color padding.
+        '''
         # Draw background.
         background_x = int(self.x * self.scale_x)
         background_y = int(self.y * self.scale_y)
@@ -510,17 +595,33 @@ class SkinConfig(gobject.GObject):
         else:
             self.app_theme_dir = None
 
-    def load_skin_from_image(self, filepath):
+    def load_skin_from_image(self, filepath, finish_callback=None):
         '''
         Load theme from given image.
 
         @param filepath: The file path of image.
+        @param finish_callback: Callback when skin is loaded, argument is (load_skin_status, skin_dir, skin_image_file).
+        Default is None to load skin synchronously, otherwise dominant color of image is parsed in background thread,
+        and this function return None.
+        @return: Return (load_skin_status, skin_dir, skin_image_file) if finish_callback is None.
+        '''
+        if finish_callback == None:
+            return self.create_skin_from_image(filepath, get_dominant_color(filepath))
+        else:
+            get_dominant_color_async(
+                filepath,
+                lambda dominant_color: finish_callback(*self.create_skin_from_image(filepath, dominant_color)))
+
+    def create_skin_from_image(self, filepath, dominant_color):
+        '''
+        Internal function to create skin from image with dominant color.
         '''
         # Init.
         skin_dir = os.path.join(self.user_skin_dir, str(uuid.uuid4()))
         skin_image_file = os.path.basename(filepath)
         config_file = os.path.join(skin_dir, "config.ini")
-        dominant_color = get_dominant_color(filepath)
+        if dominant_color == None:
+            return (False, skin_dir, skin_image_file)
         similar_color = find_similar_color(dominant_color)[0]
         default_config = [
             ("theme", [("theme_name", similar_color)]),
@@ -596,6 +697,10 @@ class SkinConfig(gobject.GObject):
                 # Remove temp theme directories under skin directory.
                 remove_directory(os.path.join(skin_dir, "ui_theme"))
                 remove_directory(os.path.join(skin_dir, "app_theme"))
+
+                # Drop cached directories, image indexes and atlases that point to old theme files.
+                for theme in self.theme_list:
+                    theme.refresh_index()
             else:
                 # Remove skin directory if version mismatch.
                 remove_directory(skin_dir)
@@ -0,0 +1,232 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2011 ~ 2012 Deepin, Inc.
+#               2011 ~ 2012 Wang Yong
+#
+# Author:     Wang Yong <lazycat.manatee@gmail.com>
+# Maintainer: Wang Yong <lazycat.manatee@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import functools
+import threading as td
+import weakref
+
+__all__ = ["SortEngine", "SortCancelled"]
+
+class SortCancelled(Exception):
+    '''
+    Raise when sort request is replaced by newer request.
+    '''
+
+    pass
+
+class SortThread(td.Thread):
+    '''
+    Thread to run sort action of SortEngine.
+    '''
+
+    def __init__(self, sort_engine, sort_action, finish_callback, request_id):
+        '''
+        Initialize SortThread class.
+
+        @param sort_engine: SortEngine instance.
+        @param sort_action: Sort action, arguments is request id, return sort result.
+        @param finish_callback: Callback when sort finish, arguments is (result, request_id).
+        @param request_id: Request id of sort action.
+        '''
+        td.Thread.__init__(self)
+        self.setDaemon(True)    # make thread exit when main program exit
+
+        self.sort_engine = sort_engine
+        self.sort_action = sort_action
+        self.finish_callback = finish_callback
+        self.request_id = request_id
+
+    def run(self):
+        try:
+            result = self.sort_action(self.request_id)
+        except SortCancelled:
+            return
+
+        if not self.sort_engine.is_cancelled(self.request_id):
+            self.finish_callback(result, self.request_id)
+
+class SortEngine(object):
+    '''
+    Background sort engine for ListView and TreeView.
+
+    Every sort request run in background thread, newer request cancel older request,
+    sort action check cancel status between chunks, and old result is dropped.
+
+    Sort keys are cached per key function, then sort same column again don't need compute keys.
+    Finish callback is called in sort thread, view should swap order in GUI thread,
+    and check L{ I{is_cancelled} <SortEngine.is_cancelled>} again before swap.
+    '''
+
+    MISSING_KEY = object()
+
+    def __init__(self, chunk_size=1000):
+        '''
+        Initialize SortEngine class.
+
+        @param chunk_size: The number of items that process before check cancel status, default is 1000.
+        '''
+        self.chunk_size = chunk_size
+        self.request_id = 0
+        self.key_cache = {}
+        self.key_generation = 0
+        self.lock = td.Lock()
+
+    def start(self, sort_action, finish_callback):
+        '''
+        Start sort action in background thread, and cancel running sort action.
+
+        @param sort_action: Sort action, arguments is request id, return sort result.
+        @param finish_callback: Callback when sort finish, arguments is (result, request_id), it is called in sort thread.
+        @return: Return request id.
+        '''
+        with self.lock:
+            self.request_id += 1
+            request_id = self.request_id
+
+        SortThread(self, sort_action, finish_callback, request_id).start()
+
+        return request_id
+
+    def cancel(self):
+        '''
+        Cancel running sort action.
+        '''
+        with self.lock:
+            self.request_id += 1
+
+    def is_cancelled(self, request_id):
+        '''
+        Whether sort request is cancelled.
+
+        @param request_id: Request id that return by function L{ I{start} <SortEngine.start>}.
+        @return: Return True if newer request has started or request is cancelled.
+        '''
+        return request_id != self.request_id
+
+    def check_cancelled(self, request_id):
+        '''
+        Raise SortCancelled if sort request is cancelled.
+
+        @param request_id: Request id, None means request can't cancel.
+        '''
+        if request_id != None and self.is_cancelled(request_id):
+            raise SortCancelled
+
+    def get_keys(self, items, key_func, request_id=None):
+        '''
+        Get sort keys of items, keys are computed in chunks and cached.
+
+        @param items: Items to get keys.
+        @param key_func: Key function, argument is item.
+        @param request_id: Request id to check cancel status, default is None.
+        @return: Return key list, same order as items.
+        '''
+        with self.lock:
+            if not key_func in self.key_cache:
+                self.key_cache[key_func] = weakref.WeakKeyDictionary()
+            cache_dict = self.key_cache[key_func]
+
+        keys = []
+        for chunk_start in xrange(0, len(items), self.chunk_size):
+            self.check_cancelled(request_id)
+
+            chunk_items = items[chunk_start:chunk_start + self.chunk_size]
+
+            # Just hold lock when read cache, GUI thread can clear keys when key function running.
+            with self.lock:
+                key_generation = self.key_generation
+                chunk_keys = map(lambda item: self.get_cache_key(cache_dict, item), chunk_items)
+
+            new_keys = []
+            for (index, item) in enumerate(chunk_items):
+                if chunk_keys[index] is self.MISSING_KEY:
+                    chunk_keys[index] = key_func(item)
+                    new_keys.append((item, chunk_keys[index]))
+
+            with self.lock:
+                # Don't cache keys that maybe computed before items changed.
+                if key_generation == self.key_generation:
+                    for (item, key) in new_keys:
+                        try:
+                            cache_dict[item] = key
+                        except TypeError:
+                            # Item not support weak reference, don't cache key.
+                            pass
+
+            keys += chunk_keys
+
+        return keys
+
+    def get_cache_key(self, cache_dict, item):
+        '''
+        Internal function to get cached key of item, it must call with lock.
+        '''
+        try:
+            return cache_dict.get(item, self.MISSING_KEY)
+        except TypeError:
+            # Item not support weak reference.
+            return self.MISSING_KEY
+
+    def sort_items(self, items, sort_columns, request_id=None):
+        '''
+        Stable sort items with multiple columns.
+
+        @param items: Items to sort.
+        @param sort_columns: Sort column list, primary column at first, format as [(key_func, cmp_func, reverse)], cmp_func can be None.
+        @param request_id: Request id to check cancel status, default is None.
+        @return: Return sorted item list.
+        '''
+        order = range(len(items))
+
+        # Sort from last column to primary column, stable sort keep order of previous pass.
+        for (key_func, cmp_func, reverse) in reversed(sort_columns):
+            keys = self.get_keys(items, key_func, request_id)
+            self.check_cancelled(request_id)
+
+            if cmp_func == None:
+                order.sort(key=keys.__getitem__, reverse=reverse)
+            else:
+                compare_key = functools.cmp_to_key(cmp_func)
+                order.sort(key=lambda index: compare_key(keys[index]), reverse=reverse)
+
+        self.check_cancelled(request_id)
+
+        return map(items.__getitem__, order)
+
+    def clear_keys(self, items=None):
+        '''
+        Clear cached sort keys.
+
+        @param items: Clear keys of given items, clear all keys if items is None.
+        '''
+        with self.lock:
+            self.key_generation += 1
+
+            if items == None:
+                self.key_cache.clear()
+            else:
+                for cache_dict in self.key_cache.values():
+                    for item in items:
+                        try:
+                            cache_dict.pop(item, None)
+                        except TypeError:
+                            pass
@@ -0,0 +1,198 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2011 ~ 2012 Deepin, Inc.
+#               2011 ~ 2012 Wang Yong
+#
+# Author:     Wang Yong <lazycat.manatee@gmail.com>
+# Maintainer: Wang Yong <lazycat.manatee@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from constant import DEFAULT_FONT, DEFAULT_FONT_SIZE
+import cairo
+import collections
+import pango
+import pangocairo
+import threading as td
+
+__all__ = ["TextMetrics", "text_metrics", "get_font_description"]
+
+font_description_dict = {}
+font_description_lock = td.Lock()
+
+def get_font_description(text_font=DEFAULT_FONT, text_size=DEFAULT_FONT_SIZE):
+    '''
+    Get font description with given font and size, font description just parse once.
+
+    @param text_font: Text font, default is DEFAULT_FONT.
+    @param text_size: Text size, default is DEFAULT_FONT_SIZE.
+    @return: Return pango.FontDescription instance.
+    '''
+    font_key = (text_font, text_size)
+    font_description = font_description_dict.get(font_key)
+    if font_description == None:
+        with font_description_lock:
+            font_description = pango.FontDescription("%s %s" % (text_font, text_size))
+            font_description_dict[font_key] = font_description
+
+    return font_description
+
+class TextMetrics(object):
+    '''
+    Process-wide text measure cache.
+
+    TextMetrics measure text with one shared pango layout and remember size of text in LRU cache,
+    it also cache layouts for function `render_text`, then unchanged cell don't need layout text again.
+    '''
+
+    def __init__(self, size_cache_size=4096, layout_cache_size=512):
+        '''
+        Initialize TextMetrics class.
+
+        @param size_cache_size: The max number of text sizes in cache, default is 4096.
+        @param layout_cache_size: The max number of render layouts in cache, default is 512.
+        '''
+        self.size_cache_size = size_cache_size
+        self.layout_cache_size = layout_cache_size
+        self.size_cache = collections.OrderedDict()
+        self.layout_cache = collections.OrderedDict()
+        self.lock = td.Lock()
+        self.measure_layout = None
+
+        self.size_hits = 0
+        self.size_misses = 0
+        self.layout_hits = 0
+        self.layout_misses = 0
+
+    def get_measure_layout(self):
+        '''
+        Internal function to get shared layout to measure text.
+        '''
+        if self.measure_layout == None:
+            surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, 0, 0) # don't need give size
+            context = pangocairo.CairoContext(cairo.Context(surface))
+            self.measure_layout = context.create_layout()
+
+        return self.measure_layout
+
+    def get_size(self, text, text_size=DEFAULT_FONT_SIZE, text_font=DEFAULT_FONT, wrap_width=None):
+        '''
+        Get text size, in pixel.
+
+        @param text: String or markup string.
+        @param text_size: Text size, in pixel.
+        @param text_font: Text font.
+        @param wrap_width: The width of wrap rule, default don't wrap.
+        @return: Return text size as (text_width, text_height).
+        '''
+        size_key = (text, text_font, text_size, wrap_width)
+        with self.lock:
+            text_size_info = self.size_cache.pop(size_key, None)
+            if text_size_info == None:
+                self.size_misses += 1
+
+                layout = self.get_measure_layout()
+                layout.set_font_description(get_font_description(text_font, text_size))
+                layout.set_markup(text)
+                if wrap_width == None:
+                    layout.set_width(-1)
+                    layout.set_single_paragraph_mode(True)
+                else:
+                    layout.set_width(wrap_width * pango.SCALE)
+                    layout.set_single_paragraph_mode(False)
+                    layout.set_wrap(pango.WRAP_WORD)
+
+                text_size_info = layout.get_pixel_size()
+
+                if len(self.size_cache) >= self.size_cache_size:
+                    self.size_cache.popitem(last=False)
+            else:
+                self.size_hits += 1
+
+            # Insert at end of cache, make it most recently used.
+            self.size_cache[size_key] = text_size_info
+
+        return text_size_info
+
+    def get_layout(self, cr, markup, text_size, text_font, alignment, width, wrap_width, ellipsize):
+        '''
+        Get layout to render text, layout is reused when cell render same text with same attributes.
+
+        @param cr: Cairo context that layout will render on.
+        @param markup: Pango markup string.
+        @param text_size: Text size.
+        @param text_font: Text font.
+        @param alignment: Font alignment option.
+        @param width: Width of draw area.
+        @param wrap_width: Wrap width of text, None means don't wrap.
+        @param ellipsize: Ellipsize style of text.
+        @return: Return (context, layout), context is pangocairo.CairoContext of cr, call context.update_layout(layout) before show layout.
+        '''
+        context = pangocairo.CairoContext(cr)
+        layout_key = (markup, text_font, text_size, alignment, width, wrap_width, ellipsize)
+        with self.lock:
+            layout = self.layout_cache.pop(layout_key, None)
+            if layout == None:
+                self.layout_misses += 1
+
+                layout = context.create_layout()
+                layout.set_font_description(get_font_description(text_font, text_size))
+                layout.set_markup(markup)
+                layout.set_alignment(alignment)
+                if wrap_width == None:
+                    layout.set_single_paragraph_mode(True)
+                    layout.set_width(width * pango.SCALE)
+                    layout.set_ellipsize(ellipsize)
+                else:
+                    layout.set_width(wrap_width * pango.SCALE)
+                    layout.set_wrap(pango.WRAP_WORD)
+
+                if len(self.layout_cache) >= self.layout_cache_size:
+                    self.layout_cache.popitem(last=False)
+            else:
+                self.layout_hits += 1
+
+            self.layout_cache[layout_key] = layout
+
+        return (context, layout)
+
+    def get_stats(self):
+        '''
+        Get cache statistics.
+
+        @return: Return dict with hit and miss counters of size cache and layout cache.
+        '''
+        return {
+            "size_hits" : self.size_hits,
+            "size_misses" : self.size_misses,
+            "size_cache_length" : len(self.size_cache),
+            "layout_hits" : self.layout_hits,
+            "layout_misses" : self.layout_misses,
+            "layout_cache_length" : len(self.layout_cache),
+            }
+
+    def clear(self):
+        '''
+        Clear cache, call it when system font changed.
+        '''
+        with self.lock:
+            self.size_cache.clear()
+            self.layout_cache.clear()
+            self.measure_layout = None
+
+        with font_description_lock:
+            font_description_dict.clear()
+
+text_metrics = TextMetrics()
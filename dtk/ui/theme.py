@@ -21,9 +21,100 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 from skin_config import skin_config
-from deepin_utils.file import create_directory, eval_file, get_parent_dir
+from theme_atlas import get_theme_image_index, load_theme_atlas
+from threads import post_gui
+from file_cache import get_cache_home, write_cache_file
+from utils import color_hex_to_cairo, alpha_color_hex_to_cairo, register_cairo_colors
+from deepin_utils.file import create_directory, get_parent_dir
+import ast
 import gtk
+import hashlib
+import marshal
 import os
+import Queue as Q
+import threading as td
+
+STAGING_WORKER_NUM = 4
+THEME_INFO_CACHE_VERSION = 1
+THEME_INFO_KEYS = ["colors", "alpha_colors", "shadow_colors"]
+
+theme_info_dict = {}
+
+def parse_theme_info(filepath):
+    '''
+    Parse theme.txt with strict literal parser, theme file can't run any code.
+
+    @param filepath: Filepath of theme.txt.
+    @return: Return theme info dict.
+    '''
+    with open(filepath, "r") as theme_file:
+        theme_info = ast.literal_eval(theme_file.read())
+
+    if not isinstance(theme_info, dict) or not all(map(lambda key: isinstance(theme_info.get(key), dict), THEME_INFO_KEYS)):
+        raise ValueError("%s is not valid theme file" % filepath)
+
+    return theme_info
+
+def compile_theme_info(theme_info):
+    '''
+    Convert colors of theme info to cairo colors.
+
+    @param theme_info: Theme info dict.
+    @return: Return dict with same structure as theme info, colors are converted to cairo colors.
+    '''
+    return {
+        "colors" : dict(map(lambda (name, color): (name, color_hex_to_cairo(color)),
+                            theme_info["colors"].items())),
+        "alpha_colors" : dict(map(lambda (name, color_info): (name, alpha_color_hex_to_cairo(color_info)),
+                                  theme_info["alpha_colors"].items())),
+        "shadow_colors" : dict(map(lambda (name, color_info): (name, map(lambda (pos, color): (pos, alpha_color_hex_to_cairo(color)),
+                                                                         color_info)),
+                                   theme_info["shadow_colors"].items())),
+        }
+
+def load_theme_info(filepath):
+    '''
+    Load theme info and cairo colors of theme.txt.
+
+    Result is cached in memory and in ~/.cache/deepin-ui/theme-info, keyed by modification time of theme file,
+    then theme.txt just parse again when it changed.
+
+    @param filepath: Filepath of theme.txt.
+    @return: Return (theme_info, cairo_info), cairo_info is result of function L{ I{compile_theme_info} <compile_theme_info>}.
+    '''
+    file_stat = os.stat(filepath)
+    file_key = (file_stat.st_mtime, file_stat.st_size)
+    cache_info = theme_info_dict.get(filepath)
+    if cache_info != None and cache_info[0] == file_key:
+        return cache_info[1]
+
+    cache_path = os.path.join(get_cache_home(), "deepin-ui", "theme-info",
+                              "%s.cache" % hashlib.md5(os.path.abspath(filepath)).hexdigest())
+    result = None
+    if os.path.exists(cache_path):
+        try:
+            with open(cache_path, "rb") as cache_file:
+                (version, cache_filepath, cache_file_key, theme_info, cairo_info) = marshal.load(cache_file)
+            if (version, cache_filepath, cache_file_key) == (THEME_INFO_CACHE_VERSION, filepath, file_key):
+                result = (theme_info, cairo_info)
+        except Exception, e:
+            print "load_theme_info: load %s got error: %s" % (cache_path, e)
+
+    if result == None:
+        theme_info = parse_theme_info(filepath)
+        cairo_info = compile_theme_info(theme_info)
+        result = (theme_info, cairo_info)
+
+        cache_data = (THEME_INFO_CACHE_VERSION, filepath, file_key, theme_info, cairo_info)
+        def write_cache(temp_filepath):
+            with open(temp_filepath, "wb") as cache_file:
+                marshal.dump(cache_data, cache_file)
+
+        write_cache_file(cache_path, write_cache)
+
+    theme_info_dict[filepath] = (file_key, result)
+
+    return result
 
 class DynamicColor(object):
     '''
@@ -38,13 +129,15 @@ class DynamicColor(object):
         '''
         self.update(color)
 
-    def update(self, color):
+    def update(self, color, cairo_color=None):
         '''
         Update color.
 
         @param color: Color value.
+        @param cairo_color: Cairo color of color value, default is None to convert when it's used.
         '''
         self.color = color
+        self.cairo_color = cairo_color
 
     def get_color(self):
         '''
@@ -54,6 +147,17 @@ class DynamicColor(object):
         '''
         return self.color
 
+    def get_cairo_color(self):
+        '''
+        Get cairo color.
+
+        @return: Return current color as (red, green, blue).
+        '''
+        if self.cairo_color == None:
+            self.cairo_color = color_hex_to_cairo(self.color)
+
+        return self.cairo_color
+
 class DynamicAlphaColor(object):
     '''
     Dynamic alpha color.
@@ -67,11 +171,15 @@ class DynamicAlphaColor(object):
         '''
         self.update(color_info)
 
-    def update(self, color_info):
+    def update(self, color_info, cairo_color=None):
         '''
         Update color_info with given value.
+
+        @param color_info: Color information, format as (hex_color, alpha)
+        @param cairo_color: Cairo color of color information, default is None to convert when it's used.
         '''
         (self.color, self.alpha) = color_info
+        self.cairo_color = cairo_color
 
     def get_color_info(self):
         '''
@@ -97,6 +205,17 @@ class DynamicAlphaColor(object):
         '''
         return self.alpha
 
+    def get_cairo_color(self):
+        '''
+        Get cairo color.
+
+        @return: Return current color as (red, green, blue, alpha).
+        '''
+        if self.cairo_color == None:
+            self.cairo_color = alpha_color_hex_to_cairo((self.color, self.alpha))
+
+        return self.cairo_color
+
 class DynamicShadowColor(object):
     '''
     Dynamic shadow color.
@@ -114,7 +233,7 @@ class DynamicShadowColor(object):
         '''
         self.update(color_info)
 
-    def update(self, color_info):
+    def update(self, color_info, cairo_color_info=None):
         '''
         Update color with given value.
 
@@ -123,8 +242,11 @@ class DynamicShadowColor(object):
         >>> [(color_position_1, (hex_color_1, color_alpha_1),
         >>>  (color_position_2, (hex_color_2, color_alpha_2),
         >>>  (color_position_3, (hex_color_3, color_alpha_3)]
+
+        @param cairo_color_info: Cairo color information, default is None to convert when it's used.
         '''
         self.color_info = color_info
+        self.cairo_color_info = cairo_color_info
 
     def get_color_info(self):
         '''
@@ -138,26 +260,42 @@ class DynamicShadowColor(object):
         '''
         return self.color_info
 
+    def get_cairo_color_info(self):
+        '''
+        Get cairo color information.
+
+        @return: Return color information, format as [(color_position, (red, green, blue, alpha))]
+        '''
+        if self.cairo_color_info == None:
+            self.cairo_color_info = map(lambda (pos, color): (pos, alpha_color_hex_to_cairo(color)), self.color_info)
+
+        return self.cairo_color_info
+
 class DynamicPixbuf(object):
     '''
     Dynamic pixbuf.
     '''
 
-    def __init__(self, filepath):
+    def __init__(self, filepath, pixbuf=None):
         '''
         Initialize DynamicPixbuf class.
 
         @param filepath: Dynamic pixbuf filepath.
+        @param pixbuf: Decoded pixbuf of filepath, default is None to decode file.
         '''
-        self.update(filepath)
+        self.update(filepath, pixbuf)
 
-    def update(self, filepath):
+    def update(self, filepath, pixbuf=None):
         '''
         Update filepath with given value.
 
         @param filepath: Dynamic pixbuf filepath.
+        @param pixbuf: Decoded pixbuf of filepath, default is None to decode file.
         '''
-        self.pixbuf = gtk.gdk.pixbuf_new_from_file(filepath)
+        if pixbuf == None:
+            self.pixbuf = gtk.gdk.pixbuf_new_from_file(filepath)
+        else:
+            self.pixbuf = pixbuf
 
     def get_pixbuf(self):
         '''
@@ -169,7 +307,21 @@ class Theme(object):
     '''
     Theme.
 
+    Theme directory and image files are indexed once per theme, then get pixbuf don't need scan theme directories.
+    If theme have atlas (build with dtk/ui/theme_atlas.py), pixbufs are sliced from memory mapped atlas instead of decode PNG files.
+
     @undocumented: get_ticker
+    @undocumented: get_theme_dir
+    @undocumented: get_image_index
+    @undocumented: get_atlas
+    @undocumented: load_pixbuf
+    @undocumented: prefetch_loop
+    @undocumented: finish_prefetch
+    @undocumented: stage_loop
+    @undocumented: load_staging
+    @undocumented: decode_loop
+    @undocumented: finish_stage_theme
+    @undocumented: update_colors
     '''
 
     def __init__(self,
@@ -190,6 +342,10 @@ class Theme(object):
         self.color_dict = {}
         self.alpha_color_dict = {}
         self.shadow_color_dict = {}
+        self.theme_dir_dict = {}
+        self.image_index_dict = {}
+        self.atlas_dict = {}
+        self.atlas_enable = True
 
         # Create directory if necessarily.
         for theme_dir in [self.system_theme_dir, self.user_theme_dir]:
@@ -202,11 +358,11 @@ class Theme(object):
         self.theme_name = skin_config.theme_name
 
         # Scan dynamic theme_info file.
-        theme_info = eval_file(self.get_theme_file_path(self.theme_info_file))
+        (theme_info, cairo_info) = load_theme_info(self.get_theme_file_path(self.theme_info_file))
 
         # Init dynamic colors.
-        for (color_name, color) in theme_info["colors"].items():
-            self.color_dict[color_name] = DynamicColor(color)
+        for color_name in theme_info["colors"]:
+            self.color_dict[color_name] = DynamicColor(None)
 
         # Init dynamic alpha colors.
         for (color_name, color_info) in theme_info["alpha_colors"].items():
@@ -216,27 +372,140 @@ class Theme(object):
         for (color_name, color_info) in theme_info["shadow_colors"].items():
             self.shadow_color_dict[color_name] = DynamicShadowColor(color_info)
 
+        self.update_colors(theme_info, cairo_info)
+
         # Add in theme list of skin_config.
         skin_config.add_theme(self)
 
-    def get_theme_file_path(self, filename):
+    def get_theme_dir(self, theme_name):
+        '''
+        Internal function to get directory that contain given theme, result is cached.
+        '''
+        theme_file_dir = self.theme_dir_dict.get(theme_name)
+        if theme_file_dir == None:
+            # Scan theme directories again, theme maybe add after last scan.
+            for theme_dir in [self.system_theme_dir, self.user_theme_dir]:
+                if os.path.exists(theme_dir):
+                    for name in os.listdir(os.path.expanduser(theme_dir)):
+                        if not name in self.theme_dir_dict:
+                            self.theme_dir_dict[name] = theme_dir
+
+            theme_file_dir = self.theme_dir_dict.get(theme_name)
+
+        return theme_file_dir
+
+    def get_theme_file_path(self, filename, theme_name=None):
         '''
         Get theme file path with given theme name.
 
+        @param filename: File relative path to theme.
+        @param theme_name: Theme name, default is None to use current theme.
         @return: Return filepath of theme.
         '''
-        theme_file_dir = None
-        for theme_dir in [self.system_theme_dir, self.user_theme_dir]:
-            if os.path.exists(theme_dir):
-                if self.theme_name in os.listdir(os.path.expanduser(theme_dir)):
-                    theme_file_dir = theme_dir
-                    break
+        if theme_name == None:
+            theme_name = self.theme_name
 
+        theme_file_dir = self.get_theme_dir(theme_name)
         if theme_file_dir:
-            return os.path.join(theme_file_dir, self.theme_name, filename)
+            return os.path.join(theme_file_dir, theme_name, filename)
         else:
             return None
 
+    def get_image_index(self, theme_name):
+        '''
+        Internal function to get image index of theme, index is built once.
+        '''
+        if not theme_name in self.image_index_dict:
+            theme_file_dir = self.get_theme_dir(theme_name)
+            if theme_file_dir:
+                self.image_index_dict[theme_name] = get_theme_image_index(os.path.join(theme_file_dir, theme_name))
+            else:
+                return {}
+
+        return self.image_index_dict[theme_name]
+
+    def get_atlas(self, theme_name):
+        '''
+        Internal function to get atlas of theme, return None if theme don't have atlas.
+        '''
+        if not self.atlas_enable:
+            return None
+
+        if not theme_name in self.atlas_dict:
+            theme_file_dir = self.get_theme_dir(theme_name)
+            if theme_file_dir:
+                self.atlas_dict[theme_name] = load_theme_atlas(os.path.join(theme_file_dir, theme_name))
+            else:
+                return None
+
+        return self.atlas_dict[theme_name]
+
+    def set_atlas_enable(self, enable):
+        '''
+        Enable or disable load pixbuf from theme atlas, atlas is enable default if theme have atlas.
+
+        @param enable: Set as False to always decode image files.
+        '''
+        self.atlas_enable = enable
+
+        if not enable:
+            for atlas in self.atlas_dict.values():
+                if atlas:
+                    atlas.close()
+            self.atlas_dict = {}
+
+    def refresh_index(self):
+        '''
+        Drop index of theme directories and images, call it after theme files changed.
+        '''
+        self.theme_dir_dict = {}
+        self.image_index_dict = {}
+
+        for atlas in self.atlas_dict.values():
+            if atlas:
+                atlas.close()
+        self.atlas_dict = {}
+
+    def get_image_path(self, path, theme_name=None):
+        '''
+        Get image filepath with given relative path.
+
+        @param path: Image relative filepath to theme.
+        @param theme_name: Theme name, default is None to use current theme.
+        @return: Return image filepath.
+        '''
+        if theme_name == None:
+            theme_name = self.theme_name
+
+        filepath = self.get_image_index(theme_name).get(path)
+        if filepath == None:
+            filepath = self.get_theme_file_path("image/%s" % (path), theme_name)
+
+        return filepath
+
+    def get_image_paths(self):
+        '''
+        Get relative paths of all images in current theme.
+
+        @return: Return relative path list, it can pass to function L{ I{prefetch} <Theme.prefetch>}.
+        '''
+        return self.get_image_index(self.theme_name).keys()
+
+    def load_pixbuf(self, path, theme_name=None):
+        '''
+        Internal function to load pixbuf, slice pixbuf from atlas if possible.
+        '''
+        if theme_name == None:
+            theme_name = self.theme_name
+
+        atlas = self.get_atlas(theme_name)
+        if atlas:
+            pixbuf = atlas.get_pixbuf(path)
+            if pixbuf:
+                return pixbuf
+
+        return gtk.gdk.pixbuf_new_from_file(self.get_image_path(path, theme_name))
+
     def get_pixbuf(self, path):
         '''
         Get pixbuf with given relative path.
@@ -247,10 +516,65 @@ class Theme(object):
         '''
         # Just init pixbuf_dict when first load some pixbuf.
         if not self.pixbuf_dict.has_key(path):
-            self.pixbuf_dict[path] = DynamicPixbuf(self.get_theme_file_path("image/%s" % (path)))
+            self.pixbuf_dict[path] = DynamicPixbuf(self.get_image_path(path), self.load_pixbuf(path))
 
         return self.pixbuf_dict[path]
 
+    def prefetch(self, paths, finish_callback=None):
+        '''
+        Decode pixbufs in background thread, then widgets don't decode them when first draw.
+
+        Prefetch is opt-in, application can pass images that its main window use,
+        or pass L{ I{get_image_paths} <Theme.get_image_paths>} to prefetch all images.
+
+        @param paths: Image relative paths to prefetch.
+        @param finish_callback: Callback when prefetch finish, default is None, callback is called in GUI thread.
+        '''
+        paths = filter(lambda path: not path in self.pixbuf_dict, set(paths))
+        theme_name = self.theme_name
+        image_paths = map(lambda path: self.get_image_path(path, theme_name), paths)
+        atlas = self.get_atlas(theme_name)
+
+        thread = td.Thread(target=self.prefetch_loop,
+                           args=(zip(paths, image_paths), atlas, self.ticker, finish_callback))
+        thread.setDaemon(True)  # make thread exit when main program exit
+        thread.start()
+
+    def prefetch_loop(self, path_infos, atlas, ticker, finish_callback):
+        '''
+        Internal function to decode pixbufs in background thread.
+        '''
+        pixbufs = []
+        for (path, image_path) in path_infos:
+            try:
+                pixbuf = None
+                if atlas:
+                    pixbuf = atlas.get_pixbuf(path)
+
+                if pixbuf == None:
+                    pixbuf = gtk.gdk.pixbuf_new_from_file(image_path)
+            except Exception, e:
+                print "Theme.prefetch: load %s got error: %s" % (image_path, e)
+                continue
+
+            pixbufs.append((path, image_path, pixbuf))
+
+        self.finish_prefetch(pixbufs, ticker, finish_callback)
+
+    @post_gui
+    def finish_prefetch(self, pixbufs, ticker, finish_callback):
+        '''
+        Internal function to add prefetched pixbufs in GUI thread.
+        '''
+        # Drop pixbufs that decode before theme changed.
+        if ticker == self.ticker:
+            for (path, image_path, pixbuf) in pixbufs:
+                if not path in self.pixbuf_dict:
+                    self.pixbuf_dict[path] = DynamicPixbuf(image_path, pixbuf)
+
+        if finish_callback:
+            finish_callback()
+
     def get_color(self, color_name):
         '''
         Get color with given dynamic color.
@@ -289,33 +613,156 @@ class Theme(object):
 
     def change_theme(self, new_theme_name):
         '''
-        Change theme with given new theme name.
+        Change theme with given new theme name, pixbufs are decoded in current thread.
+
+        Use L{ I{stage_theme} <Theme.stage_theme>} to decode pixbufs in background.
+
+        @param new_theme_name: New theme name.
+        '''
+        self.apply_staging(self.load_staging(new_theme_name,
+                                             self.pixbuf_dict.keys(),
+                                             self.get_theme_file_path("", new_theme_name),
+                                             self.get_atlas(new_theme_name)))
+
+    def stage_theme(self, new_theme_name, finish_callback):
+        '''
+        Decode pixbufs and read colors of new theme in background threads, current theme don't change.
+
+        Pass staging to L{ I{apply_staging} <Theme.apply_staging>} in finish callback to swap theme.
 
         @param new_theme_name: New theme name.
+        @param finish_callback: Callback when staging is ready, argument is staging, or None if new theme can't load, callback is called in GUI thread.
+        '''
+        thread = td.Thread(target=self.stage_loop,
+                           args=(new_theme_name,
+                                 self.pixbuf_dict.keys(),
+                                 self.get_theme_file_path("", new_theme_name),
+                                 self.get_atlas(new_theme_name),
+                                 finish_callback))
+        thread.setDaemon(True)  # make thread exit when main program exit
+        thread.start()
+
+    def stage_loop(self, theme_name, paths, theme_path, atlas, finish_callback):
+        '''
+        Internal function to load staging in background thread.
+        '''
+        try:
+            staging = self.load_staging(theme_name, paths, theme_path, atlas)
+        except Exception, e:
+            print "Theme.stage_theme: load theme %s got error: %s" % (theme_name, e)
+            staging = None
+
+        # Always call finish callback, caller wait all themes before redraw.
+        self.finish_stage_theme(staging, finish_callback)
+
+    @post_gui
+    def finish_stage_theme(self, staging, finish_callback):
+        finish_callback(staging)
+
+    def load_staging(self, theme_name, paths, theme_path, atlas):
+        '''
+        Internal function to decode pixbufs and read colors of theme, it don't change any attribute of theme.
+        '''
+        image_index = get_theme_image_index(theme_path)
+        path_queue = Q.Queue()
+        for path in paths:
+            path_queue.put((path, image_index.get(path, os.path.join(theme_path, "image", path))))
+
+        # Decode pixbufs with worker threads.
+        pixbufs = {}
+        workers = []
+        for index in range(min(STAGING_WORKER_NUM, len(paths))):
+            worker = td.Thread(target=self.decode_loop, args=(path_queue, atlas, pixbufs))
+            worker.setDaemon(True)
+            worker.start()
+            workers.append(worker)
+
+        for worker in workers:
+            worker.join()
+
+        return {
+            "theme_name" : theme_name,
+            "image_index" : image_index,
+            "pixbufs" : pixbufs,
+            "theme_info" : load_theme_info(os.path.join(theme_path, self.theme_info_file)),
+            }
+
+    def decode_loop(self, path_queue, atlas, pixbufs):
+        '''
+        Internal function to decode pixbufs in worker thread.
+        '''
+        while True:
+            try:
+                (path, image_path) = path_queue.get_nowait()
+            except Q.Empty:
+                break
+
+            try:
+                pixbuf = None
+                if atlas:
+                    pixbuf = atlas.get_pixbuf(path)
+
+                if pixbuf == None:
+                    pixbuf = gtk.gdk.pixbuf_new_from_file(image_path)
+            except Exception, e:
+                print "Theme.stage_theme: load %s got error: %s" % (image_path, e)
+                continue
+
+            # Dict assignment is atomic, don't need lock.
+            pixbufs[path] = (image_path, pixbuf)
+
+    def apply_staging(self, staging):
+        '''
+        Swap theme with staging of L{ I{stage_theme} <Theme.stage_theme>}, it must call in GUI thread.
+
+        Ticker is updated once, widgets compare ticker to drop their cache.
+
+        @param staging: Staging that receive from finish callback of L{ I{stage_theme} <Theme.stage_theme>}.
         '''
         # Update ticker.
         self.ticker += 1
 
         # Change theme name.
-        self.theme_name = new_theme_name
+        self.theme_name = staging["theme_name"]
+        self.image_index_dict[self.theme_name] = staging["image_index"]
 
-        # Update dynamic pixbuf.
+        # Update dynamic pixbuf, pixbuf that request after staging start is loaded here.
+        pixbufs = staging["pixbufs"]
         for (path, pixbuf) in self.pixbuf_dict.items():
-            pixbuf.update(self.get_theme_file_path("image/%s" % (path)))
+            if path in pixbufs:
+                pixbuf.update(*pixbufs[path])
+            else:
+                try:
+                    pixbuf.update(self.get_image_path(path), self.load_pixbuf(path))
+                except Exception, e:
+                    print "Theme.apply_staging: load %s got error: %s" % (path, e)
 
-        # Update dynamic colors.
-        theme_info = eval_file(self.get_theme_file_path(self.theme_info_file))
+        self.update_colors(*staging["theme_info"])
+
+    def update_colors(self, theme_info, cairo_info):
+        cairo_colors = {}
 
+        # Update dynamic colors.
         for (color_name, color) in theme_info["colors"].items():
-            self.color_dict[color_name].update(color)
+            cairo_color = tuple(cairo_info["colors"][color_name])
+            self.color_dict[color_name].update(color, cairo_color)
+            cairo_colors[color] = cairo_color
 
         # Update dynamic alpha colors.
         for (color_name, color_info) in theme_info["alpha_colors"].items():
-            self.alpha_color_dict[color_name].update(color_info)
+            cairo_color = tuple(cairo_info["alpha_colors"][color_name])
+            self.alpha_color_dict[color_name].update(color_info, cairo_color)
+            cairo_colors[color_info[0]] = cairo_color[0:3]
 
         # Update shadow colors.
         for (color_name, color_info) in theme_info["shadow_colors"].items():
-            self.shadow_color_dict[color_name].update(color_info)
+            cairo_color_info = map(lambda (pos, color): (pos, tuple(color)), cairo_info["shadow_colors"][color_name])
+            self.shadow_color_dict[color_name].update(color_info, cairo_color_info)
+            for ((pos, (color, alpha)), (cairo_pos, cairo_color)) in zip(color_info, cairo_color_info):
+                cairo_colors[color] = cairo_color[0:3]
+
+        # Color of theme don't need parse again when widgets draw.
+        register_cairo_colors(cairo_colors)
 
 # Init.
 ui_theme = Theme(os.path.join(get_parent_dir(__file__, 2), "theme"),
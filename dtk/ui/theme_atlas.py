@@ -0,0 +1,187 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2011 ~ 2012 Deepin, Inc.
+#               2011 ~ 2012 Wang Yong
+#
+# Author:     Wang Yong <lazycat.manatee@gmail.com>
+# Maintainer: Wang Yong <lazycat.manatee@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Build atlas of theme images:
+#
+#     python theme_atlas.py theme_dir/theme_name [theme_dir/theme_name ...]
+
+import gtk
+import marshal
+import mmap
+import os
+import struct
+import sys
+
+__all__ = ["ThemeAtlas", "build_theme_atlas", "load_theme_atlas", "get_theme_image_index"]
+
+ATLAS_FILENAME = "image.atlas"
+ATLAS_MAGIC = "DTKATLAS1\n"
+ATLAS_HEADER_FORMAT = "<I"
+
+def get_theme_image_index(theme_path):
+    '''
+    Get image index of theme, walk image directory once.
+
+    @param theme_path: Theme path, such as theme_dir/theme_name.
+    @return: Return dict that map relative image path to image filepath.
+    '''
+    image_dir = os.path.join(theme_path, "image")
+    image_index = {}
+    for (root, dirs, files) in os.walk(image_dir):
+        for filename in files:
+            filepath = os.path.join(root, filename)
+            image_index[os.path.relpath(filepath, image_dir)] = filepath
+
+    return image_index
+
+def build_theme_atlas(theme_path):
+    '''
+    Pack decoded pixels of all theme images into atlas file, atlas is saved as theme_path/image.atlas.
+
+    Atlas need build again after theme images changed.
+
+    @param theme_path: Theme path, such as theme_dir/theme_name.
+    @return: Return atlas filepath.
+    '''
+    entries = {}
+    pixel_list = []
+    offset = 0
+    for (path, filepath) in sorted(get_theme_image_index(theme_path).items()):
+        try:
+            pixbuf = gtk.gdk.pixbuf_new_from_file(filepath)
+        except Exception, e:
+            print "build_theme_atlas: skip %s: %s" % (filepath, e)
+            continue
+
+        pixels = pixbuf.get_pixels()
+        entries[path] = (offset,
+                         len(pixels),
+                         pixbuf.get_width(),
+                         pixbuf.get_height(),
+                         pixbuf.get_rowstride(),
+                         pixbuf.get_has_alpha(),
+                         )
+        pixel_list.append(pixels)
+        offset += len(pixels)
+
+    atlas_path = os.path.join(theme_path, ATLAS_FILENAME)
+    index_data = marshal.dumps(entries)
+    temp_path = "%s.%s.tmp" % (atlas_path, os.getpid())
+    with open(temp_path, "wb") as atlas_file:
+        atlas_file.write(ATLAS_MAGIC)
+        atlas_file.write(struct.pack(ATLAS_HEADER_FORMAT, len(index_data)))
+        atlas_file.write(index_data)
+        for pixels in pixel_list:
+            atlas_file.write(pixels)
+    os.rename(temp_path, atlas_path)
+
+    return atlas_path
+
+class ThemeAtlas(object):
+    '''
+    Memory mapped atlas of theme images.
+
+    Atlas store decoded pixels of all images in one file,
+    pixbuf is sliced from mapped memory when it's used, don't need open and decode every PNG file.
+    '''
+
+    def __init__(self, atlas_path):
+        '''
+        Initialize ThemeAtlas class.
+
+        @param atlas_path: Atlas filepath, build with function L{ I{build_theme_atlas} <build_theme_atlas>}.
+        '''
+        self.atlas_path = atlas_path
+        self.atlas_map = None
+        self.entries = {}
+        self.data_offset = 0
+
+        with open(atlas_path, "rb") as atlas_file:
+            if atlas_file.read(len(ATLAS_MAGIC)) != ATLAS_MAGIC:
+                raise ValueError("%s is not theme atlas" % atlas_path)
+
+            header_size = struct.calcsize(ATLAS_HEADER_FORMAT)
+            (index_length,) = struct.unpack(ATLAS_HEADER_FORMAT, atlas_file.read(header_size))
+            self.entries = marshal.loads(atlas_file.read(index_length))
+            self.data_offset = len(ATLAS_MAGIC) + header_size + index_length
+
+            # File can close after map, map keep its own reference.
+            self.atlas_map = mmap.mmap(atlas_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def has_pixbuf(self, path):
+        '''
+        Whether atlas contain image.
+
+        @param path: Image relative path to theme image directory.
+        @return: Return True if atlas contain image.
+        '''
+        return path in self.entries
+
+    def get_pixbuf(self, path):
+        '''
+        Get pixbuf of image from atlas.
+
+        @param path: Image relative path to theme image directory.
+        @return: Return gtk.gdk.Pixbuf, or None if atlas don't contain image.
+        '''
+        entry = self.entries.get(path)
+        if entry == None:
+            return None
+
+        (offset, length, width, height, rowstride, has_alpha) = entry
+        start = self.data_offset + offset
+        return gtk.gdk.pixbuf_new_from_data(
+            self.atlas_map[start:start + length],
+            gtk.gdk.COLORSPACE_RGB,
+            has_alpha,
+            8,
+            width,
+            height,
+            rowstride)
+
+    def close(self):
+        '''
+        Unmap atlas file.
+        '''
+        if self.atlas_map:
+            self.atlas_map.close()
+            self.atlas_map = None
+
+def load_theme_atlas(theme_path):
+    '''
+    Load atlas of theme.
+
+    @param theme_path: Theme path, such as theme_dir/theme_name.
+    @return: Return ThemeAtlas, or None if theme don't have atlas.
+    '''
+    atlas_path = os.path.join(theme_path, ATLAS_FILENAME)
+    if os.path.exists(atlas_path):
+        try:
+            return ThemeAtlas(atlas_path)
+        except Exception, e:
+            print "load_theme_atlas: load %s got error: %s" % (atlas_path, e)
+
+    return None
+
+if __name__ == "__main__":
+    for theme_path in sys.argv[1:]:
+        print "Build %s" % build_theme_atlas(theme_path)
@@ -20,10 +20,11 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-from contextlib import contextmanager
 from threading import Lock
 import Queue as Q
 import gtk
+import heapq
+import itertools
 import os
 import threading as td
 import time
@@ -36,10 +37,24 @@ class MissionThreadPool(td.Thread):
     '''
     A class of thread pool.
 
+    Missions run in persistent worker threads, worker take next mission after current mission finish,
+    pool don't start new thread for every mission.
+
+    Wait missions are kept in priority heap, mission with smaller priority value start first,
+    missions with same priority start in add order. Remove wait mission just mark its heap entry,
+    it's O(1) and don't search wait list.
+
+    Set max_wait_number to limit the number of wait missions,
+    set adaptive_concurrency to adjust worker number with observed mission latency,
+    worker number increase when latency is stable, and decrease when latency grow up because of contention.
+
     @undocumented: loop
-    @undocumented: start_missions
-    @undocumented: wake_up_wait_missions
-    @undocumented: sync
+    @undocumented: worker_loop
+    @undocumented: start_workers
+    @undocumented: push_mission
+    @undocumented: pop_mission
+    @undocumented: cancel_mission
+    @undocumented: adjust_concurrency
     @undocumented: finish_mission
     @undocumented: clean_mission
     '''
@@ -50,7 +65,9 @@ class MissionThreadPool(td.Thread):
                  concurrent_thread_num=5, # max concurrent thread number
                  clean_delay=0,           # clean delay (milliseconds)
                  clean_callback=None,     # clean callback
-                 exit_when_finish=False   # exit thread pool when all missions finish
+                 exit_when_finish=False,  # exit thread pool when all missions finish
+                 max_wait_number=0,       # max wait mission number, 0 means no limit
+                 adaptive_concurrency=False, # adjust concurrent thread number with mission latency
                  ):
         '''
         Initialise the thread pool.
@@ -59,6 +76,8 @@ class MissionThreadPool(td.Thread):
         @param clean_delay: The time between the finish of the thread and the invocation of thread clean up function.
         @param clean_callback: The clean up function, which is invoked after the thread is finished.
         @param exit_when_finish: Indicates whether the thread pool should be destroyed after all mission is finished. By default, it's False.
+        @param max_wait_number: The max number of wait missions, L{ I{add_missions} <MissionThreadPool.add_missions>} wait when wait queue is full. By default, it's 0 that means no limit.
+        @param adaptive_concurrency: Whether adjust concurrent thread number with observed mission latency, concurrent_thread_num is the upper limit. By default, it's False.
         '''
         # Init thread.
         td.Thread.__init__(self)
@@ -70,14 +89,32 @@ class MissionThreadPool(td.Thread):
         self.clean_callback = clean_callback
         self.clean_time = time.time()
         self.exit_when_finish = exit_when_finish
+        self.max_wait_number = max_wait_number
+        self.adaptive_concurrency = adaptive_concurrency
 
-        # Init list.
-        self.active_mission_list = []
-        self.wait_mission_list = []
+        # Init missions.
+        self.active_mission_set = set()
+        self.wait_mission_heap = []
+        self.wait_mission_dict = {}
         self.mission_result_list = []
+        self.mission_counter = itertools.count()
+
+        # Init workers.
+        self.worker_number = 0
+        self.exiting = False
+        if self.adaptive_concurrency:
+            # Start with one worker, then increase when latency is stable.
+            self.concurrency_limit = 1
+        else:
+            self.concurrency_limit = self.concurrent_thread_num
+        self.latency_average = None
+        self.min_latency = None
+        self.finish_number = 0
 
         # Init lock.
         self.thread_sync_lock = Lock()
+        self.mission_condition = td.Condition(self.thread_sync_lock)
+        self.wait_condition = td.Condition(self.thread_sync_lock)
         self.mission_lock = Q.Queue()
 
     def run(self):
@@ -92,95 +129,185 @@ class MissionThreadPool(td.Thread):
                 if self.exit_when_finish:
                     print ">>> Exit thread pool %s" % (self)
                     continue_run = False
+
+                    # Exit idle workers.
+                    with self.thread_sync_lock:
+                        self.exiting = True
+                        self.mission_condition.notify_all()
                 else:
                     print ">>> Wait new missions."
-            else:
-                self.start_missions(result)
 
-    def add_missions(self, missions):
+    def add_missions(self, missions, priority=0, block=True):
         '''
         Add missions to the thread pool.
 
         @param missions: A list of mission which is of type class MissionThread.
+        @param priority: Priority of missions, mission with smaller value start first. By default, it's 0.
+        @param block: Whether wait for free space when wait queue is full, it's only used when max_wait_number is set. By default, it's True.
+        @return: Return missions that not added because wait queue is full, it's always empty list when block is True.
         '''
-        self.mission_lock.put(missions)
+        with self.thread_sync_lock:
+            for (index, mission) in enumerate(missions):
+                if self.max_wait_number > 0:
+                    while len(self.wait_mission_dict) >= self.max_wait_number:
+                        if block:
+                            self.wait_condition.wait()
+                        else:
+                            return missions[index::]
 
-    def remove_from_wait_missions(self, missions):
-        with self.sync():
-            for mission in missions:
-                if mission in self.wait_mission_list:
-                    self.wait_mission_list.remove(mission)
+                self.push_mission(mission, priority)
+
+        return []
 
-    def start_missions(self, missions):
+    def remove_from_wait_missions(self, missions):
         '''
-        Internal function to start missions in the thread pool.
+        Remove missions that not start yet.
 
         @param missions: A list of mission which is of type class MissionThread.
         '''
-        for (index, mission) in enumerate(missions):
-            # Add to wait list if active mission number reach max value.
-            if len(self.active_mission_list) >= self.concurrent_thread_num:
-                self.wait_mission_list += missions[index::]
-                break
-            # Otherwise start new mission.
-            else:
-                self.start_mission(mission)
+        with self.thread_sync_lock:
+            cancel_missions = filter(self.cancel_mission, missions)
 
-    def start_mission(self, mission):
-        '''
-        Start a specific mission in the thread pool.
+            # Finish when last wait missions are removed.
+            if len(cancel_missions) > 0 and len(self.active_mission_set) == 0 and len(self.wait_mission_dict) == 0:
+                self.mission_lock.put(self.FINISH_SIGNAL)
 
-        @param mission: a mission which is of type class MissionThread.
+    def push_mission(self, mission, priority):
         '''
-        self.active_mission_list.append(mission)
+        Internal function to add mission to wait heap, it must call with thread_sync_lock.
+        '''
+        if mission in self.wait_mission_dict or mission in self.active_mission_set:
+            return
+
+        # Counter keep add order of missions with same priority, and heap never compare mission.
+        entry = [priority, self.mission_counter.next(), mission]
+        heapq.heappush(self.wait_mission_heap, entry)
+        self.wait_mission_dict[mission] = entry
         mission.finish_mission = self.finish_mission
-        mission.start()
 
-    def wake_up_wait_missions(self):
+        self.start_workers()
+        self.mission_condition.notify()
+
+    def pop_mission(self):
         '''
-        Internal function to wake up the mission which is in waiting list.
+        Internal function to pop mission with highest priority, it must call with thread_sync_lock.
         '''
-        for mission in self.wait_mission_list:
-            # Just break loop when active mission is bigger than max value.
-            if len(self.active_mission_list) >= self.concurrent_thread_num:
-                break
-            # Otherwise add mission from wait list.
-            else:
-                # Remove from wait list.
-                if mission in self.wait_mission_list:
-                    self.wait_mission_list.remove(mission)
+        while len(self.wait_mission_heap) > 0:
+            mission = heapq.heappop(self.wait_mission_heap)[2]
+            if mission != None:
+                del self.wait_mission_dict[mission]
+                self.wait_condition.notify()
+                return mission
 
-                # Start new mission.
-                self.start_mission(mission)
+        return None
 
-    @contextmanager
-    def sync(self):
+    def cancel_mission(self, mission):
         '''
-        Internal function do synchronize jobs.
+        Internal function to cancel wait mission, it must call with thread_sync_lock.
         '''
-        self.thread_sync_lock.acquire()
-        try:
-            yield
-        except Exception, e:
-            print 'function sync got error: %s' % e
-            traceback.print_exc(file=sys.stdout)
+        entry = self.wait_mission_dict.pop(mission, None)
+        if entry != None:
+            # Mark entry, it's dropped when pop from heap.
+            entry[2] = None
+            self.wait_condition.notify()
+
+            # Rebuild heap when most entries are cancelled.
+            if len(self.wait_mission_heap) > len(self.wait_mission_dict) * 2 + 64:
+                self.wait_mission_heap = filter(lambda entry: entry[2] != None, self.wait_mission_heap)
+                heapq.heapify(self.wait_mission_heap)
+
+            return True
+        else:
+            return False
+
+    def start_workers(self):
+        '''
+        Internal function to start workers for wait missions, it must call with thread_sync_lock.
+        '''
+        worker_number = min(self.concurrency_limit, len(self.active_mission_set) + len(self.wait_mission_dict))
+        while self.worker_number < worker_number:
+            self.worker_number += 1
+            worker = td.Thread(target=self.worker_loop)
+            worker.setDaemon(True) # make thread exit when main program exit
+            worker.start()
+
+    def worker_loop(self):
+        '''
+        Internal function to run missions in worker thread.
+        '''
+        while True:
+            with self.thread_sync_lock:
+                mission = None
+                while mission == None:
+                    # Exit worker when pool exit or concurrency limit decrease.
+                    if self.exiting or self.worker_number > self.concurrency_limit:
+                        self.worker_number -= 1
+                        return
+
+                    mission = self.pop_mission()
+                    if mission == None:
+                        self.mission_condition.wait()
+
+                self.active_mission_set.add(mission)
+
+            start_time = time.time()
+            try:
+                mission.start_mission()
+            except Exception, e:
+                print "MissionThreadPool: mission %s got error: %s" % (mission, e)
+                traceback.print_exc(file=sys.stdout)
+
+            self.finish_mission(mission, time.time() - start_time)
+
+    def adjust_concurrency(self, latency):
+        '''
+        Internal function to adjust concurrency limit with mission latency, it must call with thread_sync_lock.
+        '''
+        if self.latency_average == None:
+            self.latency_average = latency
         else:
-            self.thread_sync_lock.release()
+            self.latency_average = self.latency_average * 0.8 + latency * 0.2
 
-    def finish_mission(self, mission):
+        # Min latency grow slowly, then limit can recover after environment change.
+        if self.min_latency == None:
+            self.min_latency = self.latency_average
+        else:
+            self.min_latency = min(self.min_latency * 1.01, self.latency_average)
+
+        # Limit keep increase when latency is stable, and shrink with latency gradient.
+        if self.latency_average > 0:
+            gradient = max(0.5, min(1.0, self.min_latency / self.latency_average))
+        else:
+            gradient = 1.0
+        self.concurrency_limit = int(max(1, min(self.concurrent_thread_num, round(self.concurrency_limit * gradient + 1))))
+
+    def finish_mission(self, mission, latency=None):
         '''
-        Internal function that invoked by the MissionThread for every certain time.
+        Internal function that invoked when mission finish.
 
         @param mission: A mission of type MissionThread.
+        @param latency: Running time of mission in seconds, None if mission is not run by worker.
         '''
-        with self.sync():
-            # Remove mission from active mission list.
-            if mission in self.active_mission_list:
-                self.mission_result_list.append(mission.get_mission_result())
-                self.active_mission_list.remove(mission)
-
-            # Wake up wait missions.
-            self.wake_up_wait_missions()
+        try:
+            mission_result = mission.get_mission_result()
+        except Exception, e:
+            print "MissionThreadPool: get result of mission %s got error: %s" % (mission, e)
+            traceback.print_exc(file=sys.stdout)
+            mission_result = None
+
+        clean_result_list = None
+        with self.thread_sync_lock:
+            # Remove mission from active mission set.
+            if mission in self.active_mission_set:
+                self.active_mission_set.remove(mission)
+                self.mission_result_list.append(mission_result)
+                self.finish_number += 1
+
+            # Adjust concurrency, start more workers if limit increase.
+            if self.adaptive_concurrency and latency != None:
+                self.adjust_concurrency(latency)
+                self.start_workers()
+                self.mission_condition.notify_all()
 
             # Do clean work.
             if self.clean_delay > 0 and self.clean_callback != None and len(self.mission_result_list) > 0:
@@ -188,28 +315,49 @@ class MissionThreadPool(td.Thread):
                 current_time = time.time()
 
                 # Do clean work no mission will start or time reach delay.
-                if (len(self.active_mission_list) == 0 and len(self.wait_mission_list) == 0) or (current_time - self.clean_time) * 1000 > self.clean_delay:
-                    self.clean_mission(current_time)
+                if (len(self.active_mission_set) == 0 and len(self.wait_mission_dict) == 0) or (current_time - self.clean_time) * 1000 > self.clean_delay:
+                    clean_result_list = self.clean_mission(current_time)
 
             # Exit thread when download finish.
-            if (len(self.active_mission_list) == 0 and len(self.wait_mission_list) == 0):
+            if (len(self.active_mission_set) == 0 and len(self.wait_mission_dict) == 0):
                 self.mission_lock.put(self.FINISH_SIGNAL)
 
+        # Call clean callback out of lock, callback can add new missions.
+        if clean_result_list != None:
+            self.clean_callback(clean_result_list)
+
     def clean_mission(self, current_time):
         '''
-        Internal function to call clean_callback of the mission which is invoked in finish_mission.
+        Internal function to take mission results for clean_callback, it must call with thread_sync_lock.
 
         @param current_time: the time of type float which indicates the time the clean_mission is invoked.
+        @return: Return mission results that pass to clean_callback.
         '''
-        # Do clean work.
-        self.clean_callback(self.mission_result_list)
-
         # Clean mission result list.
+        mission_result_list = self.mission_result_list
         self.mission_result_list = []
 
         # Record new clean time.
         self.clean_time = current_time
 
+        return mission_result_list
+
+    def get_stats(self):
+        '''
+        Get thread pool statistics.
+
+        @return: Return dict with number of workers, active missions, wait missions and current concurrency limit.
+        '''
+        with self.thread_sync_lock:
+            return {
+                "worker_number" : self.worker_number,
+                "active_number" : len(self.active_mission_set),
+                "wait_number" : len(self.wait_mission_dict),
+                "finish_number" : self.finish_number,
+                "concurrency_limit" : self.concurrency_limit,
+                "latency_average" : self.latency_average,
+                }
+
 class MissionThread(td.Thread):
     '''
     This class stands for a single mission in the thread pool.
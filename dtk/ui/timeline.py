@@ -20,16 +20,20 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+from frame_clock import animation_clock
 import gobject
 import math
+import time
 
 CURVE_LINEAR = lambda x: x
 CURVE_SINE = lambda x: math.sin(math.pi / 2 * x)
-FRAMERATE = 30.0
 
 class Timeline(gobject.GObject):
     '''
     Timeline class.
+
+    Timeline is driven by shared L{ I{animation_clock} <frame_clock.animation_clock>},
+    progress is computed with wall-clock time, so duration is same even if some frames are dropped.
     '''
 
     __gtype_name__ = 'Timeline'
@@ -55,7 +59,7 @@ class Timeline(gobject.GObject):
         self.duration = duration
         self.curve = curve
 
-        self._states = []
+        self._start_time = None
         self._stopped = False
         self._started = False
 
@@ -63,14 +67,10 @@ class Timeline(gobject.GObject):
         '''
         Run.
         '''
-        n_frames = (self.duration / 1000.0) * FRAMERATE
-
-        while len(self._states) <= n_frames:
-            self._states.append(self.curve(len(self._states) * (1.0 / n_frames)))
-        self._states.reverse()
-
+        self._start_time = time.time()
+        self._stopped = False
         self._started = True
-        gobject.timeout_add(int(self.duration / n_frames), self.update)
+        animation_clock.add_animation(self, self.update)
 
     def stop(self):
         '''
@@ -79,9 +79,12 @@ class Timeline(gobject.GObject):
         self._stopped = True
         self._started = False
 
-    def update(self):
+    def update(self, now):
         '''
         Update.
+
+        @param now: Wall-clock time of tick.
+        @return: Return False when timeline stop or complete.
         '''
         if self._started:
             self.emit("start")
@@ -91,9 +94,13 @@ class Timeline(gobject.GObject):
             self.emit('stop')
             return False
         else:
-            self.emit('update', self._states.pop())
+            if self.duration > 0:
+                progress = min((now - self._start_time) * 1000 / self.duration, 1.0)
+            else:
+                progress = 1.0
+            self.emit('update', self.curve(progress))
 
-            if len(self._states) == 0:
+            if progress >= 1.0:
                 self.emit('completed')
                 return False
             return True
@@ -29,12 +29,16 @@ from constant import DEFAULT_FONT_SIZE
 import gtk
 import gobject
 import cairo
+import collections
 import gc
 from threads import post_gui
-from draw import draw_vlinear, draw_pixbuf, draw_text
+from sort_engine import SortEngine
+from draw import draw_vlinear, draw_pixbuf, draw_text, draw_fade_surface
 from theme import ui_theme
 from keymap import has_ctrl_mask, has_shift_mask, get_keyevent_name
 from cache_pixbuf import CachePixbuf
+from row_cache import RowSurfaceCache
+from frame_clock import frame_clock
 from deepin_utils.core import get_disperse_index
 from utils import (cairo_state, get_window_shadow_size, get_event_coords, color_hex_to_cairo,
                    is_in_rect,is_left_button, is_double_click, is_single_click,
@@ -43,21 +47,188 @@ from skin_config import skin_config
 from scrolled_window import ScrolledWindow
 import copy
 import pango
-import math
-import threading as td
 
 __all__ = ["TreeView"]
 
-class SortThread(td.Thread):
+class HeightIndex(object):
+    '''
+    Fenwick tree of item heights, use to find row with y coordinate and sum heights in O(log n).
+    '''
+
+    def __init__(self, heights=[]):
+        '''
+        Initialize HeightIndex class.
+
+        @param heights: The height list of items.
+        '''
+        self.rebuild(heights)
+
+    def rebuild(self, heights):
+        '''
+        Rebuild index with given heights in O(n).
+
+        @param heights: The height list of items.
+        '''
+        self.heights = list(heights)
+        self.size = len(self.heights)
+        self.tree = [0] + self.heights
+        for index in xrange(1, self.size + 1):
+            parent_index = index + (index & -index)
+            if parent_index <= self.size:
+                self.tree[parent_index] += self.tree[index]
+
+        self.top_step = 1
+        while self.top_step * 2 <= self.size:
+            self.top_step *= 2
+
+    def update(self, row, height):
+        '''
+        Update height of given row.
+
+        @param row: The row index.
+        @param height: The new height.
+        '''
+        delta = height - self.heights[row]
+        if delta != 0:
+            self.heights[row] = height
+            index = row + 1
+            while index <= self.size:
+                self.tree[index] += delta
+                index += index & -index
+
+    def get_height(self, row):
+        '''
+        Get height of given row.
+
+        @param row: The row index.
+        @return: Return height of row.
+        '''
+        return self.heights[row]
+
+    def get_prefix_height(self, row):
+        '''
+        Get the sum height of rows before given row.
+
+        @param row: The row index.
+        @return: Return sum height of rows in [0, row).
+        '''
+        height = 0
+        index = min(row, self.size)
+        while index > 0:
+            height += self.tree[index]
+            index -= index & -index
+
+        return height
+
+    def get_total_height(self):
+        '''
+        Get the sum height of all rows.
+
+        @return: Return total height.
+        '''
+        return self.get_prefix_height(self.size)
+
+    def find_row(self, y):
+        '''
+        Find row that contain given y coordinate.
+
+        @param y: Y coordinate.
+        @return: Return row index, or None if y coordinate out of range.
+        '''
+        if y < 0:
+            return None
+
+        # Binary lifting, find the max row that prefix height of it not bigger than y.
+        row = 0
+        remain_y = y
+        step = self.top_step
+        while step > 0:
+            if row + step <= self.size and self.tree[row + step] <= remain_y:
+                row += step
+                remain_y -= self.tree[row]
+            step /= 2
+
+        if row < self.size:
+            return row
+        else:
+            return None
+
+class ColumnWidthCounter(object):
+    '''
+    Counted multiset of item column widths, use to maintain max width of columns incrementally.
+    '''
+
+    def __init__(self):
+        '''
+        Initialize ColumnWidthCounter class.
+        '''
+        self.clear()
 
-    def __init__(self, sort_action, render_action):
-        td.Thread.__init__(self)
-        self.setDaemon(True)
-        self.sort_action = sort_action
-        self.render_action = render_action
+    def clear(self):
+        '''
+        Clear all width records.
+        '''
+        self.item_widths = {}
+        self.width_counts = []
+        self.max_widths = []
+        self.stale_columns = set()
+
+    def add_items(self, items):
+        '''
+        Record column widths of given items, cost O(k) for k items.
+
+        @param items: The items to add.
+        '''
+        for item in items:
+            if self.item_widths.has_key(item):
+                continue
+
+            widths = item.get_column_widths()
+            self.item_widths[item] = widths
+            for (index, width) in enumerate(widths):
+                if index < len(self.width_counts):
+                    counts = self.width_counts[index]
+                    counts[width] = counts.get(width, 0) + 1
+                    self.max_widths[index] = max(self.max_widths[index], width)
+                else:
+                    self.width_counts.append({width : 1})
+                    self.max_widths.append(width)
+
+    def remove_items(self, items):
+        '''
+        Remove column widths of given items, max width just recompute when max width removed.
+
+        @param items: The items to remove.
+        '''
+        for item in items:
+            widths = self.item_widths.pop(item, None)
+            if widths != None:
+                for (index, width) in enumerate(widths):
+                    counts = self.width_counts[index]
+                    counts[width] -= 1
+                    if counts[width] == 0:
+                        del counts[width]
+                        if width == self.max_widths[index]:
+                            self.stale_columns.add(index)
+
+    def get_widths(self):
+        '''
+        Get max width of columns.
+
+        @return: Return max width list of columns.
+        '''
+        # Recompute max width of stale columns lazily.
+        for index in self.stale_columns:
+            if len(self.width_counts[index]) > 0:
+                self.max_widths[index] = max(self.width_counts[index].iterkeys())
+        self.stale_columns.clear()
+
+        # Drop tail columns that no item has.
+        while len(self.width_counts) > 0 and len(self.width_counts[-1]) == 0:
+            self.width_counts.pop()
+            self.max_widths.pop()
 
-    def run(self):
-        self.render_action(*self.sort_action())
+        return list(self.max_widths)
 
 class Titlebar(gtk.Button):
 
@@ -230,6 +401,7 @@ class TreeView(gtk.VBox):
     @undocumented: draw_background
     @undocumented: draw_mask
     @undocumented: draw_items
+    @undocumented: get_row_surface
     @undocumented: get_expose_bound
     @undocumented: button_press_tree_view
     @undocumented: click_item
@@ -311,6 +483,7 @@ class TreeView(gtk.VBox):
         # Init.
         gtk.VBox.__init__(self)
         self.visible_items = []
+        self.height_index = HeightIndex()
         self.titles = None
         self.sort_methods = None
         self.drag_data = drag_data
@@ -339,8 +512,12 @@ class TreeView(gtk.VBox):
         self.drag_item = None
         self.drag_reference_row = None
         self.column_widths = []
-        self.sort_action_id = 0
+        self.column_width_counter = ColumnWidthCounter()
+        self.column_widths_dirty = False
+        self.update_column_widths_id = None
+        self.sort_engine = SortEngine()
         self.title_offset_y = -1
+        self.row_surface_cache = None
 
         self.highlight_item = None
 
@@ -350,10 +527,9 @@ class TreeView(gtk.VBox):
         # expand column.
         self.expand_column = expand_column
 
-        # Init redraw.
+        # Init redraw, request items are redrawn in next tick of frame clock.
         self.redraw_request_list = []
-        self.redraw_delay = 100 # update redraw item delay, milliseconds
-        gtk.timeout_add(self.redraw_delay, self.update_redraw_request_list)
+        self.connect("destroy", lambda widget: frame_clock.cancel_frame(widget))
 
         # Init widgets.
         self.title_box = Titlebar()
@@ -379,7 +555,7 @@ class TreeView(gtk.VBox):
         # Handle signals.
         self.draw_area.connect("realize", self.realize_tree_view)
         self.draw_area.connect("realize", lambda w: self.grab_focus())
-        self.draw_area.connect("expose-event", lambda w, e: self.expose_tree_view(w))
+        self.draw_area.connect("expose-event", lambda w, e: self.expose_tree_view(w, e))
         self.draw_area.connect("button-press-event", self.button_press_tree_view)
         self.draw_area.connect("button-release-event", self.button_release_tree_view)
         self.draw_area.connect("motion-notify-event", self.motion_tree_view)
@@ -458,7 +634,7 @@ class TreeView(gtk.VBox):
                     # Scroll viewport make sure preview row in visible area.
                     (offset_x, offset_y, viewport) = self.get_offset_coordinate(self.draw_area)
                     vadjust = self.scrolled_window.get_vadjustment()
-                    new_row_height_count = sum(map(lambda i: i.get_height(), self.visible_items[:new_row]))
+                    new_row_height_count = self.height_index.get_prefix_height(new_row)
                     if offset_y > new_row_height_count:
                         vadjust.set_value(max(vadjust.get_lower(),
                                               new_row_height_count - self.visible_items[new_row].get_height()))
@@ -466,73 +642,73 @@ class TreeView(gtk.VBox):
 
     def on_titlebar_clicked_title(self, widget, index, sort_ascending):
         if self.sort_methods:
-            SortThread(lambda : self.sort_column(index, sort_ascending), self.render_sort_column).start()
+            # Sort in background, new sort request will cancel running sort request.
+            items = list(self.visible_items)
+            self.sort_engine.start(
+                lambda request_id: self.sort_column(index, sort_ascending, items, request_id),
+                self.render_sort_column)
 
-    def sort_column(self, sort_column_index, sort_ascending):
+    def sort_column(self, sort_column_index, sort_ascending, items=None, request_id=None):
         '''
         Sort column.
 
+        Sort every level of items with sort method of column, child items are placed after their parent item.
+
         @param sort_column_index: The index of sort column.
         @param sort_ascending: Sort ascending.
+        @param items: Items to sort, default is None to sort visible items.
+        @param request_id: Request id of sort engine, use to check cancel status, default is None.
+        @return: Return (sorted_items, original_items).
         '''
-        # Update sort action id.
-        self.sort_action_id += 1
-
-        # Save current action id to return.
-        sort_action_id = self.sort_action_id
+        if items == None:
+            items = list(self.visible_items)
 
-        # Split items with different column index.
-        level_items = []
-        column_index = None
-        for item in self.visible_items:
-            if item.column_index != column_index:
-                level_items.append((item.column_index, item.parent_item, [item]))
-                column_index = item.column_index
+        # Split items with parent item, toplevel items use None as parent.
+        visible_item_set = set(items)
+        child_items_dict = collections.OrderedDict()
+        for item in items:
+            if item.column_index == 0 or not item.parent_item in visible_item_set:
+                parent_item = None
             else:
-                if len(level_items) == 0:
-                    level_items.append((item.column_index, item.parent_item, [item]))
-                else:
-                    level_items[-1][2].append(item)
-
-        # Connect all toplevel items to sort.
-        toplevel_items = []
-        child_items = []
-        for item in level_items:
-            (column_index, parent_item, items) = item
-            if column_index == 0:
-                toplevel_items += items
+                parent_item = item.parent_item
+
+            if parent_item in child_items_dict:
+                child_items_dict[parent_item].append(item)
             else:
-                child_items.append(item)
-        level_items = [(0, None, toplevel_items)] + child_items
+                child_items_dict[parent_item] = [item]
 
-        # Sort items with different column index to make sure parent item sort before child item.
-        level_items = sorted(level_items, key=lambda (column_index, parent_item, items): column_index)
+        # Sort every level.
+        for (parent_item, child_items) in child_items_dict.items():
+            self.sort_engine.check_cancelled(request_id)
 
-        # Sort all items.
-        result_items = []
-        for (column_index, parent_item, items) in level_items:
-            # Do sort action.
-            sort_items = self.sort_methods[sort_column_index](
-                items,
+            child_items_dict[parent_item] = self.sort_methods[sort_column_index](
+                child_items,
                 sort_ascending
                 )
 
-            # If column index is 0, insert at last position.
-            if column_index == 0:
-                result_items += sort_items
-            # Insert after parent item if column index is not 0 (child items).
+        # Connect levels with depth first order, child items follow their parent item.
+        result_items = []
+        stack = [iter(child_items_dict.get(None, []))]
+        while len(stack) > 0:
+            item = next(stack[-1], None)
+            if item == None:
+                stack.pop()
             else:
-                split_index = result_items.index(parent_item) + 1
-                result_items = result_items[0:split_index] + sort_items + result_items[split_index::]
+                result_items.append(item)
+                if item in child_items_dict:
+                    stack.append(iter(child_items_dict[item]))
 
-        return (result_items, sort_action_id)
+        return (result_items, items)
 
     @post_gui
-    def render_sort_column(self, items, sort_action_id):
-        if sort_action_id == self.sort_action_id:
-            self.add_items(items, None, True)
-        else:
+    def render_sort_column(self, (sort_items, origin_items), sort_action_id):
+        if self.sort_engine.is_cancelled(sort_action_id):
             print "render_sort_column: drop old sort result!"
+        elif origin_items != self.visible_items or len(sort_items) != len(origin_items):
+            print "render_sort_column: items changed when sort, drop sort result!"
+        else:
+            # Just swap order and keep select status, don't need add items again.
+            self.reorder_items(sort_items)
 
     def set_column_titles(self,
                           titles,
@@ -643,7 +819,7 @@ class TreeView(gtk.VBox):
             if select_row == 0:
                 vadjust.set_value(vadjust.get_lower())
             else:
-                item_height_count = sum(map(lambda i: i.get_height(), self.visible_items[:select_row]))
+                item_height_count = self.height_index.get_prefix_height(select_row)
                 if offset_y > item_height_count:
                     vadjust.set_value(max(item_height_count - self.visible_items[select_row].get_height(), vadjust.get_lower()))
         else:
@@ -651,7 +827,7 @@ class TreeView(gtk.VBox):
                 # Record offset before scroll.
                 vadjust = self.scrolled_window.get_vadjustment()
 
-                item_height_count = sum(map(lambda i: i.get_height(), self.visible_items[:self.start_select_row]))
+                item_height_count = self.height_index.get_prefix_height(self.start_select_row)
                 scroll_offset_y = item_height_count - vadjust.get_value()
 
                 # Get select row.
@@ -667,7 +843,7 @@ class TreeView(gtk.VBox):
                 if select_row == 0:
                     vadjust.set_value(vadjust.get_lower())
                 else:
-                    item_height_count = sum(map(lambda i: i.get_height(), self.visible_items[:select_row]))
+                    item_height_count = self.height_index.get_prefix_height(select_row)
                     if offset_y > item_height_count:
                         vadjust.set_value(max(item_height_count - scroll_offset_y,
                                               vadjust.get_lower()))
@@ -692,14 +868,14 @@ class TreeView(gtk.VBox):
             # Scroll viewport make sure preview row in visible area.
             max_y = vadjust.get_upper() - vadjust.get_page_size()
             (offset_x, offset_y, viewport) = self.get_offset_coordinate(self.draw_area)
-            item_height_count = sum(map(lambda i: i.get_height(), self.visible_items[:(self.start_select_row + 1)]))
+            item_height_count = self.height_index.get_prefix_height(self.start_select_row + 1)
             if offset_y + vadjust.get_page_size() < item_height_count:
                 vadjust.set_value(min(max_y, item_height_count))
         else:
             if self.start_select_row != None:
                 # Record offset before scroll.
                 vadjust = self.scrolled_window.get_vadjustment()
-                item_height_count = sum(map(lambda i: i.get_height(), self.visible_items[:(self.start_select_row + 1)]))
+                item_height_count = self.height_index.get_prefix_height(self.start_select_row + 1)
                 scroll_offset_y = item_height_count - vadjust.get_value()
 
                 # Get select row.
@@ -713,7 +889,7 @@ class TreeView(gtk.VBox):
                 # Scroll viewport make sure preview row in visible area.
                 max_y = vadjust.get_upper() - vadjust.get_page_size()
                 (offset_x, offset_y, viewport) = self.get_offset_coordinate(self.draw_area)
-                item_height_count = sum(map(lambda i: i.get_height(), self.visible_items[:(self.start_select_row + 1)]))
+                item_height_count = self.height_index.get_prefix_height(self.start_select_row + 1)
                 if offset_y + vadjust.get_page_size() < item_height_count:
                     vadjust.set_value(min(max_y, item_height_count - scroll_offset_y))
             else:
@@ -738,7 +914,7 @@ class TreeView(gtk.VBox):
                 # Scroll viewport make sure preview row in visible area.
                 (offset_x, offset_y, viewport) = self.get_offset_coordinate(self.draw_area)
                 vadjust = self.scrolled_window.get_vadjustment()
-                prev_row_height_count = sum(map(lambda i: i.get_height(), self.visible_items[:prev_row]))
+                prev_row_height_count = self.height_index.get_prefix_height(prev_row)
                 if offset_y > prev_row_height_count:
                     vadjust.set_value(max(vadjust.get_lower(),
                                           prev_row_height_count - self.visible_items[prev_row].get_height()))
@@ -753,7 +929,7 @@ class TreeView(gtk.VBox):
                 # Scroll viewport make sure preview row in visible area.
                 (offset_x, offset_y, viewport) = self.get_offset_coordinate(self.draw_area)
                 vadjust = self.scrolled_window.get_vadjustment()
-                prev_row_height_count = sum(map(lambda i: i.get_height(), self.visible_items[:prev_row]))
+                prev_row_height_count = self.height_index.get_prefix_height(prev_row)
                 if offset_y > prev_row_height_count:
                     vadjust.set_value(max(vadjust.get_lower(),
                                           prev_row_height_count - self.visible_items[prev_row].get_height()))
@@ -777,7 +953,7 @@ class TreeView(gtk.VBox):
                 # Scroll viewport make sure next row in visible area.
                 (offset_x, offset_y, viewport) = self.get_offset_coordinate(self.draw_area)
                 vadjust = self.scrolled_window.get_vadjustment()
-                next_row_height_count = sum(map(lambda i: i.get_height(), self.visible_items[:next_row]))
+                next_row_height_count = self.height_index.get_prefix_height(next_row)
                 if offset_y + vadjust.get_page_size() < next_row_height_count + self.visible_items[next_row].get_height() or offset_y > next_row_height_count:
                     vadjust.set_value(max(vadjust.get_lower(),
                                           next_row_height_count + self.visible_items[next_row].get_height() - vadjust.get_page_size()))
@@ -789,7 +965,7 @@ class TreeView(gtk.VBox):
                 # Scroll viewport make sure next row in visible area.
                 (offset_x, offset_y, viewport) = self.get_offset_coordinate(self)
                 vadjust = self.scrolled_window.get_vadjustment()
-                next_row_height_count = sum(map(lambda i: i.get_height(), self.visible_items[:(next_row + 1)]))
+                next_row_height_count = self.height_index.get_prefix_height(next_row + 1)
                 if offset_y + vadjust.get_page_size() < next_row_height_count:
                     vadjust.set_value(max(vadjust.get_lower(),
                                           next_row_height_count - vadjust.get_page_size()))
@@ -810,7 +986,7 @@ class TreeView(gtk.VBox):
 
                         (offset_x, offset_y, viewport) = self.get_offset_coordinate(self.draw_area)
                         vadjust = self.scrolled_window.get_vadjustment()
-                        prev_row_height_count = sum(map(lambda i: i.get_height(), self.visible_items[:prev_row]))
+                        prev_row_height_count = self.height_index.get_prefix_height(prev_row)
                         if offset_y > prev_row_height_count:
                             vadjust.set_value(max(vadjust.get_lower(),
                                                   prev_row_height_count - self.visible_items[prev_row].get_height()))
@@ -820,7 +996,7 @@ class TreeView(gtk.VBox):
 
                     (offset_x, offset_y, viewport) = self.get_offset_coordinate(self.draw_area)
                     vadjust = self.scrolled_window.get_vadjustment()
-                    prev_row_height_count = sum(map(lambda i: i.get_height(), self.visible_items[:prev_row]))
+                    prev_row_height_count = self.height_index.get_prefix_height(prev_row)
                     if offset_y > prev_row_height_count:
                         vadjust.set_value(max(vadjust.get_lower(),
                                               prev_row_height_count - self.visible_items[prev_row].get_height()))
@@ -843,7 +1019,7 @@ class TreeView(gtk.VBox):
 
                         (offset_x, offset_y, viewport) = self.get_offset_coordinate(self.draw_area)
                         vadjust = self.scrolled_window.get_vadjustment()
-                        next_row_height_count = sum(map(lambda i: i.get_height(), self.visible_items[:(next_row + 1)]))
+                        next_row_height_count = self.height_index.get_prefix_height(next_row + 1)
                         if offset_y + vadjust.get_page_size() < next_row_height_count:
                             vadjust.set_value(max(vadjust.get_lower(),
                                                   next_row_height_count + self.visible_items[next_row].get_height() - vadjust.get_page_size()))
@@ -853,7 +1029,7 @@ class TreeView(gtk.VBox):
 
                     (offset_x, offset_y, viewport) = self.get_offset_coordinate(self.draw_area)
                     vadjust = self.scrolled_window.get_vadjustment()
-                    next_row_height_count = sum(map(lambda i: i.get_height(), self.visible_items[:(next_row + 1)]))
+                    next_row_height_count = self.height_index.get_prefix_height(next_row + 1)
                     if offset_y + vadjust.get_page_size() < next_row_height_count:
                         vadjust.set_value(max(vadjust.get_lower(),
                                               next_row_height_count - vadjust.get_page_size()))
@@ -926,39 +1102,110 @@ class TreeView(gtk.VBox):
 
     def update_item_index(self):
         '''
-        Update index of items.
+        Update index of items, and rebuild height index.
         '''
+        heights = []
         for (index, item) in enumerate(self.visible_items):
             item.row_index = index
+            heights.append(item.get_height())
+
+        self.height_index.rebuild(heights)
+
+    def update_item_height(self, item):
+        '''
+        Update height index when height of item changed.
+
+        @param item: The item that height changed.
+        '''
+        if 0 <= item.row_index < len(self.visible_items) and self.visible_items[item.row_index] == item:
+            self.height_index.update(item.row_index, item.get_height())
+            self.update_vadjustment()
+            self.queue_draw()
 
     def update_item_widths(self):
-        self.column_widths = []
-        for item in self.visible_items:
-            for (index, column_width) in enumerate(item.get_column_widths()):
-                if index < len(self.column_widths):
-                    self.column_widths[index] = max(self.column_widths[index], column_width)
-                else:
-                    self.column_widths.insert(index, column_width)
+        '''
+        Measure all visible items again, use it when column widths of items changed.
+        '''
+        self.column_width_counter.clear()
+        self.column_width_counter.add_items(self.visible_items)
+
+        self.update_column_widths()
+
+    def update_item_width(self, item):
+        '''
+        Update column widths when column widths of item changed.
+
+        @param item: The item that column widths changed.
+        '''
+        if item in self.column_width_counter.item_widths:
+            self.column_width_counter.remove_items([item])
+            self.column_width_counter.add_items([item])
+            self.mark_widths_dirty()
+
+    def update_column_widths(self):
+        '''
+        Update column widths with recorded item widths.
+        '''
+        remove_timeout_id(self.update_column_widths_id)
+        self.update_column_widths_id = None
+        self.column_widths_dirty = False
+
+        self.column_widths = self.column_width_counter.get_widths()
 
         if self.titles != None:
             self.title_box.set_widths(self.get_column_widths())
 
+        return False
+
+    def mark_widths_dirty(self):
+        '''
+        Mark column widths dirty, column widths will update once in idle time.
+
+        Many add or delete operations (such as expand a lot of items) just update column widths once.
+        '''
+        if not self.column_widths_dirty:
+            self.column_widths_dirty = True
+            # Use high priority to update column widths before redraw.
+            self.update_column_widths_id = gobject.idle_add(
+                self.update_column_widths, priority=gobject.PRIORITY_HIGH_IDLE)
+
     def redraw_request(self, item, immediately=False):
+        if self.row_surface_cache:
+            self.row_surface_cache.invalidate(item)
+
         if not item in self.redraw_request_list:
             self.redraw_request_list.append(item)
 
         if immediately:
             self.update_redraw_request_list()
+        else:
+            frame_clock.request_frame(self, self.update_redraw_request_list)
 
     def update_redraw_request_list(self):
         if len(self.redraw_request_list) > 0:
-            self.scrolled_window.queue_draw()
+            # Collect damage rows of request items in visible area,
+            # adjacent rows are merged into one rectangle by region.
+            rect = self.draw_area.allocation
+            vadjust = self.scrolled_window.get_vadjustment()
+            start_y = int(vadjust.get_value())
+            end_y = start_y + int(vadjust.get_page_size())
+            damage_region = gtk.gdk.Region()
+            for item in self.redraw_request_list:
+                row = item.row_index
+                if row != None and row < len(self.visible_items) and self.visible_items[row] == item:
+                    item_y = self.height_index.get_prefix_height(row)
+                    item_height = self.height_index.get_height(row)
+                    if item_y < end_y and item_y + item_height > start_y:
+                        damage_region.union_with_rect(
+                            gtk.gdk.Rectangle(rect.x, rect.y + item_y, rect.width, item_height))
+
+            # Just redraw damage area, expose handler will draw rows in damage area.
+            for damage_rect in damage_region.get_rectangles():
+                self.draw_area.queue_draw_area(damage_rect.x, damage_rect.y, damage_rect.width, damage_rect.height)
 
         # Clear redraw request list.
         self.redraw_request_list = []
 
-        return True
-
     def set_items(self, items):
         '''
         Set items of TreeView.
@@ -969,6 +1216,19 @@ class TreeView(gtk.VBox):
             self.visible_items = items
             self.emit("items-change")
 
+            # Rows moved, damage area of redraw request is not enough.
+            self.scrolled_window.queue_draw()
+
+    def reorder_items(self, items):
+        '''
+        Change order of items, select status is kept.
+
+        @param items: Items in new order, it must contain same items as visible items.
+        '''
+        with self.keep_select_status():
+            self.set_items(items)
+            self.update_item_index()
+
     def add_items(self,
                   items,
                   insert_pos=None,
@@ -994,14 +1254,21 @@ class TreeView(gtk.VBox):
                 # Update redraw callback.
                 # Callback is better way to avoid performance problem than gobject signal.
                 for item in items:
+                    # Item add again (such as expand node again or reload batch) has connected signal.
+                    if item.redraw_request_callback != self.redraw_request:
+                        item.connect("redraw-request", self.redraw_item)
+
                     item.redraw_request_callback = self.redraw_request
                     item.add_items_callback = self.add_items
                     item.delete_items_callback = self.delete_items
-                    item.connect("redraw-request", self.redraw_item)
+                    item.update_width_callback = self.update_item_width
 
                 self.update_item_index()
 
-                self.update_item_widths()
+                if clear_first:
+                    self.column_width_counter.clear()
+                self.column_width_counter.add_items(items)
+                self.mark_widths_dirty()
 
                 self.update_vadjustment()
 
@@ -1009,6 +1276,9 @@ class TreeView(gtk.VBox):
         '''
         Internal function to redraw item.
         '''
+        if self.row_surface_cache:
+            self.row_surface_cache.invalidate(list_item)
+
         self.redraw_request_list.append(list_item)
         self.update_redraw_request_list()
 
@@ -1030,23 +1300,25 @@ class TreeView(gtk.VBox):
         @param items: The items need to delete.
         '''
         if len(items) > 0:
-            cache_remove_items = []
+            # Filter visible items in one pass, don't search list for every item.
+            item_set = set(items)
+            cache_remove_items = filter(lambda item: item in item_set, self.visible_items)
             with self.keep_select_status():
-                for item in items:
-                    if item in self.visible_items:
-                        cache_remove_items.append(item)
-                        self.visible_items.remove(item)
+                self.visible_items = filter(lambda item: not item in item_set, self.visible_items)
 
                 self.emit("delete-select-items", cache_remove_items)
 
                 self.update_item_index()
 
-                self.update_item_widths()
+                self.column_width_counter.remove_items(cache_remove_items)
+                self.mark_widths_dirty()
 
                 self.update_vadjustment()
 
                 self.emit("items-change")
 
+                self.scrolled_window.queue_draw()
+
     def clear(self):
         '''
         Clear operation, same as function `delete_all_items`.
@@ -1065,18 +1337,22 @@ class TreeView(gtk.VBox):
 
             self.update_item_index()
 
-            self.update_item_widths()
+            self.column_width_counter.clear()
+            self.update_column_widths()
+
+            if self.row_surface_cache:
+                self.row_surface_cache.clear()
 
             self.update_vadjustment()
 
     def update_vadjustment(self):
-        vadjust_height = sum(map(lambda i: i.get_height(), self.visible_items))
+        vadjust_height = self.height_index.get_total_height()
         self.draw_area.set_size_request(-1, vadjust_height)
         vadjust = self.scrolled_window.get_vadjustment()
         if vadjust.get_upper() != vadjust_height and self.scrolled_window.allocation.height < vadjust_height:
             vadjust.set_upper(vadjust_height)
 
-    def expose_tree_view(self, widget):
+    def expose_tree_view(self, widget, event=None):
         '''
         Internal callback to handle `expose-event` signal.
         '''
@@ -1098,14 +1374,27 @@ class TreeView(gtk.VBox):
         hadjust_value = int(hadjust.get_value())
         self.draw_mask(cr, hadjust_value, vadjust_value, self.scrolled_window.allocation.width, self.scrolled_window.allocation.height)
 
-        # We need clear render surface every time.
+        # Get damage area, coordinate of area is same as render surface.
+        if event == None:
+            area = None
+        else:
+            area = gtk.gdk.Rectangle(event.area.x - hadjust_value,
+                                     event.area.y - vadjust_value,
+                                     event.area.width,
+                                     event.area.height)
+
+        # We need clear damage area of render surface every time.
         with cairo_state(self.render_surface_cr):
+            if area != None:
+                self.render_surface_cr.rectangle(area.x, area.y, area.width, area.height)
+                self.render_surface_cr.clip()
+
             self.render_surface_cr.set_operator(cairo.OPERATOR_CLEAR)
             self.render_surface_cr.paint()
 
         # Draw items on render surface.
         if len(self.visible_items) > 0:
-            self.draw_items(rect, self.render_surface_cr)
+            self.draw_items(rect, self.render_surface_cr, area)
 
         # Draw bound mask.
         width = self.scrolled_window.allocation.width
@@ -1122,16 +1411,11 @@ class TreeView(gtk.VBox):
                 cr.set_source_surface(self.render_surface, hadjust_value, vadjust_value)
                 cr.paint()
         elif self.mask_bound_height > 0:
-            i = 0
-            while (i <= self.mask_bound_height):
-                with cairo_state(cr):
-                    cr.rectangle(hadjust_value, vadjust_value + i, width, 1)
-                    cr.clip()
-
-                    cr.set_source_surface(self.render_surface, hadjust_value, vadjust_value)
-                    cr.paint_with_alpha(math.sin(i * math.pi / 2 / self.mask_bound_height))
-
-                i += 1
+            draw_fade_surface(cr, self.render_surface,
+                              hadjust_value, vadjust_value,
+                              hadjust_value, vadjust_value,
+                              width, self.mask_bound_height,
+                              True)
 
         with cairo_state(cr):
             cr.rectangle(hadjust_value, vadjust_value + self.mask_bound_height, width, height - self.mask_bound_height * 2)
@@ -1146,15 +1430,11 @@ class TreeView(gtk.VBox):
                 cr.set_source_surface(self.render_surface, hadjust_value, vadjust_value)
                 cr.paint()
         elif self.mask_bound_height > 0:
-            i = 0
-            while (i < self.mask_bound_height):
-                with cairo_state(cr):
-                    cr.rectangle(hadjust_value, vadjust_value + height - self.mask_bound_height + i, width, 1)
-                    cr.clip()
-                    cr.set_source_surface(self.render_surface, hadjust_value, vadjust_value)
-                    cr.paint_with_alpha(1.0 - (math.sin(i * math.pi / 2 / self.mask_bound_height)))
-
-                i += 1
+            draw_fade_surface(cr, self.render_surface,
+                              hadjust_value, vadjust_value,
+                              hadjust_value, vadjust_value + height - self.mask_bound_height,
+                              width, self.mask_bound_height,
+                              False)
 
         return False
 
@@ -1189,7 +1469,7 @@ class TreeView(gtk.VBox):
                      ui_theme.get_shadow_color("linear_background").get_color_info()
                      )
 
-    def draw_items(self, rect, cr):
+    def draw_items(self, rect, cr, area=None):
         with cairo_state(cr):
             vadjust_value = int(self.scrolled_window.get_vadjustment().get_value())
             hadjust_value = int(self.scrolled_window.get_hadjustment().get_value())
@@ -1197,9 +1477,40 @@ class TreeView(gtk.VBox):
             # Draw items.
             (start_row, end_row, item_height_count) = self.get_expose_bound()
 
+            # Just draw rows in damage area.
+            if area != None:
+                cr.rectangle(area.x, area.y, area.width, area.height)
+                cr.clip()
+
+                damage_start_row = self.height_index.find_row(area.y + vadjust_value - rect.y)
+                if damage_start_row != None and damage_start_row > start_row:
+                    start_row = damage_start_row
+                    item_height_count = self.height_index.get_prefix_height(start_row)
+
+                damage_end_row = self.height_index.find_row(area.y + area.height + vadjust_value - rect.y)
+                if damage_end_row != None:
+                    end_row = min(end_row, damage_end_row + 1)
+
             column_widths = self.get_column_widths()
 
             for item in self.visible_items[start_row:end_row]:
+                if self.row_surface_cache:
+                    # Blit cached row surface instead of render every column.
+                    render_x = rect.x - hadjust_value
+                    render_y = rect.y + item_height_count - vadjust_value
+                    row_surface = self.get_row_surface(item, column_widths)
+
+                    with cairo_state(cr):
+                        cr.rectangle(rect.x, rect.y, rect.width, rect.height)
+                        cr.clip()
+
+                        cr.set_source_surface(row_surface, render_x, render_y)
+                        cr.paint()
+
+                    item_height_count += item.get_height()
+
+                    continue
+
                 item_width_count = 0
                 for (index, column_width) in column_widths:
                     render_x = rect.x + item_width_count - hadjust_value
@@ -1222,35 +1533,71 @@ class TreeView(gtk.VBox):
 
                 item_height_count += item.get_height()
 
+    def set_row_cache(self, enable, cache_size=256):
+        '''
+        Enable or disable row surface cache.
+
+        When row cache enable, treeview render row into surface once, and blit surface when row not change,
+        item should call emit_redraw_request or redraw_request_callback when its content changed.
+
+        @param enable: Whether enable row cache.
+        @param cache_size: The max number of cached rows, default is 256.
+        '''
+        if enable:
+            self.row_surface_cache = RowSurfaceCache(cache_size)
+        else:
+            self.row_surface_cache = None
+
+        self.scrolled_window.queue_draw()
+
+    def get_row_surface(self, item, column_widths):
+        '''
+        Internal function to get cached row surface.
+
+        @param item: Tree item.
+        @param column_widths: Column widths, format as [(index, column_width)].
+        @return: Return row surface.
+        '''
+        row_width = sum(map(lambda (index, column_width): column_width, column_widths))
+        row_height = item.get_height()
+        state_key = (tuple(column_widths),
+                     item.is_select,
+                     item.is_hover,
+                     item.is_highlight,
+                     item.is_expand,
+                     item.drag_line,
+                     item.drag_line_at_bottom)
+
+        def render_row(cr, width, height):
+            item_width_count = 0
+            column_renders = item.get_column_renders()
+            for (index, column_width) in column_widths:
+                with cairo_state(cr):
+                    cr.rectangle(item_width_count, 0, column_width, height)
+                    cr.clip()
+
+                    column_renders[index](cr, gtk.gdk.Rectangle(item_width_count, 0, column_width, height))
+
+                item_width_count += column_width
+
+        return self.row_surface_cache.get_surface(item, state_key, row_width, row_height, render_row)
+
     def get_expose_bound(self):
         (offset_x, offset_y, viewport) = self.get_offset_coordinate(self.draw_area)
         page_size = self.scrolled_window.get_vadjustment().get_page_size()
 
-        start_row = None
-        end_row = None
-        start_y = None
-        item_height_count = 0
-        item_index_count = 0
-        for item in self.visible_items:
-            if start_row == None and start_y == None:
-                if item_height_count <= offset_y <= item_height_count + item.get_height():
-                    start_row = item_index_count
-                    start_y = item_height_count
-            elif end_row == None:
-                if item_height_count <= offset_y + page_size <= item_height_count + item.get_height():
-                    end_row = item_index_count + 1 # add 1 for python list split operation
-            else:
-                break
-
-            item_index_count += 1
-            item_height_count += item.get_height()
+        start_row = self.height_index.find_row(offset_y)
+        if start_row == None:
+            start_row = len(self.visible_items) - 1
+        start_y = self.height_index.get_prefix_height(start_row)
 
-        assert(start_row != None and start_y != None)
-
-        # Items' height must smaller than page size if end_row is None after scan all items.
+        # Items' height must smaller than page size if end row is None.
         # Then we need adjust end_row with last index of visible list.
+        end_row = self.height_index.find_row(offset_y + page_size)
         if end_row == None:
             end_row = len(self.visible_items)
+        else:
+            end_row += 1 # add 1 for python list split operation
 
         return (start_row, end_row, start_y)
 
@@ -1623,7 +1970,7 @@ class TreeView(gtk.VBox):
             self.press_shift = False
 
     def size_allocated_tree_view(self, widget, rect):
-        self.update_item_widths()
+        self.update_column_widths()
 
         # Cairo temp surface.
         try:
@@ -1677,7 +2024,7 @@ class TreeView(gtk.VBox):
                 if self.expand_column in self.hide_columns:
                     self.hide_columns.remove(self.expand_column)
 
-        self.update_item_widths()
+        self.update_column_widths()
         self.queue_draw()
 
     def set_expand_column(self, column):
@@ -1690,7 +2037,7 @@ class TreeView(gtk.VBox):
         if self.hide_columns != None:
             if column in self.hide_columns:
                 self.hide_columns.remove(column)
-        self.update_item_widths()
+        self.update_column_widths()
         self.queue_draw()
 
     def get_column_widths(self):
@@ -1699,6 +2046,10 @@ class TreeView(gtk.VBox):
 
         @return: Return the all columns' width.
         '''
+        # Flush dirty column widths before use it.
+        if self.column_widths_dirty:
+            self.update_column_widths()
+
         rect = self.draw_area.allocation
         column_widths = []
 
@@ -1725,31 +2076,16 @@ class TreeView(gtk.VBox):
     def get_cell_with_event(self, event):
         (event_x, event_y) = get_event_coords(event)
 
-        item_height_count = 0
-        item_index_count = 0
-        for item in self.visible_items:
-            if item_height_count <= event_y <= item_height_count + item.get_height():
-                event_row = item_index_count
-                offset_y = event_y - item_height_count
-                (event_column, offset_x) = get_disperse_index(zip(*self.get_column_widths())[-1], event_x)
-                return (event_row, event_column, offset_x, offset_y)
-
-            item_height_count += item.get_height()
-            item_index_count += 1
+        event_row = self.height_index.find_row(event_y)
+        if event_row != None:
+            offset_y = event_y - self.height_index.get_prefix_height(event_row)
+            (event_column, offset_x) = get_disperse_index(zip(*self.get_column_widths())[-1], event_x)
+            return (event_row, event_column, offset_x, offset_y)
 
         return None
 
     def get_row_with_coordinate(self, y):
-        item_height_count = 0
-        item_index_count = 0
-        for item in self.visible_items:
-            if item_height_count <= y <= item_height_count + item.get_height():
-                return item_index_count
-
-            item_height_count += item.get_height()
-            item_index_count += 1
-
-        return None
+        return self.height_index.find_row(y)
 
     def get_offset_coordinate(self, widget):
         '''
@@ -1805,6 +2141,8 @@ class TreeView(gtk.VBox):
                 if select_items != []:
                     self.select_rows = []
 
+                # Use set to check select item, list search is too slow when select many items.
+                select_items = set(select_items)
                 for (index, item) in enumerate(self.visible_items):
                     # Try restore select row.
                     if item in select_items:
@@ -1817,7 +2155,7 @@ class TreeView(gtk.VBox):
                         start_select_item = None
 
                     # Stop loop when finish restore row status.
-                    if select_items == [] and start_select_item == None:
+                    if len(select_items) == 0 and start_select_item == None:
                         break
 
     def visible_highlight(self):
@@ -1841,7 +2179,7 @@ class TreeView(gtk.VBox):
         if item != None and item in self.visible_items:
             # Get coordinates.
             item_height = item.get_height()
-            item_top = sum(map(lambda i: i.get_height(), self.visible_items[:item.row_index]))
+            item_top = self.height_index.get_prefix_height(item.row_index)
             item_bottom = item_top + item_height
             (offset_x, offset_y, viewport) = self.get_offset_coordinate(self.draw_area)
             vadjust = self.scrolled_window.get_vadjustment()
@@ -1931,6 +2269,7 @@ class TreeItem(gobject.GObject):
         self.redraw_request_callback = None
         self.add_items_callback = None
         self.delete_items_callback = None
+        self.update_width_callback = None
         self.is_select = False
         self.is_hover = False
         self.is_expand = False
@@ -29,11 +29,11 @@ import gobject
 import gtk
 import gio
 import os
-import pango
 import pangocairo
 import traceback
 import sys
 import time
+from text_metrics import text_metrics
 from constant import (WIDGET_POS_TOP_LEFT, WIDGET_POS_TOP_RIGHT,
                       WIDGET_POS_TOP_CENTER, WIDGET_POS_BOTTOM_LEFT,
                       WIDGET_POS_BOTTOM_CENTER, WIDGET_POS_BOTTOM_RIGHT,
@@ -388,20 +388,7 @@ def get_content_size(text, text_size=DEFAULT_FONT_SIZE, text_font=DEFAULT_FONT,
     @return: Return text size as (text_width, text_height), return (0, 0) if occur error.
     '''
     if text:
-        surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, 0, 0) # don't need give size
-        cr = cairo.Context(surface)
-        context = pangocairo.CairoContext(cr)
-        layout = context.create_layout()
-        layout.set_font_description(pango.FontDescription("%s %s" % (text_font, text_size)))
-        layout.set_markup(text)
-        if wrap_width == None:
-            layout.set_single_paragraph_mode(True)
-        else:
-            layout.set_width(wrap_width * pango.SCALE)
-            layout.set_single_paragraph_mode(False)
-            layout.set_wrap(pango.WRAP_WORD)
-
-        return layout.get_pixel_size()
+        return text_metrics.get_size(text, text_size, text_font, wrap_width)
     else:
         return (0, 0)
 
@@ -470,15 +457,39 @@ def color_hex_to_rgb(color):
         color = color[1:]
     return (int(color[:2], 16), int(color[2:4], 16), int(color[4:], 16))
 
+cairo_color_dict = {}
+CAIRO_COLOR_CACHE_SIZE = 4096
+
+def register_cairo_colors(color_dict):
+    '''
+    Register converted cairo colors, function L{ I{color_hex_to_cairo} <color_hex_to_cairo>} return them without parse color again.
+
+    Theme register all colors of theme.txt.
+
+    @param color_dict: Dict that map hex color to cairo color (red, green, blue).
+    '''
+    cairo_color_dict.update(color_dict)
+
 def color_hex_to_cairo(color):
     '''
     Convert a HTML (hex) RGB value to cairo color.
 
+    Converted color is memoized, same color don't need parse again.
+
     @param color: The color to convert.
     @return: A color in cairo format, (red, green, blue).
     '''
-    gdk_color = gtk.gdk.color_parse(color)
-    return (gdk_color.red / 65535.0, gdk_color.green / 65535.0, gdk_color.blue / 65535.0)
+    cairo_color = cairo_color_dict.get(color)
+    if cairo_color == None:
+        gdk_color = gtk.gdk.color_parse(color)
+        cairo_color = (gdk_color.red / 65535.0, gdk_color.green / 65535.0, gdk_color.blue / 65535.0)
+
+        # Colors are few in practice, just reset cache if some code generate too many colors.
+        if len(cairo_color_dict) >= CAIRO_COLOR_CACHE_SIZE:
+            cairo_color_dict.clear()
+        cairo_color_dict[color] = cairo_color
+
+    return cairo_color
 
 def color_rgb_to_hex(rgb_color):
     '''